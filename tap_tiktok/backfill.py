@@ -0,0 +1,182 @@
+"""Parallel historical backfill of the report streams.
+
+    tap-tiktok-backfill --config CONFIG --catalog CATALOG --start-date 2023-01-01 --slices 8
+
+splits the date range (up to `--end-date`, by default yesterday) into `--slices`
+contiguous slices per selected report stream and syncs every slice in its own
+worker process, with the slice's `start_date` and `end_date`. Each slice writes
+its messages to its own file; without `--output-dir` the files are copied to
+stdout in stream and slice order as soon as they are complete, with their
+STATE messages replaced by a single merged one at the end.
+
+The merged bookmark of a stream is the one of its last slice, as long as every
+slice before it succeeded; otherwise it stops after the slices that did. The
+coverage indexes of all successful slices are combined, so a later `refill` run
+only fetches the failed slices. With `--state`, the bookmarks of an existing
+state are kept unless the backfill got further.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from pathlib import Path
+from typing import IO, List, Optional, Tuple
+
+from tap_tiktok.sharding import merge_states
+from tap_tiktok.tap import NEW_STREAM_TYPES, TapTikTok
+
+DEFAULT_SLICES = 4
+
+logger = logging.getLogger(__name__)
+
+
+def partition(start: date, end: date, slices: int) -> List[Tuple[date, date]]:
+    """Split the days from `start` to `end` (included) into at most `slices` contiguous (first, last) slices."""
+    days = (end - start).days + 1
+    if days < 1:
+        raise ValueError(f"Empty date range {start} - {end}.")
+    slices = max(1, min(slices, days))
+    size, longer = divmod(days, slices)
+    bounds = []
+    first = start
+    for index in range(slices):
+        last = first + timedelta(days=size + (index < longer) - 1)
+        bounds.append((first, last))
+        first = last + timedelta(days=1)
+    return bounds
+
+
+def select_stream(catalog: dict, stream_name: str) -> dict:
+    """Return `catalog` with only the entry of `stream_name`."""
+    return {**catalog, "streams": [entry for entry in catalog["streams"] if entry["tap_stream_id"] == stream_name]}
+
+
+def run_slice(config: dict, catalog: dict, stream_name: str, first: date, last: date, path: str) -> dict:
+    """Sync the days `first` to `last` of one stream into `path` and return the stream's bookmark."""
+    config = {
+        **config,
+        "start_date": f"{first.isoformat()}T00:00:00Z",
+        "end_date": f"{last.isoformat()}T00:00:00Z",
+        "lookback": 0,
+        "stream_concurrency": 1,
+    }
+    tap = TapTikTok(config=config, catalog=select_stream(catalog, stream_name), state={})
+    with open(path, "w") as output, redirect_stdout(output):
+        tap.run_sync()
+    return tap.state.get("bookmarks", {}).get(stream_name, {})
+
+
+def report_streams(config: dict, catalog: dict) -> List[str]:
+    """Names of the report streams selected in `catalog`, in sync order."""
+    tap = TapTikTok(config=config, catalog=catalog, state={})
+    reports = {*NEW_STREAM_TYPES, *tap.custom_report_classes}
+    return [name for name, stream in tap.streams.items() if stream.selected and name in reports]
+
+
+def _copy_records(path: Path, output: IO[str]) -> None:
+    with open(path) as messages:
+        for line in messages:
+            if not line.startswith('{"type":"STATE"'):
+                output.write(line)
+    output.flush()
+
+
+def backfill(
+    config: dict,
+    catalog: dict,
+    start: date,
+    end: date,
+    slices: int = DEFAULT_SLICES,
+    workers: Optional[int] = None,
+    output_dir: Optional[str] = None,
+    output: IO[str] = sys.stdout,
+    state: Optional[dict] = None,
+) -> Tuple[dict, List[str]]:
+    """Backfill the selected report streams from `start` to `end`; return the merged state and the failed slices."""
+    streams = report_streams(config, catalog)
+    bounds = partition(start, end, slices)
+    jobs = [(name, index, first, last) for name in streams for index, (first, last) in enumerate(bounds)]
+    logger.info(
+        "Backfilling %s from %s to %s in %d slices of up to %d days.",
+        ", ".join(streams),
+        start,
+        end,
+        len(bounds),
+        (bounds[0][1] - bounds[0][0]).days + 1,
+    )
+
+    slice_dir = Path(output_dir) if output_dir else Path(tempfile.mkdtemp(prefix="tap-tiktok-backfill-"))
+    slice_dir.mkdir(parents=True, exist_ok=True)
+    slice_states: List[dict] = []
+    stopped = set()
+    failures = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as executor:
+            futures = []
+            for name, index, first, last in jobs:
+                path = slice_dir / f"{name}.{index:03d}.jsonl"
+                future = executor.submit(run_slice, config, catalog, name, first, last, str(path))
+                futures.append((name, index, path, future))
+            for name, index, path, future in futures:
+                try:
+                    bookmark = future.result()
+                except Exception as error:
+                    logger.error("Slice %d of %s failed: %s", index, name, error)
+                    failures.append(f"{name}.{index:03d}")
+                    stopped.add(name)
+                    continue
+                if name in stopped:
+                    # the days of slices after a failed one are covered, but the bookmark stops before them
+                    bookmark = {"coverage": bookmark["coverage"]} if "coverage" in bookmark else {}
+                if bookmark:
+                    slice_states.append({"bookmarks": {name: bookmark}})
+                if output_dir is None:
+                    _copy_records(path, output)
+                    path.unlink()
+    finally:
+        if output_dir is None:
+            shutil.rmtree(slice_dir, ignore_errors=True)
+
+    merged = merge_states([state or {}, *slice_states])
+    if output_dir is None:
+        output.write(json.dumps({"type": "STATE", "value": merged}, separators=(",", ":")) + "\n")
+        output.flush()
+    else:
+        (slice_dir / "state.json").write_text(json.dumps(merged, indent=2) + "\n")
+    return merged, failures
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required=True, help="Tap config file")
+    parser.add_argument("--catalog", required=True, help="Catalog selecting the report streams to backfill")
+    parser.add_argument("--state", help="State whose bookmarks are merged with the backfilled ones")
+    parser.add_argument("--start-date", type=date.fromisoformat, help="First day, defaults to the config's start_date")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="Last day, defaults to yesterday")
+    parser.add_argument("--slices", type=int, default=DEFAULT_SLICES, help="Number of slices per stream")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--output-dir", help="Write each slice and the merged state.json here instead of stdout")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    config = json.loads(Path(args.config).read_text())
+    catalog = json.loads(Path(args.catalog).read_text())
+    state = json.loads(Path(args.state).read_text()) if args.state else None
+    start = args.start_date or date.fromisoformat(config["start_date"][:10])
+    end = args.end_date or date.today() - timedelta(days=1)
+
+    _, failures = backfill(config, catalog, start, end, args.slices, args.workers, args.output_dir, state=state)
+    if failures:
+        logger.error("Failed slices: %s", ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
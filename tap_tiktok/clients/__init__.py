@@ -1,3 +1,4 @@
 from .audience_report import TikTokAudienceReportStream
 from .base import TikTokStream
 from .basic_report import TikTokDailyBasicReportStream, TikTokHourlyBasicReportStream
+from .metric_report import TikTokDailyMetricReportStream
@@ -1,5 +1,4 @@
 import abc
-from functools import cached_property
 
 from singer_sdk import typing as th
 
@@ -36,10 +35,10 @@ class TikTokAudienceReportStream(TikTokReportStream, metaclass=abc.ABCMeta):
         th.Property("real_time_result_rate", th.StringType, description="Real-time Result Rate (%)"),
     )
 
-    @cached_property
-    def schema(self) -> dict:
+    @classmethod
+    def build_schema(cls) -> dict:
         return th.PropertiesList(
             th.Property("stat_time_day", th.DateTimeType, description="Group by day"),
-            *self.metrics_properties,
-            *self.report_specific_properties,
+            *cls.metrics_properties,
+            *cls.report_specific_properties,
         ).to_dict()
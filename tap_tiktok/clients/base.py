@@ -1,23 +1,133 @@
 """REST client handling, including TikTokStream base class."""
 
+import itertools
 import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import cached_property
 from http import HTTPStatus
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
+from singer_sdk import metrics
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk.streams import RESTStream
 
+from tap_tiktok.concurrency import DEFAULT_MAX_LIMIT, LATENCY_SPIKE_FACTOR, AIMDLimiter, ordered_map
+from tap_tiktok.deleted_entities import ENTITY_STREAM_ID_FIELDS
+from tap_tiktok.errors import (
+    BACKOFF_BASE_SECONDS,
+    BACKOFF_MAX_SECONDS,
+    ErrorKind,
+    TikTokFatalError,
+    TikTokRetriableError,
+    backoff_waits,
+    classify_error,
+    retry_after,
+)
+from tap_tiktok.hedging import DEFAULT_MAX_RATE, DEFAULT_PERCENTILE, Hedger, HedgeLost
+from tap_tiktok.helpers import decode_seconds, page_info, response_json
+from tap_tiktok.instrumentation import StreamPerformance
+from tap_tiktok.merge import ChunkMerger
+from tap_tiktok.scheduler import FetchCancelled
+
 DATE_FORMAT = "%Y-%m-%d"
+DEFAULT_API_URL = "https://business-api.tiktok.com/open_api/v1.3"
+# DEFAULT_API_URL = "https://sandbox-ads.tiktok.com/open_api/v1.3"
+DEFAULT_PAGE_CONCURRENCY = 4
+# Larger `fields` lists are split over several requests per page, joined on the primary keys
+MAX_FIELDS_PER_REQUEST = 100
+FIELD_NAME = re.compile(r"[a-z0-9_]+")
+
+
+# Failures that count against an endpoint's circuit breaker
+ENDPOINT_FAILURES = (
+    ConnectionResetError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def _is_overload(error: TikTokRetriableError) -> bool:
+    """Whether a failed request tells that the API is overloaded: rate limiting or a server error."""
+    if error.kind == ErrorKind.RATE_LIMITED:
+        return True
+    return error.response is not None and error.response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
 
 
 class TikTokStream(RESTStream):
 
-    url_base = "https://business-api.tiktok.com/open_api/v1.3"
-    # url_base = "https://sandbox-ads.tiktok.com/open_api/v1.3"
+    @property
+    def url_base(self) -> str:
+        return self.config.get("api_url") or DEFAULT_API_URL
 
     records_jsonpath = "$.data.list[*]"
 
+    max_request_attempts = 8
+    backoff_base_seconds = BACKOFF_BASE_SECONDS
+    backoff_max_seconds = BACKOFF_MAX_SECONDS
+
+    # Once the first page reports total_page, fetch the remaining pages concurrently
+    fan_out_pages = False
+    # Send the catalog-selected properties as the `fields` parameter
+    project_fields = False
+    # Streams with a lower priority are fetched and synced first
+    sync_priority = 0
+    # Send a duplicate of the pages slower than usual with the `hedging` config, see tap_tiktok.hedging
+    hedge_pages = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # shared by all streams, and set up here as requests are made on the scheduler's threads
+        self.quota = self._tap.quota
+        self.token_pool = self._tap.token_pool
+        self.deleted_entities = self._tap.deleted_entities
+        self.entity_cache = self._tap.entity_cache
+        # set by the scheduler once the records it fetches ahead for the stream are no longer wanted
+        self.fetch_cancelled = threading.Event()
+        adaptive = self.config.get("adaptive_concurrency")
+        self.concurrency_limiter = (
+            AIMDLimiter(
+                self.name,
+                self.config.get("page_concurrency") or DEFAULT_PAGE_CONCURRENCY,
+                adaptive.get("max_limit") or DEFAULT_MAX_LIMIT,
+                adaptive.get("latency_spike_factor") or LATENCY_SPIKE_FACTOR,
+                self.logger,
+            )
+            if adaptive is not None
+            else None
+        )
+        hedging = self.config.get("hedging")
+        self.hedger = (
+            Hedger(
+                self.name,
+                hedging.get("percentile") or DEFAULT_PERCENTILE,
+                hedging.get("max_rate") or DEFAULT_MAX_RATE,
+                self.performance,
+                self.logger,
+            )
+            if hedging is not None and self.hedge_pages
+            else None
+        )
+
+    @property
+    def selected(self) -> bool:
+        """Whether the stream is selected and, without an input catalog to build only those, owned by this shard."""
+        return super().selected and self._tap.owns_stream(self.name)
+
+    @selected.setter
+    def selected(self, value: Optional[bool]) -> None:
+        RESTStream.selected.fset(self, value)
+
+    @cached_property
+    def performance(self) -> StreamPerformance:
+        return StreamPerformance(self.name, self.config.get("advertiser_id"))
+
     @property
     def http_headers(self) -> dict:
         """Return the http headers needed."""
@@ -25,7 +135,7 @@ class TikTokStream(RESTStream):
         if "user_agent" in self.config:
             headers["User-Agent"] = self.config.get("user_agent")
         headers["Content-Type"] = "application/json"
-        headers["Access-Token"] = self.config["access_token"].__str__()
+        # the Access-Token header is set per request, from the token pool
         return headers
 
     @staticmethod
@@ -35,32 +145,285 @@ class TikTokStream(RESTStream):
 
     def get_next_page_token(self, response: requests.Response, previous_token: Optional[Any]) -> Optional[Any]:
         """Return a token for identifying next page or None if no more pages."""
-        current_page = self._get_page_info("$.data.page_info.page", response.json()) or 0
-        total_pages = self._get_page_info("$.data.page_info.total_page", response.json()) or 0
+        current_page = self._get_page_info("$.data.page_info.page", response_json(response)) or 0
+        total_pages = self._get_page_info("$.data.page_info.total_page", response_json(response)) or 0
         if current_page < total_pages:
             return current_page + 1
         return None
 
+    @cached_property
+    def field_chunks(self) -> List[List[str]]:
+        """The selected properties to request as `fields`, in chunks that all include the primary keys."""
+        if not self.project_fields:
+            return []
+        keys = list(self.primary_keys)
+        fields = [
+            name
+            for name in self.schema["properties"]
+            if name not in keys and FIELD_NAME.fullmatch(name) and self.mask.get(("properties", name), True)
+        ]
+        size = MAX_FIELDS_PER_REQUEST - len(keys)
+        return [keys + fields[start : start + size] for start in range(0, len(fields), size)] or [keys]
+
     def get_url_params(self, context: Optional[dict], next_page_token: Optional[Any]) -> Dict[str, Any]:
-        """Return a dictionary of values to be used in URL parameterization."""
+        """Return a dictionary of values to be used in URL parameterization.
+
+        With field chunks, page tokens are `(page, chunk index)` pairs.
+        """
         params: dict = {"advertiser_id": self.config["advertiser_id"]}
+        next_page_token, chunk_index = next_page_token if isinstance(next_page_token, tuple) else (next_page_token, 0)
         if next_page_token:
             params["page"] = next_page_token
+        if self.field_chunks:
+            params["fields"] = json.dumps(self.field_chunks[chunk_index])
         params["filtering"] = json.dumps(
             {"primary_status": "STATUS_ALL" if self.config.get("include_deleted") else "STATUS_NOT_DELETE"}
         )
         params["page_size"] = 1000
         return params
 
+    @cached_property
+    def page_executor(self) -> ThreadPoolExecutor:
+        """Threads fetching the pages of this stream, for all its page series, until its sync costs are logged."""
+        return ThreadPoolExecutor(max_workers=self.page_concurrency, thread_name_prefix=self.name)
+
+    @property
+    def page_concurrency(self) -> int:
+        if self.concurrency_limiter is not None:
+            # pages are fetched on up to the maximum limit of threads, the limiter decides how many at a time
+            return self.concurrency_limiter.max_limit
+        return self.config.get("page_concurrency") or DEFAULT_PAGE_CONCURRENCY
+
+    def fetch_page(
+        self, context: Optional[dict], next_page_token: Any, decorated_request: Callable
+    ) -> Tuple[requests.PreparedRequest, requests.Response, List[dict]]:
+        prepared_request = self.prepare_request(context, next_page_token=next_page_token)
+        if self.hedger is None:
+            response = decorated_request(prepared_request, context)
+        else:
+            # the duplicate gets its own copy, as the access token is set on the request
+            response = self.hedger.call(
+                lambda: decorated_request(prepared_request, context),
+                lambda: decorated_request(prepared_request.copy(), context),
+            )
+        return prepared_request, response, list(self.parse_response(response))
+
+    def fetch_pages(
+        self, context: Optional[dict], next_page_tokens: Iterable[Any], decorated_request: Callable
+    ) -> Iterator[Tuple[requests.PreparedRequest, requests.Response, List[dict]]]:
+        """Fetch the pages of `next_page_tokens` on up to `page_concurrency` threads, in token order."""
+        return ordered_map(
+            lambda token: self.fetch_page(context, token, decorated_request),
+            next_page_tokens,
+            self.page_executor,
+            self.page_concurrency,
+        )
+
+    def quota_exhausted(self) -> bool:
+        """Whether a request budget is reached, in which case the stream stops before its next requests."""
+        budget = self.quota.exhausted
+        if budget is not None:
+            self.logger.warning("The %s is reached, %s stops here until the next run.", budget, self.name)
+        return budget is not None
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        if self.quota_exhausted():
+            return
+        num_chunks = len(self.field_chunks)
+        if not self.fan_out_pages and num_chunks <= 1:
+            yield from super().request_records(context)
+            return
+
+        decorated_request = self.request_decorator(self._request)
+        merger = ChunkMerger(self.primary_keys, num_chunks, logger=self.logger) if num_chunks > 1 else None
+        with metrics.http_request_counter(self.name, self.path) as request_counter:
+            request_counter.context = context
+            first_page = self.fetch_page(context, None, decorated_request)
+            current_page, total_pages = page_info(first_page[1])
+            if merger is None:
+                tokens: List[Any] = [None, *range(current_page + 1, total_pages + 1)]
+            else:
+                # each page is requested once per field chunk; the first page's first chunk is already there
+                pages = range(current_page, total_pages + 1)
+                tokens = [None, *[(page, chunk) for page in pages for chunk in range(num_chunks)][1:]]
+            pages = itertools.chain([first_page], self.fetch_pages(context, tokens[1:], decorated_request))
+            try:
+                for token, (prepared_request, response, records) in zip(tokens, pages):
+                    request_counter.increment()
+                    self.update_sync_costs(prepared_request, response, context)
+                    if merger is None:
+                        yield from records
+                    else:
+                        yield from merger.add(token[1] if isinstance(token, tuple) else 0, records)
+                if merger is not None:
+                    yield from merger.finish()
+            finally:
+                if merger is not None:
+                    merger.close()
+
+    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
+        if self.name in ENTITY_STREAM_ID_FIELDS:
+            if self.deleted_entities is not None:
+                self.deleted_entities.observe(ENTITY_STREAM_ID_FIELDS[self.name], row)
+            if self.entity_cache is not None:
+                self.entity_cache.observe(ENTITY_STREAM_ID_FIELDS[self.name], row)
+        return row
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        payload = response_json(response)
+        start = time.perf_counter()
+        records = list(extract_jsonpath(self.records_jsonpath, input=payload))
+        self.performance.record_page(len(records), decode_seconds(response), time.perf_counter() - start)
+        return records
+
+    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        scheduler = getattr(self._tap, "scheduler", None)
+        records = scheduler.records(self, context) if scheduler is not None else None
+        if records is None:
+            records = self.produce_records(context)
+        yield from records
+
+    def produce_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        """Fetch and post-process the records, on the scheduler's worker thread when it runs."""
+        profiler = getattr(self._tap, "profiler", None)
+        if profiler is None:
+            yield from super().get_records(context)
+        else:
+            with profiler.profile(self.name):
+                yield from super().get_records(context)
+        if self.name in ENTITY_STREAM_ID_FIELDS and self.quota.exhausted is None:
+            # every entity of the level was returned: report windows may now skip the deleted ones, and
+            # enrichment uses these entities instead of fetching them again
+            if self.deleted_entities is not None:
+                self.deleted_entities.mark_refreshed(ENTITY_STREAM_ID_FIELDS[self.name])
+            if self.entity_cache is not None:
+                self.entity_cache.mark_synced(ENTITY_STREAM_ID_FIELDS[self.name])
+
+    def _write_state_message(self) -> None:
+        # the index of deleted entities is updated on the scheduler's threads, it joins the state here
+        if self.deleted_entities is not None and self.deleted_entities.merge_into(self.tap_state):
+            self._is_state_flushed = False
+        super()._write_state_message()
+
+    def _request(self, prepared_request: requests.PreparedRequest, context: Optional[dict]) -> requests.Response:
+        if self.fetch_cancelled.is_set():
+            raise FetchCancelled()
+        if self.hedger is not None and self.hedger.lost():
+            # not retried: the other request of a hedged page answered first
+            raise HedgeLost()
+        path = urlsplit(prepared_request.url).path
+        breaker = self._tap.circuit_breakers.get(path)
+        limiter = self.concurrency_limiter
+        with self.token_pool.lease() as token, limiter.slot() if limiter else nullcontext():
+            breaker.before_request()
+            prepared_request.headers["Access-Token"] = token.value
+            self.quota.record("/" + path[len(self.api_path) :].strip("/") + "/", self.name)
+            try:
+                with self._tap.request_budget:
+                    start = time.perf_counter()
+                    response = super()._request(prepared_request, context)
+                    latency = time.perf_counter() - start
+            except TikTokRetriableError as error:
+                if error.kind == ErrorKind.RETRIABLE:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if limiter is not None and _is_overload(error):
+                    limiter.record(None, overloaded=True)
+                if error.kind == ErrorKind.RATE_LIMITED and len(self.token_pool) > 1:
+                    self.logger.warning("Access token %s is rate limited, taking it out of rotation.", token.name)
+                    if self.token_pool.cool_down(token, error.retry_after):
+                        # another token takes the retry, there is no need to wait for this one
+                        error.retry_after = None
+                raise
+            except ENDPOINT_FAILURES:
+                breaker.record_failure()
+                if limiter is not None:
+                    limiter.record(None, overloaded=True)
+                raise
+            except Exception:
+                breaker.record_success()
+                raise
+            if limiter is not None:
+                limiter.record(latency)
+        breaker.record_success()
+        return response
+
+    @cached_property
+    def api_path(self) -> str:
+        """Path prefix of the API, stripped from the endpoints in the request accounting."""
+        return urlsplit(self.config.get("api_url") or DEFAULT_API_URL).path.rstrip("/")
+
+    def calculate_sync_cost(
+        self, request: requests.PreparedRequest, response: requests.Response, context: Optional[dict]
+    ) -> Dict[str, int]:
+        return {"requests": 1}
+
+    def backoff_wait_generator(self):
+        return backoff_waits(self.backoff_base_seconds, self.backoff_max_seconds)
+
+    def backoff_max_tries(self) -> int:
+        return self.max_request_attempts
+
+    def backoff_jitter(self, value: float) -> float:
+        # backoff_waits already jitters its waits and must not shorten server hints
+        return value
+
+    def backoff_handler(self, details) -> None:
+        super().backoff_handler(details)
+        self.performance.record_retry()
+
+    def log_sync_costs(self) -> None:
+        super().log_sync_costs()
+        self.performance.finish()
+        limiter = self.concurrency_limiter
+        if limiter is not None:
+            self.logger.info(
+                "Concurrency limit of %s ended at %d (between %d and %d).",
+                self.name,
+                int(limiter.limit),
+                limiter.lowest,
+                limiter.highest,
+            )
+        hedger = self.hedger
+        if hedger is not None and hedger.hedged:
+            self.logger.info(
+                "Hedged %d of the %d page requests of %s: %d duplicates answered first, %d answers were not used.",
+                hedger.hedged,
+                hedger.requests,
+                self.name,
+                hedger.won,
+                hedger.wasted,
+            )
+        self.quota.flush()
+        # a later sync of the stream (e.g. in tests) starts new threads
+        executor = self.__dict__.pop("page_executor", None)
+        if executor is not None:
+            executor.shutdown()
+
     def validate_response(self, response: requests.Response) -> None:
+        self.performance.record_response(response.elapsed.total_seconds(), len(response.content))
         if response.status_code == HTTPStatus.OK:
-            response_json = response.json()
-            message = response_json.get("message")
-            code = response_json.get("code")
+            payload = response_json(response)
+            message = payload.get("message")
+            code = payload.get("code")
             if message != "OK":
+                error = f"Error calling {response.request.url}. API response: Code ({code}) - {message}"
+                kind = classify_error(code, message)
+                if kind != ErrorKind.FATAL:
+                    raise TikTokRetriableError(error, response, code, kind, retry_after(response))
                 if self.name == "ad_accounts":
                     # skip this temporarily since it might be a permission issue
                     return super().validate_response(response)
-                raise RuntimeError(f"Error calling {response.request.url}. API response: Code ({code}) - {message}")
+                raise TikTokFatalError(error, code)
+        elif (
+            response.status_code in self.extra_retry_statuses
+            or response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+        ):
+            rate_limited = response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+            kind = ErrorKind.RATE_LIMITED if rate_limited else ErrorKind.RETRIABLE
+            raise TikTokRetriableError(
+                self.response_error_message(response), response, kind=kind, retry_after=retry_after(response)
+            )
 
         return super().validate_response(response)
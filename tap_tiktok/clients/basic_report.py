@@ -1,9 +1,18 @@
 import abc
+import typing as t
+from contextlib import contextmanager
 from functools import cached_property
 
+import pendulum
 from singer_sdk import typing as th
+from singer_sdk.streams.core import Context
 
-from tap_tiktok.pagination import DailyReportPaginator, HourlyReportPaginator
+from tap_tiktok.intraday import HOUR_FORMAT, HourFingerprints
+from tap_tiktok.pagination import (
+    DailyReportPaginator,
+    HourlyReportPaginator,
+    IntradayReportPaginator,
+)
 
 from .report import TikTokReportStream
 
@@ -250,11 +259,11 @@ class TikTokDailyBasicReportStream(TikTokReportStream, metaclass=abc.ABCMeta):
         *SKAN_METRICS_PROPERTIES_LIST,
     )
 
-    @cached_property
-    def schema(self) -> dict:
+    @classmethod
+    def build_schema(cls) -> dict:
         return th.PropertiesList(
-            *self.metrics_properties,
-            *self.report_specific_properties,
+            *cls.metrics_properties,
+            *cls.report_specific_properties,
         ).to_dict()
 
 
@@ -263,14 +272,74 @@ class TikTokHourlyBasicReportStream(TikTokReportStream, metaclass=abc.ABCMeta):
     report_type = "BASIC"
 
     pagination_class = HourlyReportPaginator
+    sync_priority = 2
 
     metrics_properties = th.PropertiesList(
         *BASE_METRICS_PROPERTIES_LIST,
     )
 
-    @cached_property
-    def schema(self) -> dict:
+    # (start, end) of the hours fetched by an intraday poll, see tap_tiktok.intraday
+    intraday_window: t.Optional[t.Tuple[pendulum.DateTime, pendulum.DateTime]] = None
+    intraday_emitted = 0
+
+    @classmethod
+    def build_schema(cls) -> dict:
         return th.PropertiesList(
-            *self.metrics_properties,
-            *self.report_specific_properties,
+            *cls.metrics_properties,
+            *cls.report_specific_properties,
         ).to_dict()
+
+    @cached_property
+    def hour_fingerprints(self) -> HourFingerprints:
+        return HourFingerprints(self.primary_keys, self.replication_key)
+
+    @contextmanager
+    def intraday(self, start: pendulum.DateTime, end: pendulum.DateTime) -> t.Iterator[None]:
+        """Within the block, syncs fetch the hours from `start` to `end` and emit new or changed rows only."""
+        self.intraday_window = (start, end)
+        self.intraday_emitted = 0
+        try:
+            yield
+        finally:
+            self.intraday_window = None
+
+    def get_new_paginator(self):
+        if self.intraday_window is not None:
+            return IntradayReportPaginator(*self.intraday_window)
+        return super().get_new_paginator()
+
+    def get_records(self, context: Context | None) -> t.Iterable[dict]:
+        if self.intraday_window is None:
+            yield from super().get_records(context)
+            return
+        # polls run after the scheduler is done and fetch the stream themselves
+        yield from self.produce_records(context)
+
+    def request_records(self, context: Context | None) -> t.Iterable[dict]:
+        if self.intraday_window is None:
+            yield from self._skip_settled_hours(super().request_records(context))
+            return
+        first_hour = self.intraday_window[0].format(HOUR_FORMAT)
+        for record in super().request_records(context):
+            if record[self.replication_key] >= first_hour and self.hour_fingerprints.changed(record):
+                self.intraday_emitted += 1
+                yield record
+        self.hour_fingerprints.prune(first_hour)
+
+    def _skip_settled_hours(self, records: t.Iterable[dict]) -> t.Iterable[dict]:
+        """Drop the hours of the re-fetched days that had already settled when they were last emitted."""
+        for record in records:
+            hour = record[self.replication_key]
+            first_hour = self.refetch_hours.get(hour[:10])
+            if first_hour is None or hour >= first_hour:
+                yield record
+
+    def window_synced(self, window: dict) -> None:
+        # intraday hours are provisional and do not count as covered
+        if self.intraday_window is None:
+            super().window_synced(window)
+
+    def _increment_stream_state(self, latest_record: dict, *, context: Context | None = None) -> None:
+        # intraday hours are provisional, the bookmark stays with the regular runs
+        if self.intraday_window is None:
+            super()._increment_stream_state(latest_record, context=context)
@@ -1,24 +1,40 @@
 import abc
+import itertools
 import json
+import time
 import typing as t
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from functools import cached_property
 from typing import Any
 
 import pendulum
+import requests
 from singer_sdk import metrics
 from singer_sdk import typing as th
+from singer_sdk.helpers._typing import TypeConformanceLevel
 from singer_sdk.streams.core import Context
 
+from tap_tiktok.coverage import CoverageIndex
+from tap_tiktok.deleted_entities import ID_FILTER_FIELDS, MAX_FILTERED_IDS
+from tap_tiktok.entity_cache import ENTITY_LEVELS, enrichment_fields
+from tap_tiktok.freshness import FreshnessPolicy
+from tap_tiktok.helpers import decode_seconds, page_info, response_json
+from tap_tiktok.merge import ChunkMerger
 from tap_tiktok.pagination import (
     BaseAPIPaginator,
     DailyReportPaginator,
     HourlyReportPaginator,
+    IntervalsReportPaginator,
 )
+from tap_tiktok.schema_cache import get_cached_schema
 
 from .base import TikTokStream
 
 DATE_FORMAT = "%Y-%m-%d"
 STEP_NUM_DAYS = 30
+# Reports with more metrics are requested once per chunk of metrics, joined on the dimensions
+MAX_METRICS_PER_REQUEST = 100
 
 
 class TikTokReportStream(TikTokStream, metaclass=abc.ABCMeta):
@@ -53,21 +69,85 @@ class TikTokReportStream(TikTokStream, metaclass=abc.ABCMeta):
     def pagination_class(self) -> BaseAPIPaginator:
         """Pagination class that will be used to query the API"""
 
+    @classmethod
+    @abc.abstractmethod
+    def build_schema(cls) -> dict:
+        """Build the stream schema from its metrics and report specific properties"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # (records produced when the window was done, first day, last day, synced at) of the windows to cover
+        self._synced_windows: t.Deque[tuple] = deque()
+        self._produced_records = 0
+        # first hour to emit of the days re-fetched only for their hours still mutable, see tap_tiktok.freshness
+        self.refetch_hours: dict[str, str] = {}
+        # set up here rather than lazily, as records are post-processed on the scheduler's threads
+        self.entity_cache = self._tap.entity_cache if self.entity_level else None
+        if self.entity_dimension is None:
+            self.deleted_entities = None
+
+    @cached_property
+    def schema(self) -> dict:
+        schema = get_cached_schema(self.name) or self.build_schema()
+        if self.entity_level is None:
+            return schema
+        enrichment = th.PropertiesList(*(th.Property(field, th.StringType) for field in self.enrichment_fields))
+        return {**schema, "properties": {**schema["properties"], **enrichment.to_dict()["properties"]}}
+
+    @cached_property
+    def entity_dimension(self) -> str | None:
+        """ID field of the entity the rows are reported for."""
+        return next((dimension for dimension in self.dimensions if dimension in ENTITY_LEVELS), None)
+
+    @cached_property
+    def entity_level(self) -> str | None:
+        """ID field of the entity the rows are reported for, if they are enriched (see tap_tiktok.entity_cache)."""
+        return self.entity_dimension if self.config.get("enrich_reports") else None
+
+    @cached_property
+    def enrichment_fields(self) -> list[str]:
+        return enrichment_fields(self.entity_level) if self.entity_level else []
+
     @cached_property
     def primary_keys(self) -> list[str]:
         return self.dimensions
 
+    max_metrics_per_request = MAX_METRICS_PER_REQUEST
+
     @cached_property
     def metrics_keys(self) -> list[str]:
-        return list(self.metrics_properties.to_dict()["properties"].keys())
+        """Metrics requested from TikTok: only those selected in the catalog."""
+        metrics = list(self.metrics_properties.to_dict()["properties"].keys())
+        selected = [metric for metric in metrics if self.mask.get(("properties", metric), True)]
+        if len(selected) < len(metrics):
+            self.logger.info("Requesting %d of the %d metrics of the report.", len(selected), len(metrics))
+        # TikTok needs at least one metric to return the rows of the dimensions
+        return selected or metrics[:1]
 
-    url_base = "https://business-api.tiktok.com/open_api/v1.3/report/integrated/get/"
+    @cached_property
+    def metric_chunks(self) -> list[list[str]]:
+        """The requested metrics, in as few even chunks of at most `max_metrics_per_request` as possible."""
+        metrics = self.metrics_keys
+        num_chunks = -(-len(metrics) // self.max_metrics_per_request)
+        size = -(-len(metrics) // num_chunks)
+        return [metrics[start : start + size] for start in range(0, len(metrics), size)]
+
+    @property
+    def url_base(self) -> str:
+        return f"{super().url_base}/report/integrated/get/"
 
     path = "/"
+    sync_priority = 1
+    hedge_pages = True
 
     records_jsonpath = "$.data.list[*]"
     next_page_token_jsonpath = "$.page_info.page"
 
+    # Report values are already JSON strings matching the schema, so the SDK's
+    # per-record conformance copy is skipped. Deselected properties are still
+    # popped in place by the SDK.
+    TYPE_CONFORMANCE_LEVEL = TypeConformanceLevel.NONE
+
     def _get_start_datetime(self, context: Context | None) -> pendulum.DateTime:
         start_date: pendulum.DateTime = self.get_starting_timestamp(context)
         lookback_window = self.config["lookback"]
@@ -78,34 +158,145 @@ class TikTokReportStream(TikTokStream, metaclass=abc.ABCMeta):
             )
         return start_date
 
+    def _get_end_datetime(self) -> pendulum.DateTime | None:
+        """Last day to sync if `end_date` is configured, otherwise the paginators stop at yesterday."""
+        end_date = self.config.get("end_date")
+        return pendulum.parse(end_date) if end_date else None
+
     def get_new_paginator(self):
+        if self.config.get("refill") is not None:
+            return self._get_refill_paginator()
+        if self.freshness is not None:
+            return self._get_freshness_paginator()
         start_date = self._get_start_datetime(context=None)
-        return self.pagination_class(start_date)
+        end_date = self._get_end_datetime()
+        if end_date is not None and start_date.date() > end_date.date():
+            self.logger.info("Fetching nothing, the bookmark %s is after end_date.", start_date.to_date_string())
+            return None
+        return self.pagination_class(start_date, end_date)
+
+    @cached_property
+    def coverage(self) -> CoverageIndex:
+        """Days this stream has fully synced for the advertiser, see tap_tiktok.coverage."""
+        coverage = self.get_context_state(None).get("coverage", {})
+        return CoverageIndex.from_state(coverage.get(self.config["advertiser_id"]))
+
+    def _get_refill_paginator(self) -> IntervalsReportPaginator | None:
+        """Paginator over the uncovered or stale days between start_date and the end bound, None if there are none."""
+        start = pendulum.parse(self.config["start_date"]).date()
+        end = (self._get_end_datetime() or pendulum.now().subtract(days=1)).date()
+        stale_after_hours = self.config["refill"].get("stale_after_hours")
+        stale_before = datetime.now(timezone.utc) - timedelta(hours=stale_after_hours or 0)
+
+        def is_stale(day, synced_at: datetime) -> bool:
+            return stale_after_hours is not None and synced_at < stale_before
+
+        gaps = self.coverage.gaps(start, end, is_stale)
+        self.logger.info(
+            "Refilling %s.", ", ".join(f"{first} - {last}" for first, last in gaps) or "nothing, all days are covered"
+        )
+        return IntervalsReportPaginator(gaps, self.pagination_class.window_days) if gaps else None
+
+    @cached_property
+    def freshness(self) -> FreshnessPolicy | None:
+        """Policy deciding which synced days are fetched again, None to use the lookback instead."""
+        config = self.config.get("freshness")
+        return None if config is None else FreshnessPolicy.from_config(config, self.name, self.metrics_keys)
+
+    def _get_freshness_paginator(self) -> IntervalsReportPaginator | None:
+        """Paginator over the days after the bookmark and the synced days the freshness policy says are due."""
+        now = datetime.now(timezone.utc)
+        # the policy replaces the lookback
+        bookmark = self.get_starting_timestamp(None).date()
+        first = max(pendulum.parse(self.config["start_date"]).date(), min(bookmark, self.freshness.horizon(now)))
+        end = (self._get_end_datetime() or pendulum.now().subtract(days=1)).date()
+
+        def is_due(day, synced_at: datetime) -> bool:
+            return self.freshness.refetch_from(day, synced_at, now) is not None
+
+        gaps = self.coverage.gaps(first, end, is_due)
+        self.refetch_hours = {}
+        for gap_first, gap_last in gaps:
+            day = gap_first
+            while day <= gap_last:
+                synced_at = self.coverage.synced_at(day)
+                first_hour = synced_at and self.freshness.refetch_from(day, synced_at, now)
+                if first_hour and first_hour.date() == day and first_hour.hour > 0:
+                    self.refetch_hours[day.isoformat()] = first_hour.strftime("%Y-%m-%d %H:00:00")
+                day += timedelta(days=1)
+        self.logger.info(
+            "Fetching %s.", ", ".join(f"{first} - {last}" for first, last in gaps) or "nothing, all days are fresh"
+        )
+        return IntervalsReportPaginator(gaps, self.pagination_class.window_days) if gaps else None
+
+    def window_synced(self, window: dict) -> None:
+        """Mark the days of `window` as covered once the records fetched so far have all been emitted."""
+        synced_at = datetime.now(timezone.utc)
+        self._synced_windows.append((self._produced_records, window["start_date"], window["end_date"], synced_at))
+
+    def produce_records(self, context: Context | None) -> t.Iterable[dict]:
+        self._produced_records = 0
+        self._synced_windows.clear()
+        for record in super().produce_records(context):
+            self._produced_records += 1
+            yield record
+
+    def get_records(self, context: Context | None) -> t.Iterable[dict]:
+        # Records may be fetched ahead on a scheduler thread: windows are only added to the
+        # coverage index (and so to the emitted state) once their last record was emitted.
+        emitted = 0
+        for record in super().get_records(context):
+            yield record
+            emitted += 1
+            self._commit_coverage(emitted)
+        self._commit_coverage(None)
+
+    def _commit_coverage(self, emitted: int | None) -> None:
+        windows = self._synced_windows
+        if not windows or (emitted is not None and windows[0][0] > emitted):
+            return
+        while windows and (emitted is None or windows[0][0] <= emitted):
+            _, first, last, synced_at = windows.popleft()
+            self.coverage.add(pendulum.parse(first).date(), pendulum.parse(last).date(), synced_at)
+        coverage = self.get_context_state(None).setdefault("coverage", {})
+        coverage[self.config["advertiser_id"]] = self.coverage.to_state()
 
     def get_url_params(self, context: dict | None, next_page_token: Any | None) -> dict[str, Any]:
+        next_page_token = dict(next_page_token)
+        metric_chunk = next_page_token.pop("metric_chunk", 0)
+        # the deleted entities a window skips, see tap_tiktok.deleted_entities
+        status = next_page_token.pop("status", None)
+        entity_ids = next_page_token.pop("entity_ids", None)
+        if status is None:
+            status = "STATUS_ALL" if self.config.get("include_deleted") else "STATUS_NOT_DELETE"
+        filtering = [
+            {
+                "field_name": self.status_field,
+                "filter_type": "IN",
+                "filter_value": json.dumps([status]),
+            },
+            {
+                "field_name": "buying_type",
+                "filter_type": "IN",
+                "filter_value": json.dumps(self.buying_types),
+            },
+        ]
+        if entity_ids is not None:
+            filtering.append(
+                {
+                    "field_name": ID_FILTER_FIELDS[self.entity_dimension],
+                    "filter_type": "IN",
+                    "filter_value": json.dumps(entity_ids),
+                }
+            )
         params: dict = {
             "advertiser_id": self.config.get("advertiser_id"),
             "service_type": "AUCTION",
             "report_type": self.report_type,
             "data_level": self.data_level,
             "dimensions": json.dumps(self.dimensions),
-            "metrics": json.dumps(self.metrics_keys),
-            "filtering": json.dumps(
-                [
-                    {
-                        "field_name": self.status_field,
-                        "filter_type": "IN",
-                        "filter_value": json.dumps(
-                            ["STATUS_ALL" if self.config.get("include_deleted") else "STATUS_NOT_DELETE"]
-                        ),
-                    },
-                    {
-                        "field_name": "buying_type",
-                        "filter_type": "IN",
-                        "filter_value": json.dumps(self.buying_types),
-                    },
-                ]
-            ),
+            "metrics": json.dumps(self.metric_chunks[metric_chunk]),
+            "filtering": json.dumps(filtering),
         }
         params = {
             **params,
@@ -117,35 +308,93 @@ class TikTokReportStream(TikTokStream, metaclass=abc.ABCMeta):
 
     def request_records(self, context: Context | None) -> t.Iterable[dict]:
         paginator = self.get_new_paginator()
+        if paginator is None:
+            return
         decorated_request = self.request_decorator(self._request)
-        pages = 0
 
         with metrics.http_request_counter(self.name, self.path) as request_counter:
             request_counter.context = context
 
             while not paginator.finished:
-                prepared_request = self.prepare_request(
-                    context,
-                    next_page_token=paginator.current_value,
-                )
-                resp = decorated_request(prepared_request, context)
+                # stop between windows, so that the state covers every window synced
+                if self.quota_exhausted():
+                    return
+                window = paginator.current_value
+                self.performance.start_window(window["start_date"], window["end_date"])
+                for series in self._window_series(window):
+                    resp = yield from self._request_window(context, series, decorated_request, request_counter)
+
+                paginator.advance(resp)
+                self.window_synced(window)
+
+    def _window_series(self, window: dict) -> list[dict]:
+        """The request series covering `window`: one, unless deleted entities are skipped.
+
+        Without the deleted entities inactive since before the window, it takes the
+        entities not deleted, then the deleted ones still active, by ID. This needs
+        the index of the level refreshed in this run, see tap_tiktok.deleted_entities.
+        """
+        if self.deleted_entities is None or not self.deleted_entities.is_refreshed(self.entity_dimension):
+            return [window]
+        first_day = pendulum.parse(window["start_date"]).date()
+        active, skipped = self.deleted_entities.partition(self.entity_dimension, first_day)
+        if not skipped or len(active) > MAX_FILTERED_IDS:
+            return [window]
+        self.logger.info("Skipping %d entities deleted before %s.", skipped, window["start_date"])
+        series = [{**window, "status": "STATUS_NOT_DELETE"}]
+        if active:
+            series.append({**window, "status": "STATUS_ALL", "entity_ids": active})
+        return series
+
+    def _request_window(
+        self, context: Context | None, window: dict, decorated_request: t.Callable, request_counter
+    ) -> t.Generator[dict, None, requests.Response]:
+        """Yield the records of a window's pages, fetched concurrently after the first, and return the last response."""
+        num_chunks = len(self.metric_chunks)
+        first_page = self.fetch_page(context, window, decorated_request)
+        # the rest of the window's pages (and metric chunks) are fetched concurrently
+        current_page, total_pages = page_info(first_page[1])
+        if num_chunks == 1:
+            tokens = [window, *({**window, "page": page} for page in range(current_page + 1, total_pages + 1))]
+        else:
+            # each page is requested once per metric chunk; the first page's first chunk is already there
+            pages = range(current_page, total_pages + 1)
+            chunks = [
+                {**window, "page": page, "metric_chunk": chunk} for page in pages for chunk in range(num_chunks)
+            ]
+            tokens = [window, *chunks[1:]]
+        merger = ChunkMerger(self.primary_keys, num_chunks, logger=self.logger) if num_chunks > 1 else None
+        responses = itertools.chain([first_page], self.fetch_pages(context, tokens[1:], decorated_request))
+        try:
+            for token, (prepared_request, resp, records) in zip(tokens, responses):
                 request_counter.increment()
                 self.update_sync_costs(prepared_request, resp, context)
-                records = iter(self.parse_response(resp))
-                # try:
-                #     first_record = next(records)
-                # except StopIteration:
-                #     self.logger.info(
-                #         "Pagination stopped after %d pages because no records were "
-                #         "found in the last response",
-                #         pages,
-                #     )
-                #     break
-                # yield first_record
-                yield from records
-                pages += 1
+                if merger is None:
+                    yield from records
+                else:
+                    yield from merger.add(token.get("metric_chunk", 0), records)
+            if merger is not None:
+                yield from merger.finish()
+        finally:
+            if merger is not None:
+                merger.close()
+        return resp
 
-                paginator.advance(resp)
+    def post_process(self, row: dict, context: Context | None = None) -> dict | None:
+        if self.deleted_entities is not None:
+            self.deleted_entities.record_activity(self.entity_dimension, row, self.replication_key, self.metrics_keys)
+        if self.entity_cache is not None:
+            self.entity_cache.enrich(row, self.entity_level)
+        return row
 
-    def post_process(self, row: dict, context: dict | None = None) -> dict | None:
-        return {**row["dimensions"], **row["metrics"]}
+    def parse_response(self, response: requests.Response) -> t.Iterable[dict]:
+        """Flatten each row of the page into a record, reusing its dimensions dict."""
+        rows = response_json(response).get("data", {}).get("list") or ()
+        start = time.perf_counter()
+        records = []
+        for row in rows:
+            record = row["dimensions"]
+            record.update(row["metrics"])
+            records.append(record)
+        self.performance.record_page(len(records), decode_seconds(response), time.perf_counter() - start)
+        return records
@@ -0,0 +1,132 @@
+"""Concurrency helpers shared by the streams."""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, wait
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_LIMIT = 16
+DECREASE_FACTOR = 0.5
+LATENCY_SPIKE_FACTOR = 3.0
+# weight of each new sample in the latency average, and samples needed before spikes are told apart
+LATENCY_SMOOTHING = 0.1
+MIN_LATENCY_SAMPLES = 5
+
+
+def ordered_map(
+    func: Callable[[T], R], items: Iterable[T], executor: Optional[Executor], max_workers: int
+) -> Iterator[R]:
+    """Apply `func` to `items` on `executor`, up to `max_workers` at a time, yielding the results in item order.
+
+    At most `max_workers` calls are in flight (or finished but not yet consumed),
+    so memory stays bounded however many items there are. If the consumer stops
+    early, calls that have not started are cancelled and the running ones are
+    waited for. The executor is left running for the next items to map; without
+    one, or with a single worker, `func` is applied on the caller's thread.
+    """
+    if executor is None or max_workers <= 1:
+        yield from map(func, items)
+        return
+
+    items = iter(items)
+    in_flight: Deque[Future] = deque()
+    try:
+        for item in items:
+            in_flight.append(executor.submit(func, item))
+            if len(in_flight) >= max_workers:
+                break
+        while in_flight:
+            result = in_flight.popleft().result()
+            for item in items:
+                in_flight.append(executor.submit(func, item))
+                break
+            yield result
+    finally:
+        for future in in_flight:
+            future.cancel()
+        wait(in_flight)
+
+
+class AIMDLimiter:
+    """Adaptive limit on the requests a stream has in flight (additive increase, multiplicative decrease).
+
+    Each healthy response raises the limit by 1 / limit, i.e. by about one request
+    per round trip at the current limit, up to `max_limit`. Rate-limit errors,
+    server errors, timeouts and latencies over `latency_spike_factor` times the
+    average cut it by half, at most once per average latency since the requests
+    then in flight were sent before the first signal. Changes of the integer limit
+    are logged.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        latency_spike_factor: float = LATENCY_SPIKE_FACTOR,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.limit = float(min(max(1, initial), self.max_limit))
+        self.latency_spike_factor = latency_spike_factor
+        self.logger = logger or logging.getLogger(__name__)
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.samples = 0
+        self.lowest = self.highest = int(self.limit)
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the `limit` slots for the duration of a request."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def record(self, latency: Optional[float], overloaded: bool = False) -> None:
+        """Adapt the limit to a response that took `latency` seconds, or to an overload signal."""
+        with self._condition:
+            before = int(self.limit)
+            spike = (
+                latency is not None
+                and self.samples >= MIN_LATENCY_SAMPLES
+                and latency > self.latency_spike_factor * self.latency
+            )
+            if overloaded or spike:
+                now = time.monotonic()
+                if now - self._last_decrease > (self.latency or 0.0):
+                    self._last_decrease = now
+                    self.limit = max(1.0, self.limit * DECREASE_FACTOR)
+                    reason = "overloaded" if overloaded else f"latency spike of {latency:.2f}s"
+                else:
+                    reason = None
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                reason = "healthy"
+            if latency is not None:
+                # spikes are clipped so that one outlier does not hide the next ones
+                sample = min(latency, self.latency_spike_factor * self.latency) if spike else latency
+                average = sample if self.latency is None else self.latency
+                self.latency = average + LATENCY_SMOOTHING * (sample - average)
+                self.samples += 1
+            after = int(self.limit)
+            if after != before:
+                self.lowest = min(self.lowest, after)
+                self.highest = max(self.highest, after)
+                self.logger.info("Concurrency limit of %s: %d -> %d (%s).", self.name, before, after, reason)
+                self._condition.notify_all()
@@ -0,0 +1,99 @@
+"""Index of the report days each stream has fully synced, and when.
+
+A report stream's bookmark only says how far the last sync got. The coverage
+index additionally remembers every window of days whose pages were all
+fetched and emitted, with the time they were synced, as a compact list of
+`[first_day, last_day, synced_at]` intervals per advertiser in the stream's
+state:
+
+    "bookmarks": {"ads_daily_report": {"replication_key_value": "...", "coverage": {
+        "7000000000000000000": [["2024-01-01", "2024-03-31", "2024-04-01T02:00:00+00:00"]]}}}
+
+Hourly streams are synced one day at a time, so a covered day means all of its
+hours. Adjacent intervals synced on the same day are merged, so the index stays
+a few intervals long however many days it covers.
+
+With the `refill` config, report streams request only the days of their
+`start_date`..`end_date` range that are not covered, or were covered before
+`stale_after_hours`, instead of everything after their bookmark.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+Interval = Tuple[date, date, datetime]
+
+ONE_DAY = timedelta(days=1)
+
+
+class CoverageIndex:
+    """Sorted, non-overlapping intervals of synced days, each with the time it was synced."""
+
+    def __init__(self, intervals: Iterable[Interval] = ()) -> None:
+        self.intervals: List[Interval] = []
+        for first, last, synced_at in intervals:
+            self.add(first, last, synced_at)
+
+    @classmethod
+    def from_state(cls, value: Optional[list]) -> "CoverageIndex":
+        return cls(
+            (date.fromisoformat(first), date.fromisoformat(last), datetime.fromisoformat(synced_at))
+            for first, last, synced_at in value or ()
+        )
+
+    def to_state(self) -> list:
+        return [
+            [first.isoformat(), last.isoformat(), synced_at.isoformat()] for first, last, synced_at in self.intervals
+        ]
+
+    def add(self, first: date, last: date, synced_at: datetime) -> None:
+        """Record that the days from `first` to `last` were synced at `synced_at`, superseding older syncs."""
+        intervals = []
+        for old_first, old_last, old_synced_at in self.intervals:
+            if old_last < first or old_first > last:
+                intervals.append((old_first, old_last, old_synced_at))
+                continue
+            # keep the parts of the overlapped interval outside of the new one
+            if old_first < first:
+                intervals.append((old_first, first - ONE_DAY, old_synced_at))
+            if old_last > last:
+                intervals.append((last + ONE_DAY, old_last, old_synced_at))
+        intervals.append((first, last, synced_at))
+        intervals.sort()
+
+        merged: List[Interval] = []
+        for interval in intervals:
+            if merged:
+                previous_first, previous_last, previous_synced_at = merged[-1]
+                if interval[0] == previous_last + ONE_DAY and interval[2].date() == previous_synced_at.date():
+                    # the merged interval keeps its earliest sync time, which is what staleness is judged on
+                    merged[-1] = (previous_first, interval[1], min(previous_synced_at, interval[2]))
+                    continue
+            merged.append(interval)
+        self.intervals = merged
+
+    def synced_at(self, day: date) -> Optional[datetime]:
+        """When `day` was last synced, or None if it is not covered."""
+        for first, last, synced_at in self.intervals:
+            if first <= day <= last:
+                return synced_at
+        return None
+
+    def gaps(
+        self,
+        start: date,
+        end: date,
+        is_stale: Optional[Callable[[date, datetime], bool]] = None,
+    ) -> List[Tuple[date, date]]:
+        """Return the runs of days from `start` to `end` that are not covered, or whose coverage `is_stale`."""
+        gaps: List[Tuple[date, date]] = []
+        day = start
+        while day <= end:
+            synced_at = self.synced_at(day)
+            if synced_at is None or (is_stale is not None and is_stale(day, synced_at)):
+                if gaps and gaps[-1][1] == day - ONE_DAY:
+                    gaps[-1] = (gaps[-1][0], day)
+                else:
+                    gaps.append((day, day))
+            day += ONE_DAY
+        return gaps
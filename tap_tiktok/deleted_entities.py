@@ -0,0 +1,138 @@
+"""Index of the deleted campaigns, ad groups and ads, to skip them in later report windows.
+
+With `include_deleted`, report requests ask for `STATUS_ALL` entities, so ads
+deleted years ago are scanned again in every window. With
+`skip_deleted_entities`, the tap keeps for each level the deleted entities and
+the last day they were active: the day they were deleted (from the entity
+streams' `modify_time`), or a later day on which a report row of theirs had
+non-zero metrics. A report window then only asks for the deleted entities still
+active on or after its first day:
+
+- if there are none, the window is requested with `STATUS_NOT_DELETE`;
+- if there are at most `MAX_FILTERED_IDS`, the window is requested with
+  `STATUS_NOT_DELETE` and once more for those IDs only;
+- otherwise it is requested with `STATUS_ALL` as before.
+
+The decision is taken per window, so lookback, refill and backfill windows
+still get the entities deleted after they start. The index learns of deletions
+whenever the `campaigns`, `ad_groups` and `ads` streams are synced, and a level
+is only used once its entity stream has been synced in full in the same run:
+until then, an entity deleted since the last run would be missing from both
+series, so windows are requested with `STATUS_ALL`.
+
+The index is kept in the STATE, under the bookmark of each level's entity
+stream. It is read from there when first used and merged back by the streams
+before they write a STATE message, on the main thread, as it is updated on the
+scheduler's threads.
+"""
+
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Set, Tuple
+
+from tap_tiktok.entity_cache import ENTITY_LEVELS
+
+# report filter of each level's IDs, and the number of IDs it may hold
+ID_FILTER_FIELDS = {
+    "ad_id": "ad_ids",
+    "adgroup_id": "adgroup_ids",
+    "campaign_id": "campaign_ids",
+}
+MAX_FILTERED_IDS = 100
+# ID field of the entity streams' records
+ENTITY_STREAM_ID_FIELDS = {level.stream_name: level.id_field for level in ENTITY_LEVELS.values()}
+# report days follow the advertiser's time zone while modify_time is UTC
+MARGIN_DAYS = 1
+
+
+def is_deleted(record: dict) -> bool:
+    return record.get("operation_status") == "DELETE" or str(record.get("secondary_status") or "").endswith("_DELETE")
+
+
+def has_activity(row: dict, metrics: List[str]) -> bool:
+    """Whether a report row has any non-zero metric."""
+    for metric in metrics:
+        try:
+            if float(row.get(metric) or 0):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+class DeletedEntityIndex:
+    """Deleted entities by level, with the last day they were active, kept in the entity streams' bookmarks."""
+
+    def __init__(self, advertiser_id: str, state: dict) -> None:
+        self.advertiser_id = str(advertiser_id)
+        self._state = state
+        self._levels: Dict[str, Dict[str, str]] = {}
+        self._refreshed: Set[str] = set()
+        # levels whose entity stream is synced without the statuses, which cannot be refreshed
+        self._unobserved: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _level(self, id_field: str) -> Dict[str, str]:
+        level = self._levels.get(id_field)
+        if level is None:
+            bookmark = self._state.get("bookmarks", {}).get(ENTITY_LEVELS[id_field].stream_name, {})
+            level = self._levels[id_field] = dict(bookmark.get("deleted_entities", {}).get(self.advertiser_id, {}))
+        return level
+
+    def observe(self, id_field: str, record: dict) -> None:
+        """Index or unindex an entity as its entity stream returns it."""
+        if "operation_status" not in record and "secondary_status" not in record:
+            # the statuses were not selected
+            with self._lock:
+                self._unobserved.add(id_field)
+            return
+        entity_id = str(record[id_field])
+        with self._lock:
+            level = self._level(id_field)
+            if is_deleted(record):
+                deleted_on = str(record.get("modify_time") or date.today().isoformat())[:10]
+                level[entity_id] = max(level.get(entity_id, deleted_on), deleted_on)
+            else:
+                level.pop(entity_id, None)
+
+    def mark_refreshed(self, id_field: str) -> None:
+        """Record that the entity stream of `id_field` returned all its entities in this run."""
+        with self._lock:
+            if id_field not in self._unobserved:
+                self._level(id_field)
+                self._refreshed.add(id_field)
+
+    def is_refreshed(self, id_field: str) -> bool:
+        with self._lock:
+            return id_field in self._refreshed
+
+    def record_activity(self, id_field: str, row: dict, day_field: str, metrics: List[str]) -> None:
+        """Move the last active day of a deleted entity to the day of `row`, if later and any metric is non-zero."""
+        with self._lock:
+            level = self._level(id_field)
+            entity_id = row[id_field]
+            last_active = level.get(entity_id)
+            day = row[day_field][:10]
+            if last_active is not None and day > last_active and has_activity(row, metrics):
+                level[entity_id] = day
+
+    def partition(self, id_field: str, first_day: date) -> Tuple[List[str], int]:
+        """The deleted entities still active on or after `first_day`, and the number of those that are not."""
+        since = (first_day - timedelta(days=MARGIN_DAYS)).isoformat()
+        with self._lock:
+            level = self._level(id_field)
+            active = sorted(entity_id for entity_id, last_active in level.items() if last_active >= since)
+            return active, len(level) - len(active)
+
+    def merge_into(self, state: dict) -> bool:
+        """Write the levels in use to the bookmarks of their entity streams in `state`, return whether any changed."""
+        changed = False
+        with self._lock:
+            for id_field, level in self._levels.items():
+                bookmark = state.setdefault("bookmarks", {}).setdefault(ENTITY_LEVELS[id_field].stream_name, {})
+                by_advertiser = bookmark.get("deleted_entities", {})
+                if by_advertiser.get(self.advertiser_id) != level:
+                    # a new dict, as the state may be read on other threads
+                    bookmark["deleted_entities"] = {**by_advertiser, self.advertiser_id: dict(level)}
+                    changed = True
+        return changed
@@ -0,0 +1,214 @@
+"""Compact index of the campaigns, ad groups and ads, to enrich report rows.
+
+Report rows only carry the ID of their ad, ad group or campaign. With
+`enrich_reports`, report streams add the name of that entity and the IDs and
+names of the levels above it, e.g. `ads_daily_report` rows get `ad_name`,
+`adgroup_id`, `adgroup_name`, `campaign_id` and `campaign_name`.
+
+A level is loaded once per run. If its entity stream (`campaigns`, `ad_groups`
+or `ads`) was synced in full earlier in the run, the index keeps the entities
+that stream returned. Otherwise it is loaded the first time a report stream
+needs it, by paging through its entity endpoint with only the ID, name and
+parent ID as `fields`; nothing is emitted. In memory each level maps its integer IDs to a
+position in parallel arrays of parent IDs and names. Past
+`entity_cache_max_entities` entities the index moves to a temporary SQLite
+database, kept on disk and deleted when closed, where a lookup is a primary key
+search. Either way a row costs one lookup per level.
+"""
+
+import logging
+import sqlite3
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_MAX_ENTITIES = 1_000_000
+# parent ID of the entities at the top of the hierarchy
+NO_PARENT = 0
+
+logger = logging.getLogger(__name__)
+
+
+class EntityLevel(NamedTuple):
+    stream_name: str
+    id_field: str
+    name_field: str
+    parent_field: Optional[str]
+
+    @property
+    def fields(self) -> List[str]:
+        return [self.id_field, self.name_field] + ([self.parent_field] if self.parent_field else [])
+
+
+# by ID field, from the bottom of the hierarchy up
+ENTITY_LEVELS = {
+    "ad_id": EntityLevel("ads", "ad_id", "ad_name", "adgroup_id"),
+    "adgroup_id": EntityLevel("ad_groups", "adgroup_id", "adgroup_name", "campaign_id"),
+    "campaign_id": EntityLevel("campaigns", "campaign_id", "campaign_name", None),
+}
+
+
+def enrichment_fields(id_field: str) -> List[str]:
+    """The fields enrichment adds to rows identified by `id_field`: its name, then the IDs and names above it."""
+    level = ENTITY_LEVELS[id_field]
+    fields = [level.name_field]
+    while level.parent_field:
+        level = ENTITY_LEVELS[level.parent_field]
+        fields += [level.id_field, level.name_field]
+    return fields
+
+
+class _MemoryLevel:
+    __slots__ = ("positions", "parents", "names")
+
+    def __init__(self) -> None:
+        self.positions: Dict[int, int] = {}
+        self.parents = array("q")
+        self.names: List[str] = []
+
+    def add(self, entity_id: int, name: str, parent_id: int) -> bool:
+        """Add or update an entity, return whether it is new."""
+        position = self.positions.get(entity_id)
+        if position is not None:
+            self.names[position] = name
+            self.parents[position] = parent_id
+            return False
+        self.positions[entity_id] = len(self.names)
+        self.names.append(name)
+        self.parents.append(parent_id)
+        return True
+
+    def get(self, entity_id: int) -> Optional[Tuple[str, int]]:
+        position = self.positions.get(entity_id)
+        if position is None:
+            return None
+        return self.names[position], self.parents[position]
+
+
+def _entity(level: EntityLevel, record: dict) -> Tuple[int, str, int]:
+    parent_id = record.get(level.parent_field) if level.parent_field else None
+    return int(record[level.id_field]), record.get(level.name_field) or "", int(parent_id or NO_PARENT)
+
+
+class EntityCache:
+    """Names and parents of the entities of an advertiser, loaded level by level through `fetch`."""
+
+    def __init__(
+        self,
+        fetch: Callable[[EntityLevel], Iterable[dict]],
+        max_entities: int = DEFAULT_MAX_ENTITIES,
+    ) -> None:
+        self.fetch = fetch
+        self.max_entities = max_entities
+        self.size = 0
+        self._levels: Dict[str, _MemoryLevel] = {}
+        self._loaded: set = set()
+        # levels whose entity stream returned records without the fields the index keeps
+        self._unusable: set = set()
+        self._load_lock = threading.Lock()
+        self._add_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    @property
+    def spilled(self) -> bool:
+        return self._db is not None
+
+    def ensure(self, id_field: str) -> None:
+        """Load the level of `id_field` and the levels above it, unless already loaded."""
+        level: Optional[EntityLevel] = ENTITY_LEVELS[id_field]
+        while level is not None:
+            if level.id_field not in self._loaded:
+                with self._load_lock:
+                    if level.id_field not in self._loaded:
+                        self._load(level)
+                        self._loaded.add(level.id_field)
+            level = ENTITY_LEVELS[level.parent_field] if level.parent_field else None
+
+    def observe(self, id_field: str, record: dict) -> None:
+        """Add an entity synced by the entity stream of the level of `id_field`, see `mark_synced`."""
+        if id_field in self._loaded or id_field in self._unusable:
+            return
+        level = ENTITY_LEVELS[id_field]
+        if not all(field in record for field in level.fields):
+            # e.g. the entity names are deselected: the level is fetched when needed
+            self._unusable.add(id_field)
+            return
+        self.add(id_field, [_entity(level, record)])
+
+    def mark_synced(self, id_field: str) -> None:
+        """Use the entities observed for the level of `id_field`: its entity stream returned all of them."""
+        with self._load_lock:
+            if id_field not in self._unusable:
+                self._loaded.add(id_field)
+
+    def _load(self, level: EntityLevel) -> None:
+        batch = []
+        for record in self.fetch(level):
+            batch.append(_entity(level, record))
+            if len(batch) >= 1000:
+                self.add(level.id_field, batch)
+                batch = []
+        self.add(level.id_field, batch)
+
+    def add(self, id_field: str, entities: Iterable[Tuple[int, str, int]]) -> None:
+        """Add `(ID, name, parent ID)` entities to the level of `id_field`."""
+        # entity streams add the entities they sync while report streams load other levels
+        with self._add_lock:
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)",
+                        ((id_field, entity_id, parent_id, name) for entity_id, name, parent_id in entities),
+                    )
+                return
+            level = self._levels.setdefault(id_field, _MemoryLevel())
+            for entity_id, name, parent_id in entities:
+                self.size += level.add(entity_id, name, parent_id)
+            if self.size > self.max_entities:
+                self._spill()
+
+    def _spill(self) -> None:
+        logger.info("Moving the index of %d entities to disk.", self.size)
+        # an empty name opens a private database on disk, deleted when closed
+        db = sqlite3.connect("", check_same_thread=False)
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute(
+            "CREATE TABLE entities (level TEXT, id INTEGER, parent INTEGER, name TEXT, PRIMARY KEY (level, id))"
+            " WITHOUT ROWID"
+        )
+        for id_field, level in self._levels.items():
+            entities = zip(level.positions, level.names, level.parents)
+            db.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)",
+                ((id_field, entity_id, parent_id, name) for entity_id, name, parent_id in entities),
+            )
+        # lookups keep reading the levels in memory until the database holds all of them
+        with self._db_lock:
+            self._db = db
+            self._levels = {}
+
+    def get(self, id_field: str, entity_id: int) -> Optional[Tuple[str, int]]:
+        """Return the name and parent ID of an entity, None if it is unknown."""
+        # the levels are read first: they are only dropped once the database is published
+        levels, db = self._levels, self._db
+        if db is None:
+            level = levels.get(id_field)
+            return level.get(entity_id) if level is not None else None
+        with self._db_lock:
+            return db.execute(
+                "SELECT name, parent FROM entities WHERE level = ? AND id = ?", (id_field, entity_id)
+            ).fetchone()
+
+    def enrich(self, record: dict, id_field: str) -> None:
+        """Add the name of the record's entity and the IDs and names of its parents to `record`, in place."""
+        self.ensure(id_field)
+        level = ENTITY_LEVELS[id_field]
+        entity_id = record.get(id_field)
+        while level is not None:
+            entity = self.get(level.id_field, int(entity_id)) if entity_id else None
+            record[level.id_field] = entity_id
+            record[level.name_field] = entity[0] if entity else None
+            parent_id = entity[1] if entity and entity[1] != NO_PARENT else None
+            entity_id = str(parent_id) if parent_id else None
+            level = ENTITY_LEVELS[level.parent_field] if level.parent_field else None
@@ -0,0 +1,205 @@
+"""TikTok API error classification, retry waits and per-endpoint circuit breaking.
+
+The Business API answers most errors with HTTP 200 and a non-zero `code` in
+the body. `classify_error` sorts those codes into errors worth retrying (rate
+limiting, transient server-side failures) and fatal ones (permissions, bad
+parameters, invalid tokens) so that only the former go through the request
+backoff. Retries happen per request, i.e. per page: a failing page is retried
+on its own without restarting its report window.
+"""
+
+import enum
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import requests
+from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 120.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
+
+class ErrorKind(str, enum.Enum):
+    """How a failed request is handled."""
+
+    RATE_LIMITED = "rate_limited"
+    RETRIABLE = "retriable"
+    FATAL = "fatal"
+
+
+# Business API error codes, as listed in the API's error code reference
+ERROR_CODES: Dict[int, Tuple[ErrorKind, str]] = {
+    40001: (ErrorKind.FATAL, "No permission to operate the advertiser"),
+    40002: (ErrorKind.FATAL, "Invalid request parameters"),
+    40006: (ErrorKind.FATAL, "No permission to access the resource"),
+    40100: (ErrorKind.RATE_LIMITED, "Too many requests"),
+    40102: (ErrorKind.FATAL, "Access token expired"),
+    40104: (ErrorKind.FATAL, "Access token missing"),
+    40105: (ErrorKind.FATAL, "Access token invalid or revoked"),
+    40133: (ErrorKind.RATE_LIMITED, "Advertiser request quota exceeded"),
+    40200: (ErrorKind.RETRIABLE, "Task failed, please retry"),
+    40201: (ErrorKind.RETRIABLE, "Task not ready yet"),
+    50000: (ErrorKind.RETRIABLE, "System error"),
+    50002: (ErrorKind.RETRIABLE, "Internal service error, please retry"),
+    51000: (ErrorKind.RETRIABLE, "Service temporarily unavailable"),
+}
+
+
+def classify_error(code: Optional[int], message: Optional[str]) -> ErrorKind:
+    """Return how to handle a Business API error `code`.
+
+    Codes missing from `ERROR_CODES` are retried if they are server-side (5xxxx)
+    or their message asks to retry, and are fatal otherwise.
+    """
+    if code in ERROR_CODES:
+        return ERROR_CODES[code][0]
+    if (isinstance(code, int) and code >= 50000) or "retry" in (message or "").lower():
+        return ErrorKind.RETRIABLE
+    return ErrorKind.FATAL
+
+
+def retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    """Seconds to wait according to the response's `Retry-After` header, if any."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TikTokRetriableError(RetriableAPIError):
+    """A failed request worth retrying, with the server's wait hint if it sent one."""
+
+    def __init__(
+        self,
+        message: str,
+        response: Optional[requests.Response] = None,
+        code: Optional[int] = None,
+        kind: ErrorKind = ErrorKind.RETRIABLE,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        super().__init__(message, response)
+        self.code = code
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class TikTokFatalError(FatalAPIError):
+    """A failed request that retrying will not fix."""
+
+    def __init__(self, message: str, code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class CircuitOpenError(TikTokRetriableError):
+    """Raised instead of calling an endpoint that keeps failing, until its cool-down ends."""
+
+
+def backoff_waits(base: float = BACKOFF_BASE_SECONDS, maximum: float = BACKOFF_MAX_SECONDS):
+    """Wait generator for `backoff.on_exception`: jittered exponential waits, or the server's hint if longer.
+
+    The decorator sends each exception into the generator, so waits can honour
+    the `retry_after` of `TikTokRetriableError`.
+    """
+    attempt = 0
+    exception = yield
+    while True:
+        wait = min(maximum, base * 2**attempt) * random.uniform(0.5, 1.0)
+        attempt += 1
+        hint = getattr(exception, "retry_after", None)
+        if hint is not None:
+            wait = max(wait, min(hint, maximum))
+        exception = yield wait
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after consecutive failures, for a cool-down period.
+
+    After `failure_threshold` consecutive failures the circuit opens and requests
+    fail fast with `CircuitOpenError` (whose wait hint is the remaining cool-down).
+    Once the cool-down is over, a single trial request is let through: success
+    closes the circuit, failure opens it again for twice as long.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+    ) -> None:
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.cool_down = reset_seconds
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cool_down - time.monotonic()
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(
+                    f"Circuit open for {self.endpoint} after {self.failures} consecutive failures.",
+                    retry_after=max(remaining, 1.0),
+                )
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.cool_down = self.reset_seconds
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running:
+                self._trial_running = False
+                self.cool_down = min(self.cool_down * 2, BACKOFF_MAX_SECONDS)
+                self.opened_at = time.monotonic()
+            elif self.opened_at is None and self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class CircuitBreakers:
+    """One `CircuitBreaker` per endpoint, shared by all streams of a tap."""
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    endpoint, self.failure_threshold, self.reset_seconds
+                )
+            return breaker
@@ -0,0 +1,90 @@
+"""Per-stream freshness policies: which report days are fetched again, and when.
+
+TikTok keeps revising report metrics after the fact: conversions and results are
+attributed to the day (and hour) of the ad interaction for as long as the
+attribution window, `billed_cost` lags up to 11 hours and the delivery metrics
+settle within a few hours. Instead of re-fetching the last `lookback` days of
+every report stream, with the `freshness` config each report stream fetches,
+besides the days after its bookmark:
+
+- the days still mutable given the metrics it requests, on every run. Hourly
+  streams only emit the hours of such a day that were still mutable when it was
+  last synced;
+- then each settled day once more, on the first run after it settled;
+- then settled days again on a decaying schedule, as a safety net for late
+  corrections: daily for `refresh_daily_days` days, then weekly until
+  `refresh_weekly_days` days after they settled, and never after that.
+
+    "freshness": {"attribution_window_days": 7, "streams": {"ads_hourly_report": {"attribution_window_days": 1}}}
+
+When each day was last synced is read from the coverage index, see
+tap_tiktok.coverage. Day and hour boundaries are taken in UTC.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Optional
+
+DEFAULT_ATTRIBUTION_WINDOW_DAYS = 7
+DEFAULT_REFRESH_DAILY_DAYS = 3
+DEFAULT_REFRESH_WEEKLY_DAYS = 28
+# documented delay of billed_cost, and the time the delivery metrics take to settle
+BILLED_COST_LAG_HOURS = 11
+SETTLE_HOURS = 3
+
+ATTRIBUTED_METRIC = re.compile(r"conversion|result")
+ONE_HOUR = timedelta(hours=1)
+
+
+def metric_lag_hours(metric: str, attribution_window_days: int) -> int:
+    """Number of hours after the end of an hour during which TikTok may still revise `metric` for it."""
+    if ATTRIBUTED_METRIC.search(metric):
+        return attribution_window_days * 24
+    if metric == "billed_cost":
+        return BILLED_COST_LAG_HOURS
+    return SETTLE_HOURS
+
+
+class FreshnessPolicy:
+    """Decides which synced days of a report stream are due to be fetched again."""
+
+    def __init__(
+        self,
+        mutable_hours: int,
+        refresh_daily_days: int = DEFAULT_REFRESH_DAILY_DAYS,
+        refresh_weekly_days: int = DEFAULT_REFRESH_WEEKLY_DAYS,
+    ) -> None:
+        self.lag = timedelta(hours=mutable_hours)
+        self.refresh_daily_days = refresh_daily_days
+        self.refresh_weekly_days = refresh_weekly_days
+
+    @classmethod
+    def from_config(cls, config: dict, stream_name: str, metrics: Iterable[str]) -> "FreshnessPolicy":
+        """Build the policy of `stream_name` requesting `metrics` from the `freshness` config and its overrides."""
+        config = {**config, **config.get("streams", {}).get(stream_name, {})}
+        attribution_window_days = config.get("attribution_window_days", DEFAULT_ATTRIBUTION_WINDOW_DAYS)
+        return cls(
+            max(metric_lag_hours(metric, attribution_window_days) for metric in metrics),
+            config.get("refresh_daily_days", DEFAULT_REFRESH_DAILY_DAYS),
+            config.get("refresh_weekly_days", DEFAULT_REFRESH_WEEKLY_DAYS),
+        )
+
+    def horizon(self, now: datetime) -> date:
+        """First day that can still be due at `now`: older days are final."""
+        return (now - self.lag - timedelta(days=self.refresh_weekly_days + 1)).date()
+
+    def refetch_from(self, day: date, synced_at: datetime, now: datetime) -> Optional[datetime]:
+        """Return the first hour of `day`, last synced at `synced_at`, to emit again at `now`, None if it is not due."""
+        day_start = datetime.combine(day, time(), tzinfo=timezone.utc)
+        settled_at = day_start + timedelta(days=1) + self.lag
+        if synced_at < settled_at:
+            # only the hours ending less than the lag before the last sync could have changed since
+            first_hour = (synced_at - self.lag - ONE_HOUR).replace(minute=0, second=0, microsecond=0)
+            return max(day_start, first_hour)
+        days_settled = (now - settled_at).days
+        days_since_sync = (now.date() - synced_at.date()).days
+        if days_settled < self.refresh_daily_days and days_since_sync >= 1:
+            return day_start
+        if days_settled < self.refresh_weekly_days and days_since_sync >= 7:
+            return day_start
+        return None
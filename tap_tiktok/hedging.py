@@ -0,0 +1,206 @@
+"""Hedged requests, to cut the tail latency of report pages.
+
+A few report pages take many times the usual latency to answer. With the
+`hedging` config, a page that has not answered after the `percentile` of the
+stream's recent latencies is requested a second time, and whichever request
+answers first is used; the other one stops retrying:
+
+    "hedging": {"percentile": 0.95, "max_rate": 0.05}
+
+Hedges start once `MIN_SAMPLES` latencies are known, and at most `max_rate` of
+the requests are duplicated so that quota usage stays bounded. Duplicates go
+through the same request path, so they count against the request budgets and
+the access-token pool like any other request.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Optional, Tuple, TypeVar
+
+from tap_tiktok.instrumentation import StreamPerformance
+
+R = TypeVar("R")
+
+DEFAULT_PERCENTILE = 0.95
+DEFAULT_MAX_RATE = 0.05
+# latencies the threshold is computed from, and needed before the first hedge
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+
+class HedgeLost(Exception):
+    """Raised instead of retrying a request once its hedged counterpart has answered."""
+
+
+class _HedgedCall:
+    """A request on its caller's thread, and the duplicate that may be sent for it."""
+
+    def __init__(self, duplicate: Callable[[], R]) -> None:
+        self.duplicate = duplicate
+        self.lock = threading.Lock()
+        # set once the request has answered or failed, after which no duplicate is sent
+        self.finished = False
+        self.hedge: "Optional[Future[R]]" = None
+        # set when the other one answers first, so that the request (or the duplicate) stops retrying
+        self.request_lost = threading.Event()
+        self.hedge_lost = threading.Event()
+
+
+class Hedger:
+    """Sends a duplicate of the requests slower than a percentile of the recent latencies.
+
+    Requests run on their caller's thread. A single watcher thread sends the
+    duplicates, each on a thread of its own, for the requests still running at
+    their threshold.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = DEFAULT_PERCENTILE,
+        max_rate: float = DEFAULT_MAX_RATE,
+        performance: Optional[StreamPerformance] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.performance = performance
+        self.logger = logger or logging.getLogger(__name__)
+        self.requests = 0
+        self.hedged = 0
+        # hedges that answered before the request they duplicate
+        self.won = 0
+        # requests whose answer was not used, as the other one answered first
+        self.wasted = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        # requests to hedge at their deadline, watched by a single thread started with the first of them
+        self._deadlines: List[Tuple[float, int, _HedgedCall]] = []
+        self._deadlines_changed = threading.Condition()
+        self._sequence = itertools.count()
+        self._watcher: Optional[threading.Thread] = None
+        self._local = threading.local()
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """Latency after which a request is hedged, None until enough latencies are known."""
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def lost(self) -> bool:
+        """Whether the request (or duplicate) running on this thread is beaten by the other one, see HedgeLost."""
+        lost = getattr(self._local, "lost", None)
+        return lost is not None and lost.is_set()
+
+    def call(self, request: Callable[[], R], duplicate: Callable[[], R]) -> R:
+        """Return the answer of `request`, or of `duplicate` if it is sent after the threshold and answers first.
+
+        `request` runs on this thread, so a duplicate that answers first is used once the
+        current attempt of `request` ends; `request` does not retry after that.
+        """
+        with self._lock:
+            self.requests += 1
+        threshold = self.threshold
+        if threshold is None:
+            start = time.perf_counter()
+            result = request()
+            self._record(time.perf_counter() - start)
+            return result
+
+        call = _HedgedCall(duplicate)
+        self._watch(call, time.monotonic() + threshold)
+        self._local.lost = call.request_lost
+        start = time.perf_counter()
+        try:
+            result = request()
+        except BaseException as error:
+            with call.lock:
+                call.finished = True
+            if call.hedge is None:
+                raise
+            # the duplicate may still answer
+            try:
+                result = call.hedge.result()
+            except BaseException:
+                raise error from None
+            self._count_win(won=True)
+            return result
+        finally:
+            self._local.lost = None
+        self._record(time.perf_counter() - start)
+        with call.lock:
+            call.finished = True
+        if call.hedge is None:
+            return result
+        call.hedge_lost.set()
+        hedge_first = call.hedge.done() and call.hedge.exception() is None
+        self._count_win(won=hedge_first)
+        return call.hedge.result() if hedge_first else result
+
+    def _count_win(self, won: bool) -> None:
+        with self._lock:
+            self.won += won
+            self.wasted += 1
+        if self.performance is not None:
+            self.performance.record_wasted()
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.max_rate * self.requests:
+                return False
+            self.hedged += 1
+        if self.performance is not None:
+            self.performance.record_hedge()
+        return True
+
+    def _watch(self, call: _HedgedCall, deadline: float) -> None:
+        with self._deadlines_changed:
+            heapq.heappush(self._deadlines, (deadline, next(self._sequence), call))
+            self._deadlines_changed.notify()
+            if self._watcher is None:
+                # it waits for the deadlines of the stream's requests until the exit
+                self._watcher = threading.Thread(target=self._watch_deadlines, name=f"{self.name}-hedger", daemon=True)
+                self._watcher.start()
+
+    def _watch_deadlines(self) -> None:
+        while True:
+            with self._deadlines_changed:
+                while not self._deadlines or self._deadlines[0][0] > time.monotonic():
+                    self._deadlines_changed.wait(self._deadlines[0][0] - time.monotonic() if self._deadlines else None)
+                _, _, call = heapq.heappop(self._deadlines)
+            self._hedge(call)
+
+    def _hedge(self, call: _HedgedCall) -> None:
+        with call.lock:
+            if call.finished or not self._may_hedge():
+                return
+            call.hedge = Future()
+        self.logger.debug("Hedging a request of %s slower than its threshold.", self.name)
+
+        def run() -> None:
+            self._local.lost = call.hedge_lost
+            start = time.perf_counter()
+            try:
+                result = call.duplicate()
+            except BaseException as error:
+                call.hedge.set_exception(error)
+                return
+            self._record(time.perf_counter() - start)
+            call.request_lost.set()
+            call.hedge.set_result(result)
+
+        # a duplicate that loses ends with its current attempt, it must not hold up the exit meanwhile
+        threading.Thread(target=run, name=f"{self.name}-hedge", daemon=True).start()
+
+    def _record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
@@ -0,0 +1,27 @@
+"""Small helpers shared by the streams and paginators."""
+
+import time
+
+from requests import Response
+
+
+def response_json(response: Response) -> dict:
+    """Decode a response body once, however many readers (stream, paginator) it has."""
+    payload = getattr(response, "_tiktok_json", None)
+    if payload is None:
+        start = time.perf_counter()
+        payload = response.json()
+        response._tiktok_decode_seconds = time.perf_counter() - start
+        response._tiktok_json = payload
+    return payload
+
+
+def decode_seconds(response: Response) -> float:
+    """Time it took `response_json` to decode the response body."""
+    return getattr(response, "_tiktok_decode_seconds", 0.0)
+
+
+def page_info(response: Response) -> tuple[int, int]:
+    """Return the (page, total_page) a paginated response reports."""
+    info = response_json(response).get("data", {}).get("page_info", {})
+    return info.get("page", 0), info.get("total_page", 0)
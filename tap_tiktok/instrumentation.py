@@ -0,0 +1,230 @@
+"""Per-stream and per-window performance metrics.
+
+Every TikTok stream records, for each HTTP attempt, its latency and response size
+and, for each page, how long it took to decode and to parse into rows and how many
+rows it held. Totals are logged as Singer METRIC lines at the end of each report
+window and of each stream, and can be written to a Prometheus textfile (for the
+node exporter textfile collector) at the end of the sync.
+"""
+
+import enum
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from singer_sdk import metrics
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# latency quantiles are computed over the last requests only, so long syncs use bounded memory
+LATENCY_SAMPLES = 1000
+
+
+class PerformanceMetric(str, enum.Enum):
+    """Metric names logged in addition to the SDK's own."""
+
+    REQUEST_LATENCY = "http_request_latency"
+    RESPONSE_BYTES = "http_response_bytes"
+    RETRY_COUNT = "http_retry_count"
+    HEDGED_COUNT = "http_hedged_count"
+    WASTED_COUNT = "http_wasted_count"
+    DECODE_DURATION = "decode_duration"
+    PARSE_DURATION = "parse_duration"
+    PAGE_COUNT = "page_count"
+    EMPTY_PAGE_RATIO = "empty_page_ratio"
+    ROWS_PER_PAGE = "rows_per_page"
+    ROWS_PER_SECOND = "rows_per_second"
+
+
+@dataclass
+class PerformanceStats:
+    """Counters for one stream, or one window of a stream."""
+
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+    latency_count: int = 0
+    latency_sum: float = 0.0
+    latency_max: float = 0.0
+    bucket_counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    response_bytes: int = 0
+    retries: int = 0
+    # duplicates of slow requests sent, and requests whose answer was not used, see tap_tiktok.hedging
+    hedged: int = 0
+    wasted: int = 0
+    decode_seconds: float = 0.0
+    parse_seconds: float = 0.0
+    pages: int = 0
+    empty_pages: int = 0
+    rows: int = 0
+    first_response_at: Optional[float] = None
+    last_page_at: Optional[float] = None
+
+    def add_response(self, latency: float, num_bytes: int) -> None:
+        self.latencies.append(latency)
+        self.latency_count += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.response_bytes += num_bytes
+        if self.first_response_at is None:
+            self.first_response_at = time.perf_counter()
+
+    def add_page(self, rows: int, decode_seconds: float, parse_seconds: float) -> None:
+        self.pages += 1
+        self.rows += rows
+        self.empty_pages += rows == 0
+        self.decode_seconds += decode_seconds
+        self.parse_seconds += parse_seconds
+        self.last_page_at = time.perf_counter()
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.first_response_at is None or self.last_page_at is None or self.last_page_at <= self.first_response_at:
+            return 0.0
+        return self.rows / (self.last_page_at - self.first_response_at)
+
+    def latency_quantile(self, quantile: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+class StreamPerformance:
+    """Collects the performance metrics of one stream, overall and per window."""
+
+    def __init__(self, stream_name: str, advertiser_id: Optional[str], logger=None) -> None:
+        self.stream_name = stream_name
+        self.advertiser_id = advertiser_id
+        self.logger = logger or metrics.get_metrics_logger()
+        self.total = PerformanceStats()
+        self.window: Optional[Tuple[str, str]] = None
+        self.window_stats = PerformanceStats()
+        self._lock = threading.Lock()
+
+    def start_window(self, start_date: str, end_date: str) -> None:
+        """Close the current window (logging its metrics) if a different one starts."""
+        with self._lock:
+            if self.window == (start_date, end_date):
+                return
+            self._log_window()
+            self.window = (start_date, end_date)
+            self.window_stats = PerformanceStats()
+
+    def record_response(self, latency: float, num_bytes: int) -> None:
+        with self._lock:
+            self.total.add_response(latency, num_bytes)
+            self.window_stats.add_response(latency, num_bytes)
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.total.retries += 1
+            self.window_stats.retries += 1
+
+    def record_hedge(self) -> None:
+        with self._lock:
+            self.total.hedged += 1
+            self.window_stats.hedged += 1
+
+    def record_wasted(self) -> None:
+        with self._lock:
+            self.total.wasted += 1
+            self.window_stats.wasted += 1
+
+    def record_page(self, rows: int, decode_seconds: float, parse_seconds: float) -> None:
+        with self._lock:
+            self.total.add_page(rows, decode_seconds, parse_seconds)
+            self.window_stats.add_page(rows, decode_seconds, parse_seconds)
+
+    def finish(self) -> None:
+        """Log the last window and the stream totals."""
+        with self._lock:
+            self._log_window()
+            self.window = None
+            self.window_stats = PerformanceStats()
+            if self.total.pages or self.total.latency_count:
+                self._log(self.total, {})
+
+    def _log_window(self) -> None:
+        if self.window is not None and (self.window_stats.pages or self.window_stats.latency_count):
+            self._log(self.window_stats, {"window_start": self.window[0], "window_end": self.window[1]})
+
+    def _log(self, stats: PerformanceStats, extra_tags: dict) -> None:
+        tags = {
+            metrics.Tag.STREAM: self.stream_name,
+            "advertiser_id": self.advertiser_id,
+            **extra_tags,
+        }
+        pages = stats.pages or 1
+        points = [
+            ("timer", PerformanceMetric.REQUEST_LATENCY, stats.latency_quantile(0.5), {"quantile": "0.5"}),
+            ("timer", PerformanceMetric.REQUEST_LATENCY, stats.latency_quantile(0.95), {"quantile": "0.95"}),
+            ("timer", PerformanceMetric.REQUEST_LATENCY, stats.latency_max, {"quantile": "1"}),
+            ("counter", PerformanceMetric.RESPONSE_BYTES, stats.response_bytes, {}),
+            ("counter", PerformanceMetric.RETRY_COUNT, stats.retries, {}),
+            ("counter", PerformanceMetric.HEDGED_COUNT, stats.hedged, {}),
+            ("counter", PerformanceMetric.WASTED_COUNT, stats.wasted, {}),
+            ("timer", PerformanceMetric.DECODE_DURATION, stats.decode_seconds, {}),
+            ("timer", PerformanceMetric.PARSE_DURATION, stats.parse_seconds, {}),
+            ("counter", PerformanceMetric.PAGE_COUNT, stats.pages, {}),
+            ("gauge", PerformanceMetric.EMPTY_PAGE_RATIO, stats.empty_pages / pages, {}),
+            ("gauge", PerformanceMetric.ROWS_PER_PAGE, stats.rows / pages, {}),
+            ("gauge", PerformanceMetric.ROWS_PER_SECOND, stats.rows_per_second, {}),
+        ]
+        for metric_type, metric, value, point_tags in points:
+            metrics.log(self.logger, metrics.Point(metric_type, metric, value, {**tags, **point_tags}))
+
+
+def _labels(performance: StreamPerformance, **extra: str) -> str:
+    labels = {"stream": performance.stream_name, "advertiser_id": performance.advertiser_id or "", **extra}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(performances: List[StreamPerformance]) -> str:
+    """Render the stream totals in the Prometheus text exposition format."""
+    lines = [
+        "# HELP tap_tiktok_request_duration_seconds Latency of TikTok API requests.",
+        "# TYPE tap_tiktok_request_duration_seconds histogram",
+    ]
+    for performance in performances:
+        stats = performance.total
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), stats.bucket_counts):
+            cumulative += count
+            labels = _labels(performance, le=str(bound))
+            lines.append(f"tap_tiktok_request_duration_seconds_bucket{labels} {cumulative}")
+        lines.append(f"tap_tiktok_request_duration_seconds_sum{_labels(performance)} {stats.latency_sum}")
+        lines.append(f"tap_tiktok_request_duration_seconds_count{_labels(performance)} {stats.latency_count}")
+
+    series: Dict[str, Tuple[str, str, str]] = {
+        "response_bytes_total": ("counter", "Bytes downloaded from the TikTok API.", "response_bytes"),
+        "retries_total": ("counter", "Retried TikTok API requests.", "retries"),
+        "hedged_requests_total": ("counter", "Duplicates sent of slow TikTok API requests.", "hedged"),
+        "wasted_requests_total": ("counter", "TikTok API requests whose answer was not used.", "wasted"),
+        "decode_seconds_total": ("counter", "Time spent decoding response bodies.", "decode_seconds"),
+        "parse_seconds_total": ("counter", "Time spent parsing response bodies into rows.", "parse_seconds"),
+        "pages_total": ("counter", "Pages received.", "pages"),
+        "empty_pages_total": ("counter", "Pages received without any row.", "empty_pages"),
+        "rows_total": ("counter", "Rows received.", "rows"),
+        "rows_per_second": ("gauge", "Rows received per second of sync.", "rows_per_second"),
+    }
+    for name, (metric_type, description, attribute) in series.items():
+        lines.append(f"# HELP tap_tiktok_{name} {description}")
+        lines.append(f"# TYPE tap_tiktok_{name} {metric_type}")
+        for performance in performances:
+            lines.append(f"tap_tiktok_{name}{_labels(performance)} {getattr(performance.total, attribute)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path: str, performances: List[StreamPerformance]) -> None:
+    """Atomically replace `path` so the textfile collector never reads a partial file."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    with os.fdopen(fd, "w") as tmp_file:
+        tmp_file.write(render_prometheus(performances))
+    os.replace(tmp_path, target)
@@ -0,0 +1,102 @@
+"""Near-real-time polling of today's hours for the hourly report streams.
+
+Started with `tap-tiktok --poll`, configured with the `intraday_polling` object:
+
+    "intraday_polling": {"interval_minutes": 15, "recheck_hours": 3}
+
+Every `interval_minutes` the selected hourly report streams fetch today's hours
+plus the last `recheck_hours` (which reach back into yesterday shortly after
+midnight) and emit only the hours that are new or whose metrics changed since
+the previous poll. The tap, and with it the HTTP session and the schemas, stays
+alive between polls.
+
+TikTok keeps updating the metrics of recent hours, so intraday rows are
+provisional: polls do not move the streams' bookmarks, which stay with the
+regular runs.
+"""
+
+import logging
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import pendulum
+
+if TYPE_CHECKING:
+    from singer_sdk import Tap
+
+DEFAULT_INTERVAL_MINUTES = 15
+DEFAULT_RECHECK_HOURS = 3
+HOUR_FORMAT = "YYYY-MM-DD HH:00:00"
+
+
+class HourFingerprints:
+    """Remembers a fingerprint of each emitted row to tell which rows changed since."""
+
+    def __init__(self, key_fields: list, time_field: str) -> None:
+        self.key_fields = key_fields
+        self.time_field = time_field
+        self._fingerprints: Dict[tuple, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def changed(self, record: dict) -> bool:
+        """Return whether `record` is new or differs from when it was last seen, and remember it."""
+        key = tuple(record[field] for field in self.key_fields)
+        fingerprint = hash(tuple(sorted(record.items())))
+        if self._fingerprints.get(key) == fingerprint:
+            return False
+        self._fingerprints[key] = fingerprint
+        return True
+
+    def prune(self, before: str) -> None:
+        """Forget the rows of the hours before `before`, which are no longer polled."""
+        position = self.key_fields.index(self.time_field)
+        self._fingerprints = {key: value for key, value in self._fingerprints.items() if key[position] >= before}
+
+
+def intraday_window(recheck_hours: int, now: Optional[pendulum.DateTime] = None):
+    """Return the (start, end) of the hours to poll: today, and at least the last `recheck_hours`."""
+    now = now or pendulum.now()
+    start = min(now.start_of("day"), now.subtract(hours=recheck_hours).start_of("hour"))
+    return start, now
+
+
+def poll_intraday(
+    tap: "Tap",
+    max_polls: Optional[int] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> None:
+    """Poll the selected hourly report streams until interrupted (or for `max_polls` polls)."""
+    logger: logging.Logger = tap.logger
+    settings = tap.config.get("intraday_polling") or {}
+    interval = settings.get("interval_minutes", DEFAULT_INTERVAL_MINUTES) * 60
+    recheck_hours = settings.get("recheck_hours", DEFAULT_RECHECK_HOURS)
+
+    streams = [stream for stream in tap.streams.values() if stream.selected and hasattr(stream, "intraday")]
+    if not streams:
+        logger.warning("No hourly report stream is selected, nothing to poll.")
+        return
+    logger.info("Polling %s every %s minutes.", ", ".join(stream.name for stream in streams), interval / 60)
+
+    polls = 0
+    while True:
+        start, end = intraday_window(recheck_hours)
+        started = time.perf_counter()
+        emitted = 0
+        for stream in streams:
+            with stream.intraday(start, end):
+                stream.sync()
+            emitted += stream.intraday_emitted
+        polls += 1
+        logger.info(
+            "Intraday poll %d of %s - %s emitted %d new or changed rows in %.1fs.",
+            polls,
+            start.format(HOUR_FORMAT),
+            end.format(HOUR_FORMAT),
+            emitted,
+            time.perf_counter() - started,
+        )
+        if max_polls is not None and polls >= max_polls:
+            return
+        sleep(interval)
@@ -0,0 +1,110 @@
+"""Merge-join of report rows fetched in several metric chunks.
+
+Reports with more metrics than one request may ask for are fetched once per
+chunk of metrics, with the same dimensions, and joined on the primary key.
+The chunks are requested page by page and come back ordered by the same
+dimensions, so a row is usually complete as soon as its page has arrived for
+every chunk and only the unmatched frontier is buffered. Should TikTok ever
+order the chunks differently, rows waiting beyond `max_buffered_rows` are
+spilled to a temporary SQLite database instead of growing the buffer.
+"""
+
+import json
+import logging
+import sqlite3
+import tempfile
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_MAX_BUFFERED_ROWS = 10_000
+
+
+class ChunkMerger:
+    """Joins the rows of `num_chunks` metric chunks on `key_fields`, yielding rows once complete."""
+
+    def __init__(
+        self,
+        key_fields: List[str],
+        num_chunks: int,
+        max_buffered_rows: int = DEFAULT_MAX_BUFFERED_ROWS,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.key_fields = key_fields
+        self.complete = (1 << num_chunks) - 1
+        self.max_buffered_rows = max_buffered_rows
+        self.logger = logger or logging.getLogger(__name__)
+        # key -> (row merged so far, bitmask of the chunks it was seen in); insertion ordered, oldest first
+        self._pending: Dict[tuple, Tuple[dict, int]] = {}
+        self._spill_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._spill: Optional[sqlite3.Connection] = None
+        self.spilled = 0
+
+    def add(self, chunk_index: int, rows: Iterable[dict]) -> Iterator[dict]:
+        """Add the rows of one page of chunk `chunk_index` and yield the rows it completes."""
+        chunk_bit = 1 << chunk_index
+        for row in rows:
+            key = tuple(row[field] for field in self.key_fields)
+            entry = self._pending.pop(key, None)
+            if entry is None and self.spilled:
+                entry = self._unspill(key)
+            if entry is None:
+                merged, seen = row, chunk_bit
+            else:
+                merged, seen = entry
+                merged.update(row)
+                seen |= chunk_bit
+            if seen == self.complete:
+                yield merged
+            else:
+                self._pending[key] = (merged, seen)
+        if len(self._pending) > self.max_buffered_rows:
+            self._spill_oldest(len(self._pending) - self.max_buffered_rows // 2)
+
+    def finish(self) -> Iterator[dict]:
+        """Yield the rows that never arrived for every chunk, as far as they were merged."""
+        incomplete = len(self._pending) + self.spilled
+        if incomplete:
+            self.logger.warning(
+                "%d rows were not returned for every metric chunk and are emitted partially.", incomplete
+            )
+        for merged, _ in self._pending.values():
+            yield merged
+        self._pending = {}
+        if self._spill is not None:
+            for (row_json,) in self._spill.execute("SELECT row FROM pending ORDER BY rowid"):
+                yield json.loads(row_json)
+        self.close()
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self._spill_dir is not None:
+            self._spill_dir.cleanup()
+            self._spill_dir = None
+        self.spilled = 0
+
+    def _spill_oldest(self, count: int) -> None:
+        if self._spill is None:
+            self._spill_dir = tempfile.TemporaryDirectory(prefix="tap-tiktok-merge-")
+            self._spill = sqlite3.connect(Path(self._spill_dir.name) / "pending.sqlite")
+            self._spill.execute("CREATE TABLE pending (key TEXT PRIMARY KEY, seen INTEGER, row TEXT)")
+            self.logger.info(
+                "More than %d rows await their other metric chunks, spilling to disk.", self.max_buffered_rows
+            )
+        oldest = []
+        for key in list(islice(self._pending, count)):
+            merged, seen = self._pending.pop(key)
+            oldest.append((json.dumps(key), seen, json.dumps(merged)))
+        self._spill.executemany("INSERT INTO pending VALUES (?, ?, ?)", oldest)
+        self.spilled += len(oldest)
+
+    def _unspill(self, key: tuple) -> Optional[Tuple[dict, int]]:
+        key_json = json.dumps(key)
+        found = self._spill.execute("SELECT seen, row FROM pending WHERE key = ?", (key_json,)).fetchone()
+        if found is None:
+            return None
+        self._spill.execute("DELETE FROM pending WHERE key = ?", (key_json,))
+        self.spilled -= 1
+        return json.loads(found[1]), found[0]
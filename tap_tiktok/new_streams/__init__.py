@@ -1 +1 @@
-from .reports import *
+"""Report streams, registered by module path in tap_tiktok.tap and imported one module at a time."""
@@ -1,3 +0,0 @@
-from .ad_groups import *
-from .ads import *
-from .campaigns import *
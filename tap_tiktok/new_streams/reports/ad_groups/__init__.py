@@ -1,6 +0,0 @@
-from .ad_groups_basic_reports import (
-    AdGroupsDailyReportStream,
-    AdGroupsHourlyReportStream,
-    AdGroupsReservationDailyReportStream,
-    AdGroupsReservationHourlyReportStream,
-)
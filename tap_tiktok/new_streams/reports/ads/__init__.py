@@ -1,12 +0,0 @@
-from .ads_audience_reports import (
-    AdsAgeGenderReportStream,
-    AdsCountryReportStream,
-    AdsLanguageReportStream,
-    AdsPlatformReportStream,
-)
-from .ads_basic_reports import (
-    AdsDailyReportStream,
-    AdsHourlyReportStream,
-    AdsReservationDailyReportStream,
-    AdsReservationHourlyReportStream,
-)
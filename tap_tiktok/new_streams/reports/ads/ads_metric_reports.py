@@ -0,0 +1,46 @@
+from singer_sdk import typing as th
+
+from tap_tiktok.clients.metric_report import (
+    ATTRIBUTION_METRICS_PROPERTIES_LIST,
+    ENGAGEMENT_METRICS_PROPERTIES_LIST,
+    IN_APP_EVENT_METRICS_PROPERTIES_LIST,
+    PAGE_EVENT_METRICS_PROPERTIES_LIST,
+    VIDEO_PLAY_METRICS_PROPERTIES_LIST,
+    TikTokDailyMetricReportStream,
+)
+
+
+class AdsDailyMetricReportStream(TikTokDailyMetricReportStream):
+    data_level = "AUCTION_AD"
+    status_field = "ad_status"
+    dimensions = ["ad_id", "stat_time_day"]
+    replication_key = "stat_time_day"
+    report_specific_properties = th.PropertiesList(
+        th.Property("ad_id", th.StringType, description="Group by ad id"),
+        th.Property("stat_time_day", th.DateTimeType, description="Group by day"),
+    )
+
+
+class AdsVideoPlayMetricsByDayStream(AdsDailyMetricReportStream):
+    name = "ads_video_play_metrics_by_day"
+    metrics_properties = VIDEO_PLAY_METRICS_PROPERTIES_LIST
+
+
+class AdsEngagementMetricsByDayStream(AdsDailyMetricReportStream):
+    name = "ads_engagement_metrics_by_day"
+    metrics_properties = ENGAGEMENT_METRICS_PROPERTIES_LIST
+
+
+class AdsAttributionMetricsByDayStream(AdsDailyMetricReportStream):
+    name = "ads_attribution_metrics_by_day"
+    metrics_properties = ATTRIBUTION_METRICS_PROPERTIES_LIST
+
+
+class AdsPageEventMetricsByDayStream(AdsDailyMetricReportStream):
+    name = "ads_page_event_metrics_by_day"
+    metrics_properties = PAGE_EVENT_METRICS_PROPERTIES_LIST
+
+
+class AdsInAppEventMetricsByDayStream(AdsDailyMetricReportStream):
+    name = "ads_in_app_event_metrics_by_day"
+    metrics_properties = IN_APP_EVENT_METRICS_PROPERTIES_LIST
@@ -1,12 +0,0 @@
-from .campaigns_audience_reports import (
-    CampaignsAgeGenderReportStream,
-    CampaignsCountryReportStream,
-    CampaignsLanguageReportStream,
-    CampaignsPlatformReportStream,
-)
-from .campaigns_basic_reports import (
-    CampaignsDailyReportStream,
-    CampaignsHourlyReportStream,
-    CampaignsReservationDailyReportStream,
-    CampaignsReservationHourlyReportStream,
-)
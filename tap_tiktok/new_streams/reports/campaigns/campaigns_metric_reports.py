@@ -0,0 +1,46 @@
+from singer_sdk import typing as th
+
+from tap_tiktok.clients.metric_report import (
+    ATTRIBUTION_METRICS_PROPERTIES_LIST,
+    ENGAGEMENT_METRICS_PROPERTIES_LIST,
+    IN_APP_EVENT_METRICS_PROPERTIES_LIST,
+    PAGE_EVENT_METRICS_PROPERTIES_LIST,
+    VIDEO_PLAY_METRICS_PROPERTIES_LIST,
+    TikTokDailyMetricReportStream,
+)
+
+
+class CampaignsDailyMetricReportStream(TikTokDailyMetricReportStream):
+    data_level = "AUCTION_CAMPAIGN"
+    status_field = "campaign_status"
+    dimensions = ["campaign_id", "stat_time_day"]
+    replication_key = "stat_time_day"
+    report_specific_properties = th.PropertiesList(
+        th.Property("campaign_id", th.StringType, description="Group by campaign id"),
+        th.Property("stat_time_day", th.DateTimeType, description="Group by day"),
+    )
+
+
+class CampaignsVideoPlayMetricsByDayStream(CampaignsDailyMetricReportStream):
+    name = "campaigns_video_play_metrics_by_day"
+    metrics_properties = VIDEO_PLAY_METRICS_PROPERTIES_LIST
+
+
+class CampaignsEngagementMetricsByDayStream(CampaignsDailyMetricReportStream):
+    name = "campaigns_engagement_metrics_by_day"
+    metrics_properties = ENGAGEMENT_METRICS_PROPERTIES_LIST
+
+
+class CampaignsAttributionMetricsByDayStream(CampaignsDailyMetricReportStream):
+    name = "campaigns_attribution_metrics_by_day"
+    metrics_properties = ATTRIBUTION_METRICS_PROPERTIES_LIST
+
+
+class CampaignsPageEventMetricsByDayStream(CampaignsDailyMetricReportStream):
+    name = "campaigns_page_event_metrics_by_day"
+    metrics_properties = PAGE_EVENT_METRICS_PROPERTIES_LIST
+
+
+class CampaignsInAppEventMetricsByDayStream(CampaignsDailyMetricReportStream):
+    name = "campaigns_in_app_event_metrics_by_day"
+    metrics_properties = IN_APP_EVENT_METRICS_PROPERTIES_LIST
@@ -1,16 +1,29 @@
+from datetime import date, timedelta
+
 import pendulum
 from requests import Response
 from singer_sdk.pagination import BaseAPIPaginator
 
+from tap_tiktok.helpers import page_info
+
 PAGE_SIZE = 1000
 DAILY_STEP_NUM_DAYS = 30
 HOURLY_STEP_NUM_DAYS = 1
 
 
-class DailyReportPaginator(BaseAPIPaginator):
-    def __init__(self, start_date: pendulum.DateTime):
-        yesterday = pendulum.now().subtract(days=1)
-        end_date = min(start_date.add(days=DAILY_STEP_NUM_DAYS), yesterday)
+class ReportPaginator(BaseAPIPaginator):
+    @staticmethod
+    def _page_info(response: Response) -> tuple[int, int]:
+        return page_info(response)
+
+
+class DailyReportPaginator(ReportPaginator):
+    window_days = DAILY_STEP_NUM_DAYS
+
+    def __init__(self, start_date: pendulum.DateTime, end_date: pendulum.DateTime | None = None):
+        # last day to sync: the end bound if given, otherwise yesterday
+        self.last_day = end_date or pendulum.now().subtract(days=1)
+        end_date = min(start_date.add(days=DAILY_STEP_NUM_DAYS), self.last_day)
 
         start_value = {
             "page_size": PAGE_SIZE,
@@ -21,31 +34,25 @@ class DailyReportPaginator(BaseAPIPaginator):
         super().__init__(start_value)
 
     def has_more(self, response: Response) -> bool:
-        page_info = response.json().get("data", {}).get("page_info", {})
-        current_page = page_info.get("page", 0)
-        total_pages = page_info.get("total_page", 0)
+        current_page, total_pages = self._page_info(response)
         if current_page < total_pages:
             return True
         start_date = pendulum.parse(self.current_value["start_date"])
-        yesterday = pendulum.now().subtract(days=1)
-        end_date = min(start_date.add(days=DAILY_STEP_NUM_DAYS), yesterday)
-        if end_date.date() < yesterday.date():
+        end_date = min(start_date.add(days=DAILY_STEP_NUM_DAYS), self.last_day)
+        if end_date.date() < self.last_day.date():
             return True
         return False
 
     def get_next(self, response) -> dict[str, str]:
-        page_info = response.json().get("data", {}).get("page_info", {})
-        current_page = page_info.get("page", 0)
-        total_pages = page_info.get("total_page", 0)
+        current_page, total_pages = self._page_info(response)
         if current_page < total_pages:
             return {
                 **self.current_value,
                 "page": self.current_value["page"] + 1,
             }
         start_date = pendulum.parse(self.current_value["end_date"]).add(days=1)
-        yesterday = pendulum.now().subtract(days=1)
-        start_date = min(start_date, yesterday)
-        end_date = min(start_date.add(days=DAILY_STEP_NUM_DAYS), yesterday)
+        start_date = min(start_date, self.last_day)
+        end_date = min(start_date.add(days=DAILY_STEP_NUM_DAYS), self.last_day)
         return {
             "page_size": PAGE_SIZE,
             "page": 1,
@@ -54,8 +61,12 @@ class DailyReportPaginator(BaseAPIPaginator):
         }
 
 
-class HourlyReportPaginator(BaseAPIPaginator):
-    def __init__(self, start_date: pendulum.DateTime):
+class HourlyReportPaginator(ReportPaginator):
+    window_days = HOURLY_STEP_NUM_DAYS
+
+    def __init__(self, start_date: pendulum.DateTime, end_date: pendulum.DateTime | None = None):
+        # last day to sync: the end bound if given, otherwise yesterday
+        self.last_day = end_date or pendulum.now().subtract(days=1)
         end_date = start_date
         start_value = {
             "page_size": PAGE_SIZE,
@@ -66,30 +77,24 @@ class HourlyReportPaginator(BaseAPIPaginator):
         super().__init__(start_value)
 
     def has_more(self, response: Response) -> bool:
-        page_info = response.json().get("data", {}).get("page_info", {})
-        current_page = page_info.get("page", 0)
-        total_pages = page_info.get("total_page", 0)
+        current_page, total_pages = self._page_info(response)
         if current_page < total_pages:
             return True
+        # windows are a single day: continue until the last day has been fetched
         start_date = pendulum.parse(self.current_value["start_date"])
-        yesterday = pendulum.now().subtract(days=1)
-        end_date = min(start_date.add(days=HOURLY_STEP_NUM_DAYS), yesterday)
-        if end_date.date() < yesterday.date():
+        if start_date.date() < self.last_day.date():
             return True
         return False
 
     def get_next(self, response) -> dict[str, str]:
-        page_info = response.json().get("data", {}).get("page_info", {})
-        current_page = page_info.get("page", 0)
-        total_pages = page_info.get("total_page", 0)
+        current_page, total_pages = self._page_info(response)
         if current_page < total_pages:
             return {
                 **self.current_value,
                 "page": self.current_value["page"] + 1,
             }
         start_date = pendulum.parse(self.current_value["end_date"]).add(days=1)
-        yesterday = pendulum.now().subtract(days=1)
-        start_date = min(start_date, yesterday)
+        start_date = min(start_date, self.last_day)
         end_date = start_date
         return {
             "page_size": PAGE_SIZE,
@@ -97,3 +102,63 @@ class HourlyReportPaginator(BaseAPIPaginator):
             "start_date": start_date.to_date_string(),
             "end_date": end_date.to_date_string(),
         }
+
+
+class IntradayReportPaginator(ReportPaginator):
+    """Pages through the days from `start_date` to `end_date` (both included), one day per request."""
+
+    def __init__(self, start_date: pendulum.DateTime, end_date: pendulum.DateTime):
+        self.last_day = end_date.to_date_string()
+        day = start_date.to_date_string()
+        super().__init__({"page_size": PAGE_SIZE, "page": 1, "start_date": day, "end_date": day})
+
+    def has_more(self, response: Response) -> bool:
+        current_page, total_pages = self._page_info(response)
+        return current_page < total_pages or self.current_value["end_date"] < self.last_day
+
+    def get_next(self, response) -> dict[str, str]:
+        current_page, total_pages = self._page_info(response)
+        if current_page < total_pages:
+            return {
+                **self.current_value,
+                "page": self.current_value["page"] + 1,
+            }
+        day = pendulum.parse(self.current_value["end_date"]).add(days=1).to_date_string()
+        return {
+            "page_size": PAGE_SIZE,
+            "page": 1,
+            "start_date": day,
+            "end_date": day,
+        }
+
+
+class IntervalsReportPaginator(ReportPaginator):
+    """Pages through (first, last) day intervals in windows of at most `window_days` days."""
+
+    def __init__(self, intervals: list[tuple[date, date]], window_days: int):
+        self.windows = []
+        for first, last in intervals:
+            while first <= last:
+                window_last = min(first + timedelta(days=window_days - 1), last)
+                self.windows.append((first, window_last))
+                first = window_last + timedelta(days=1)
+        self.window_index = 0
+        super().__init__(self._window_token(0))
+
+    def _window_token(self, index: int) -> dict:
+        first, last = self.windows[index]
+        return {"page_size": PAGE_SIZE, "page": 1, "start_date": first.isoformat(), "end_date": last.isoformat()}
+
+    def has_more(self, response: Response) -> bool:
+        current_page, total_pages = self._page_info(response)
+        return current_page < total_pages or self.window_index < len(self.windows) - 1
+
+    def get_next(self, response) -> dict[str, str]:
+        current_page, total_pages = self._page_info(response)
+        if current_page < total_pages:
+            return {
+                **self.current_value,
+                "page": self.current_value["page"] + 1,
+            }
+        self.window_index += 1
+        return self._window_token(self.window_index)
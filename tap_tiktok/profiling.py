@@ -0,0 +1,176 @@
+"""Built-in profiling of stream syncs.
+
+Enabled with the `profile` config object:
+
+    "profile": {"mode": "deterministic", "output_dir": "profiles"}
+
+`deterministic` runs each stream's sync under cProfile and tracemalloc and writes
+`<stream>.prof` (loadable with pstats/snakeviz) and `<stream>.alloc.txt`.
+`sampling` instead samples the syncing thread's stack every `interval_ms` and
+writes `<stream>.collapsed` (folded stacks for flamegraph.pl or speedscope); its
+overhead is low enough to leave on in production, and `sample_rate` limits it to
+that fraction of runs. Both modes append the top hot functions (and allocation
+sites) of each stream to `summary.txt` and log them.
+
+The `--profile [deterministic|sampling]` switch profiles a single run instead.
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+DETERMINISTIC = "deterministic"
+SAMPLING = "sampling"
+TOP_N = 20
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval from a background thread."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._target_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tap-tiktok-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = TOP_N) -> List[str]:
+        """Functions by share of samples in which they were on top of the stack."""
+        total = sum(self.stacks.values()) or 1
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return [f"{count / total:6.1%}  {function}" for function, count in own.most_common(limit)]
+
+
+class SyncProfiler:
+    """Profiles each stream's sync and writes one set of dumps per stream."""
+
+    def __init__(
+        self,
+        output_dir: str = "profiles",
+        mode: str = DETERMINISTIC,
+        interval_ms: float = 10.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        if mode not in (DETERMINISTIC, SAMPLING):
+            raise ValueError(f"Unknown profile mode '{mode}', expected '{DETERMINISTIC}' or '{SAMPLING}'.")
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._tracing = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], logger: Optional[logging.Logger] = None) -> Optional["SyncProfiler"]:
+        """Return a profiler if profiling is configured and this run is drawn for it."""
+        if not config:
+            return None
+        if random.random() >= config.get("sample_rate", 1.0):
+            return None
+        return cls(
+            output_dir=config.get("output_dir", "profiles"),
+            mode=config.get("mode", DETERMINISTIC),
+            interval_ms=config.get("interval_ms", 10.0),
+            logger=logger,
+        )
+
+    @contextmanager
+    def profile(self, stream_name: str) -> Iterator[None]:
+        """Profile the code run in this thread until the block exits.
+
+        Allocations are traced process-wide, so when several streams are fetched
+        concurrently their allocation dumps overlap.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.mode == SAMPLING:
+            sampler = SamplingProfiler(self.interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                (self.output_dir / f"{stream_name}.collapsed").write_text(sampler.collapsed())
+                self._write_summary(stream_name, sampler.top_functions(), [])
+            return
+
+        # Streams fetched concurrently share tracemalloc, which stops with the last of them
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                self._tracing += 1
+            elif self._tracing:
+                self._tracing += 1
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            with self._lock:
+                if self._tracing:
+                    self._tracing -= 1
+                    if self._tracing == 0:
+                        tracemalloc.stop()
+            profiler.dump_stats(str(self.output_dir / f"{stream_name}.prof"))
+            allocations = [str(stat) for stat in after.compare_to(before, "lineno")[:TOP_N]]
+            allocations.append(f"peak traced memory: {peak / 1024 / 1024:.1f} MiB")
+            (self.output_dir / f"{stream_name}.alloc.txt").write_text("\n".join(allocations) + "\n")
+            self._write_summary(stream_name, self._top_functions(profiler), allocations)
+
+    @staticmethod
+    def _top_functions(profiler: cProfile.Profile) -> List[str]:
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats(pstats.SortKey.TIME).print_stats(TOP_N)
+        return [line for line in output.getvalue().splitlines() if line.strip()][-TOP_N - 1 :]
+
+    def _write_summary(self, stream_name: str, hot_functions: List[str], allocations: List[str]) -> None:
+        lines = [f"== {stream_name} ({self.mode}, {time.strftime('%Y-%m-%dT%H:%M:%S')})", "Top functions:"]
+        lines += [f"  {line}" for line in hot_functions]
+        if allocations:
+            lines.append("Top allocation sites:")
+            lines += [f"  {line}" for line in allocations]
+        text = "\n".join(lines) + "\n"
+        with self._lock, open(self.output_dir / "summary.txt", "a") as summary:
+            summary.write(text)
+        self.logger.info("Profile of stream '%s':\n%s", stream_name, text)
@@ -0,0 +1,148 @@
+"""API request accounting and budgets per advertiser.
+
+Every HTTP attempt (retries included, as they count against TikTok's quotas) is
+counted by endpoint and stream. With the `quota` config, a run stops gracefully
+once a budget is reached:
+
+    "quota": {"daily_budget": 20000, "run_budget": 5000, "usage_file": "tiktok-usage.json"}
+
+Streams that have not started yet are skipped and report streams stop before
+their next date window, so the windows already synced are kept in the STATE
+and the coverage index, and the next run picks up where this one stopped.
+
+The usage file keeps, per advertiser and UTC day, the requests by endpoint and by
+stream for the last `KEEP_DAYS` days. It is merged under a file lock at the end of
+every stream, so the shards or backfill workers of an advertiser share the daily
+budget, and schedulers can read it to spread heavy backfills across days. It is
+replaced atomically, so readers never see it half-written; a file that cannot be
+decoded anyway counts as no earlier usage.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+KEEP_DAYS = 31
+
+logger = logging.getLogger(__name__)
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class QuotaLedger:
+    """Counts the requests of a run by (endpoint, stream) and tells when a budget is reached."""
+
+    def __init__(
+        self,
+        advertiser_id: str,
+        daily_budget: Optional[int] = None,
+        run_budget: Optional[int] = None,
+        usage_file: Optional[str] = None,
+    ) -> None:
+        self.advertiser_id = str(advertiser_id)
+        self.daily_budget = daily_budget
+        self.run_budget = run_budget
+        self.usage_file = Path(usage_file) if usage_file else None
+        self.counts: Counter = Counter()
+        self.run_total = 0
+        # requests made today by other runs and processes, as of the last read of the usage file
+        self.earlier_today = 0
+        self._flushed: Counter = Counter()
+        self._lock = threading.Lock()
+        if self.usage_file is not None:
+            usage = _read_usage(self.usage_file)
+            self.earlier_today = usage.get(self.advertiser_id, {}).get(_today().isoformat(), {}).get("total", 0)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "QuotaLedger":
+        quota = config.get("quota") or {}
+        return cls(config["advertiser_id"], quota.get("daily_budget"), quota.get("run_budget"), quota.get("usage_file"))
+
+    def record(self, endpoint: str, stream_name: str) -> None:
+        with self._lock:
+            self.counts[(endpoint, stream_name)] += 1
+            self.run_total += 1
+
+    @property
+    def exhausted(self) -> Optional[str]:
+        """Which budget is reached, None while requests may still be made."""
+        if self.run_budget is not None and self.run_total >= self.run_budget:
+            return f"run budget of {self.run_budget} requests"
+        if self.daily_budget is not None and self.earlier_today + self.run_total >= self.daily_budget:
+            return f"daily budget of {self.daily_budget} requests"
+        return None
+
+    def by_endpoint(self) -> Dict[str, int]:
+        return self._totals(0)
+
+    def by_stream(self) -> Dict[str, int]:
+        return self._totals(1)
+
+    def _totals(self, position: int) -> Dict[str, int]:
+        totals: Counter = Counter()
+        with self._lock:
+            for key, count in self.counts.items():
+                totals[key[position]] += count
+        return dict(sorted(totals.items()))
+
+    def flush(self) -> None:
+        """Add the requests made since the last flush to the usage file."""
+        if self.usage_file is None:
+            return
+        with self._lock:
+            delta = self.counts - self._flushed
+            self._flushed = Counter(self.counts)
+            run_total = self.run_total
+        self.usage_file.parent.mkdir(parents=True, exist_ok=True)
+        # the lock is taken on a file of its own, as the usage file is replaced on every flush
+        with open(self.usage_file.with_name(self.usage_file.name + ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            usage = _read_usage(self.usage_file)
+            day = _add_usage(usage, self.advertiser_id, delta)
+            # the usage file now holds this run's requests as well
+            self.earlier_today = day["total"] - run_total
+            temp_file = self.usage_file.with_name(f"{self.usage_file.name}.{os.getpid()}.tmp")
+            with open(temp_file, "w") as file:
+                file.write(json.dumps(usage, indent=2, sort_keys=True) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self.usage_file)
+
+
+def _read_usage(usage_file: Path) -> dict:
+    """The usage recorded in `usage_file`, empty if there is none or it cannot be decoded."""
+    try:
+        text = usage_file.read_text()
+    except FileNotFoundError:
+        return {}
+    try:
+        return json.loads(text) if text.strip() else {}
+    except json.JSONDecodeError as error:
+        logger.warning("Ignoring the usage file %s, which cannot be decoded: %s", usage_file, error)
+        return {}
+
+
+def _add_usage(usage: dict, advertiser_id: str, delta: "Counter[Tuple[str, str]]") -> dict:
+    days = usage.setdefault(advertiser_id, {})
+    day = days.setdefault(_today().isoformat(), {"total": 0, "endpoints": {}, "streams": {}})
+    for (endpoint, stream_name), count in delta.items():
+        day["total"] += count
+        day["endpoints"][endpoint] = day["endpoints"].get(endpoint, 0) + count
+        day["streams"][stream_name] = day["streams"].get(stream_name, 0) + count
+    oldest = (_today() - timedelta(days=KEEP_DAYS)).isoformat()
+    for old_day in [old_day for old_day in days if old_day < oldest]:
+        del days[old_day]
+    return day
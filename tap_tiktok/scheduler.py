@@ -0,0 +1,178 @@
+"""Concurrent syncing of the selected streams under a shared request budget.
+
+The SDK syncs streams one after another, so cheap entity streams wait behind
+long report backfills and the API budget sits idle during each stream's tail.
+`StreamScheduler` instead fetches the records of up to `stream_concurrency`
+streams at once on worker threads, in priority order (entities, then daily
+reports, then hourly backfills). Each worker fills a bounded queue that the
+stream's own sync drains when the SDK gets to it, so RECORD and STATE messages
+are still written by the main thread, stream after stream, exactly as they
+would be without the scheduler. A sync that stops reading a stream early (e.g.
+with `--test`) only stops the fetching of that stream; a sync that fails, however
+it fails, stops the fetching of all of them when the tap ends it.
+
+`RequestBudget` caps the requests in flight and per second across all streams
+and their page fan-out.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from tap_tiktok.clients import TikTokStream
+
+BATCH_SIZE = 500
+QUEUE_BATCHES = 10
+_DONE = object()
+
+
+class RequestBudget:
+    """Limits the requests in flight, and optionally per second, across threads."""
+
+    def __init__(self, max_concurrency: int, max_per_second: Optional[float] = None) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_per_second = max_per_second
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic()
+
+    def __enter__(self) -> "RequestBudget":
+        self._slots.acquire()
+        if self.max_per_second:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + 1 / self.max_per_second
+            if start > now:
+                time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._slots.release()
+
+
+class FetchCancelled(Exception):
+    """Raised in the fetching of a stream whose records are no longer wanted."""
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class _Prefetch:
+    """The records fetched ahead for one stream."""
+
+    def __init__(self, stream: "TikTokStream") -> None:
+        self.stream = stream
+        self.records = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.future: Optional[Future] = None
+
+
+class StreamScheduler:
+    """Fetches the records of the selected streams concurrently, ahead of their sync."""
+
+    def __init__(self, streams: List["TikTokStream"], max_streams: int, logger: Optional[logging.Logger] = None):
+        self.streams = sorted(streams, key=lambda stream: (stream.sync_priority, stream.name))
+        self.max_streams = max_streams
+        self.logger = logger or logging.getLogger(__name__)
+        self._prefetches: Dict[str, _Prefetch] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def records(self, stream: "TikTokStream", context: Optional[dict]) -> Optional[Iterator[dict]]:
+        """Return the prefetched records of `stream`, or None if it is not scheduled."""
+        if context is not None or stream.name not in {scheduled.name for scheduled in self.streams}:
+            return None
+        self._start()
+        with self._lock:
+            prefetch = self._prefetches.pop(stream.name, None)
+        if prefetch is None:
+            return None
+        return self._drain(prefetch)
+
+    def stop(self) -> None:
+        """Stop fetching, e.g. because the sync failed."""
+        for stream in self.streams:
+            stream.fetch_cancelled.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            self.logger.info(
+                "Fetching up to %d streams concurrently, in order: %s",
+                self.max_streams,
+                ", ".join(stream.name for stream in self.streams),
+            )
+            self._executor = ThreadPoolExecutor(max_workers=self.max_streams, thread_name_prefix="tap-tiktok-stream")
+            for stream in self.streams:
+                # The SDK records the starting bookmark just before it gets a stream's records; the
+                # prefetch needs it earlier. This runs on the main thread, and writing it twice is
+                # harmless: the stream's state is only advanced once its records are consumed.
+                stream._write_starting_replication_value(None)
+                prefetch = self._prefetches[stream.name] = _Prefetch(stream)
+                prefetch.future = self._executor.submit(self._produce, prefetch)
+
+    def _produce(self, prefetch: _Prefetch) -> None:
+        try:
+            batch = []
+            for record in prefetch.stream.produce_records(None):
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    self._put(prefetch, batch)
+                    batch = []
+            if batch:
+                self._put(prefetch, batch)
+            self._put(prefetch, _DONE)
+        except FetchCancelled:
+            pass
+        except BaseException as error:  # handed over to the stream's sync, which raises it
+            try:
+                self._put(prefetch, _Failure(error))
+            except FetchCancelled:
+                pass
+
+    def _put(self, prefetch: _Prefetch, item) -> None:
+        """Queue `item` for the stream's sync, unless its records are no longer wanted."""
+        while True:
+            if prefetch.stream.fetch_cancelled.is_set():
+                raise FetchCancelled()
+            try:
+                prefetch.records.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _drain(self, prefetch: _Prefetch) -> Iterable[dict]:
+        try:
+            while True:
+                try:
+                    item = prefetch.records.get(timeout=0.1)
+                except queue.Empty:
+                    # a producer only ends without its last item if it was stopped
+                    if prefetch.future.done() and prefetch.records.empty():
+                        raise RuntimeError(f"The fetching of {prefetch.stream.name} was stopped.") from None
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield from item
+        except GeneratorExit:
+            # a sync that stops reading early (e.g. with --test) only stops its own stream's fetching
+            prefetch.stream.fetch_cancelled.set()
+            raise
+        except BaseException:
+            # the stream's fetching failed, or the sync was interrupted while waiting for it
+            self.stop()
+            raise
+        finally:
+            if not self._prefetches:
+                self._executor.shutdown(wait=False)
@@ -0,0 +1,55 @@
+"""Precomputed stream schemas shipped with the tap.
+
+Building report schemas through `th.PropertiesList(...).to_dict()` on every start
+is wasted work since they only change with the code. `schemas/streams.json` holds
+the generated result and is regenerated with:
+
+    python -m tap_tiktok.schema_cache
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+SCHEMA_CACHE_VERSION = 1
+SCHEMA_CACHE_PATH = Path(__file__).parent / "schemas" / "streams.json"
+
+
+@lru_cache(maxsize=None)
+def _load_cache() -> dict:
+    try:
+        cache = json.loads(SCHEMA_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != SCHEMA_CACHE_VERSION:
+        return {}
+    return cache.get("streams", {})
+
+
+def get_cached_schema(stream_name: str) -> Optional[dict]:
+    """Return the cached schema of a stream, or None if it is not cached."""
+    return _load_cache().get(stream_name)
+
+
+def build_schema_cache() -> dict:
+    """Build the schema of every registered stream from its class definition."""
+    from tap_tiktok.tap import STREAM_TYPES, load_stream_class
+
+    streams = {}
+    for name, import_path in STREAM_TYPES.items():
+        stream_class = load_stream_class(import_path)
+        if hasattr(stream_class, "build_schema"):
+            streams[name] = stream_class.build_schema()
+        else:
+            streams[name] = stream_class.schema
+    return {"version": SCHEMA_CACHE_VERSION, "streams": streams}
+
+
+def write_schema_cache(path: Path = SCHEMA_CACHE_PATH) -> None:
+    path.write_text(json.dumps(build_schema_cache(), indent=2) + "\n")
+    _load_cache.cache_clear()
+
+
+if __name__ == "__main__":
+    write_schema_cache()
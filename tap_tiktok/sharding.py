@@ -0,0 +1,130 @@
+"""Deterministic sharding of advertisers and report streams across tap processes.
+
+Run `shard_count` taps with the same catalog, each with its own `shard_index`.
+Every advertiser is owned by the shard its ID hashes to, so a fleet of shards
+given the configs of all advertisers syncs each advertiser exactly once. With
+`shard_report_streams`, the report streams of an advertiser are spread over the
+shards too (by hashing the advertiser ID and the stream name), while its entity
+streams stay with the advertiser's shard.
+
+Each shard only keeps the bookmarks of the streams it owns, so the STATE outputs
+of the shards of an advertiser never overlap and are merged into one canonical
+state file with:
+
+    tap-tiktok-merge-state shard-0.json shard-1.json > state.json
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from typing import Iterable, List, Optional
+
+from tap_tiktok.coverage import CoverageIndex
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    """Return the shard `key` belongs to: stable across processes, hosts and Python versions."""
+    digest = hashlib.sha1(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+class ShardAssignment:
+    """Decides which advertisers and streams a tap process syncs."""
+
+    def __init__(self, shard_index: int = 0, shard_count: int = 1, shard_report_streams: bool = False) -> None:
+        if shard_count < 1 or not 0 <= shard_index < shard_count:
+            raise ValueError(f"Invalid shard {shard_index} of {shard_count}, expected 0 <= shard_index < shard_count.")
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.shard_report_streams = shard_report_streams
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ShardAssignment":
+        return cls(
+            config.get("shard_index", 0),
+            config.get("shard_count", 1),
+            config.get("shard_report_streams", False),
+        )
+
+    def owns(self, advertiser_id: str, stream_name: str, is_report: bool) -> bool:
+        """Return whether this shard syncs stream `stream_name` of advertiser `advertiser_id`."""
+        if self.shard_count == 1:
+            return True
+        key = f"{advertiser_id}/{stream_name}" if is_report and self.shard_report_streams else str(advertiser_id)
+        return shard_of(key, self.shard_count) == self.shard_index
+
+    def __str__(self) -> str:
+        return f"shard {self.shard_index} of {self.shard_count}"
+
+
+def read_state(path: str) -> dict:
+    """Read a state file, or the last STATE message of a tap's output."""
+    with open(path) as file:
+        text = file.read()
+    try:
+        state = json.loads(text)
+    except json.JSONDecodeError:
+        state = None
+    if isinstance(state, dict) and state.get("type") != "STATE":
+        return state
+    state = {}
+    for line in text.splitlines():
+        if '"STATE"' in line:
+            message = json.loads(line)
+            if message.get("type") == "STATE":
+                state = message["value"]
+    return state
+
+
+def merge_states(states: Iterable[dict]) -> dict:
+    """Merge the states of several shards into one.
+
+    Shards own disjoint streams, so bookmarks are simply combined. Should a stream
+    appear in several states anyway (e.g. after the shard count changed, or for the
+    slices of a backfill), the most advanced bookmark wins and the coverage indexes
+    of the states are combined.
+    """
+    bookmarks: dict = {}
+    for state in states:
+        for stream_name, bookmark in state.get("bookmarks", {}).items():
+            current = bookmarks.get(stream_name)
+            if current is None:
+                bookmarks[stream_name] = bookmark
+                continue
+            coverage = _merge_coverage(current.get("coverage", {}), bookmark.get("coverage", {}))
+            if str(current.get("replication_key_value", "")) < str(bookmark.get("replication_key_value", "")):
+                current = bookmark
+            bookmarks[stream_name] = {**current, "coverage": coverage} if coverage else current
+    return {"bookmarks": dict(sorted(bookmarks.items()))}
+
+
+def _merge_coverage(coverage: dict, other: dict) -> dict:
+    merged = dict(coverage)
+    for advertiser_id, intervals in other.items():
+        combined = CoverageIndex.from_state(merged.get(advertiser_id)).intervals
+        combined += CoverageIndex.from_state(intervals).intervals
+        # the most recent sync of a day wins
+        merged[advertiser_id] = CoverageIndex(sorted(combined, key=lambda interval: interval[2])).to_state()
+    return merged
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("states", nargs="+", help="State files or tap outputs of the shards")
+    parser.add_argument("-o", "--output", help="Write the merged state here instead of stdout")
+    args = parser.parse_args(argv)
+
+    merged = json.dumps(merge_states(read_state(path) for path in args.states), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(merged + "\n")
+    else:
+        sys.stdout.write(merged + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,91 @@
 """TikTok tap class."""
 
-from typing import List
+import importlib
+import threading
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Type
 
+import click
 from singer_sdk import Stream, Tap
 from singer_sdk import typing as th  # JSON schema typing helpers
+from singer_sdk._singerlib import Message
 
-import tap_tiktok.new_streams as new_streams
-from tap_tiktok.streams import (  # AdsAttributeMetricsStream,; AdsAttributionMetricsByDayStream,; AdsBasicDataMetricsByDayStream,; AdsEngagementMetricsByDayStream,; AdsInAppEventMetricsByDayStream,; AdsPageEventMetricsByDayStream,; AdsVideoPlayMetricsByDayStream,; CampaignsAttributionMetricsByDayStream,; CampaignsBasicDataMetricsByDayStream,; CampaignsEngagementMetricsByDayStream,; CampaignsInAppEventMetricsByDayStream,; CampaignsPageEventMetricsByDayStream,; CampaignsVideoPlayMetricsByDayStream,
-    AdAccountsStream,
-    AdGroupsStream,
-    AdsStream,
-    CampaignsStream,
-)
-
-OLD_STREAM_TYPES = [
-    AdAccountsStream,
-    CampaignsStream,
-    AdGroupsStream,
-    AdsStream,
-    # AdsAttributeMetricsStream,
-    # AdsBasicDataMetricsByDayStream,
-    # AdsVideoPlayMetricsByDayStream,
-    # AdsEngagementMetricsByDayStream,
-    # AdsAttributionMetricsByDayStream,
-    # AdsPageEventMetricsByDayStream,
-    # AdsInAppEventMetricsByDayStream,
-    # CampaignsBasicDataMetricsByDayStream,
-    # CampaignsVideoPlayMetricsByDayStream,
-    # CampaignsEngagementMetricsByDayStream,
-    # CampaignsAttributionMetricsByDayStream,
-    # CampaignsPageEventMetricsByDayStream,
-    # CampaignsInAppEventMetricsByDayStream,
-]
-
-NEW_STREAM_TYPES = [
-    new_streams.AdGroupsDailyReportStream,
-    new_streams.AdGroupsHourlyReportStream,
-    new_streams.AdGroupsReservationDailyReportStream,
-    new_streams.AdGroupsReservationHourlyReportStream,
-    new_streams.AdGroupsReservationHourlyReportStream,
-    new_streams.AdsAgeGenderReportStream,
-    new_streams.AdsCountryReportStream,
-    new_streams.AdsDailyReportStream,
-    new_streams.AdsHourlyReportStream,
-    new_streams.AdsLanguageReportStream,
-    new_streams.AdsPlatformReportStream,
-    new_streams.AdsReservationDailyReportStream,
-    new_streams.CampaignsAgeGenderReportStream,
-    new_streams.CampaignsCountryReportStream,
-    new_streams.CampaignsDailyReportStream,
-    new_streams.CampaignsHourlyReportStream,
-    new_streams.CampaignsLanguageReportStream,
-    new_streams.CampaignsPlatformReportStream,
-    new_streams.CampaignsReservationDailyReportStream,
-    new_streams.CampaignsReservationHourlyReportStream,
-]
-
-STREAM_TYPES = [
-    *OLD_STREAM_TYPES,
-    *NEW_STREAM_TYPES,
-]
+from tap_tiktok.clients.base import DEFAULT_API_URL, DEFAULT_PAGE_CONCURRENCY
+from tap_tiktok.errors import CircuitBreakers
+from tap_tiktok.quota import QuotaLedger
+from tap_tiktok.scheduler import RequestBudget, StreamScheduler
+from tap_tiktok.tokens import DEFAULT_COOL_DOWN_SECONDS, TokenPool
+
+# The modules of optional features are imported where they are used
+if TYPE_CHECKING:
+    from tap_tiktok.deleted_entities import DeletedEntityIndex
+    from tap_tiktok.entity_cache import EntityCache, EntityLevel
+    from tap_tiktok.profiling import SyncProfiler
+    from tap_tiktok.sharding import ShardAssignment
+
+# Streams are registered by import path so that their modules (and the schema
+# building they do at import time) are only loaded for the streams that run:
+# the stream packages do not import their modules.
+OLD_STREAM_TYPES = {
+    "ad_accounts": "tap_tiktok.streams:AdAccountsStream",
+    "campaigns": "tap_tiktok.streams:CampaignsStream",
+    "ad_groups": "tap_tiktok.streams:AdGroupsStream",
+    "ads": "tap_tiktok.streams:AdsStream",
+    # "ads_attribute_metrics": "tap_tiktok.streams:AdsAttributeMetricsStream",
+    # "ads_basic_data_metrics_by_day": "tap_tiktok.streams:AdsBasicDataMetricsByDayStream",
+    # "campaigns_basic_data_metrics_by_day": "tap_tiktok.streams:CampaignsBasicDataMetricsByDayStream",
+}
+
+_AD_GROUPS_REPORTS = "tap_tiktok.new_streams.reports.ad_groups.ad_groups_basic_reports"
+_ADS_AUDIENCE_REPORTS = "tap_tiktok.new_streams.reports.ads.ads_audience_reports"
+_ADS_BASIC_REPORTS = "tap_tiktok.new_streams.reports.ads.ads_basic_reports"
+_ADS_METRIC_REPORTS = "tap_tiktok.new_streams.reports.ads.ads_metric_reports"
+_CAMPAIGNS_AUDIENCE_REPORTS = "tap_tiktok.new_streams.reports.campaigns.campaigns_audience_reports"
+_CAMPAIGNS_BASIC_REPORTS = "tap_tiktok.new_streams.reports.campaigns.campaigns_basic_reports"
+_CAMPAIGNS_METRIC_REPORTS = "tap_tiktok.new_streams.reports.campaigns.campaigns_metric_reports"
+
+NEW_STREAM_TYPES = {
+    "ad_groups_daily_report": f"{_AD_GROUPS_REPORTS}:AdGroupsDailyReportStream",
+    "ad_groups_hourly_report": f"{_AD_GROUPS_REPORTS}:AdGroupsHourlyReportStream",
+    "ad_groups_reservation_daily_report": f"{_AD_GROUPS_REPORTS}:AdGroupsReservationDailyReportStream",
+    "ad_groups_reservation_hourly_report": f"{_AD_GROUPS_REPORTS}:AdGroupsReservationHourlyReportStream",
+    "ads_age_gender_report": f"{_ADS_AUDIENCE_REPORTS}:AdsAgeGenderReportStream",
+    "ads_attribution_metrics_by_day": f"{_ADS_METRIC_REPORTS}:AdsAttributionMetricsByDayStream",
+    "ads_country_report": f"{_ADS_AUDIENCE_REPORTS}:AdsCountryReportStream",
+    "ads_daily_report": f"{_ADS_BASIC_REPORTS}:AdsDailyReportStream",
+    "ads_engagement_metrics_by_day": f"{_ADS_METRIC_REPORTS}:AdsEngagementMetricsByDayStream",
+    "ads_hourly_report": f"{_ADS_BASIC_REPORTS}:AdsHourlyReportStream",
+    "ads_in_app_event_metrics_by_day": f"{_ADS_METRIC_REPORTS}:AdsInAppEventMetricsByDayStream",
+    "ads_language_report": f"{_ADS_AUDIENCE_REPORTS}:AdsLanguageReportStream",
+    "ads_page_event_metrics_by_day": f"{_ADS_METRIC_REPORTS}:AdsPageEventMetricsByDayStream",
+    "ads_platform_report": f"{_ADS_AUDIENCE_REPORTS}:AdsPlatformReportStream",
+    "ads_reservation_daily_report": f"{_ADS_BASIC_REPORTS}:AdsReservationDailyReportStream",
+    "ads_video_play_metrics_by_day": f"{_ADS_METRIC_REPORTS}:AdsVideoPlayMetricsByDayStream",
+    "campaigns_age_gender_report": f"{_CAMPAIGNS_AUDIENCE_REPORTS}:CampaignsAgeGenderReportStream",
+    "campaigns_attribution_metrics_by_day": f"{_CAMPAIGNS_METRIC_REPORTS}:CampaignsAttributionMetricsByDayStream",
+    "campaigns_country_report": f"{_CAMPAIGNS_AUDIENCE_REPORTS}:CampaignsCountryReportStream",
+    "campaigns_daily_report": f"{_CAMPAIGNS_BASIC_REPORTS}:CampaignsDailyReportStream",
+    "campaigns_engagement_metrics_by_day": f"{_CAMPAIGNS_METRIC_REPORTS}:CampaignsEngagementMetricsByDayStream",
+    "campaigns_hourly_report": f"{_CAMPAIGNS_BASIC_REPORTS}:CampaignsHourlyReportStream",
+    "campaigns_in_app_event_metrics_by_day": f"{_CAMPAIGNS_METRIC_REPORTS}:CampaignsInAppEventMetricsByDayStream",
+    "campaigns_language_report": f"{_CAMPAIGNS_AUDIENCE_REPORTS}:CampaignsLanguageReportStream",
+    "campaigns_page_event_metrics_by_day": f"{_CAMPAIGNS_METRIC_REPORTS}:CampaignsPageEventMetricsByDayStream",
+    "campaigns_platform_report": f"{_CAMPAIGNS_AUDIENCE_REPORTS}:CampaignsPlatformReportStream",
+    "campaigns_reservation_daily_report": f"{_CAMPAIGNS_BASIC_REPORTS}:CampaignsReservationDailyReportStream",
+    "campaigns_reservation_hourly_report": f"{_CAMPAIGNS_BASIC_REPORTS}:CampaignsReservationHourlyReportStream",
+    "campaigns_video_play_metrics_by_day": f"{_CAMPAIGNS_METRIC_REPORTS}:CampaignsVideoPlayMetricsByDayStream",
+}
+
+STREAM_TYPES = {
+    **OLD_STREAM_TYPES,
+    **NEW_STREAM_TYPES,
+}
+
+
+def load_stream_class(import_path: str) -> Type[Stream]:
+    """Import and return the stream class registered under `module:ClassName`."""
+    module_name, class_name = import_path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
 
 
 class TapTikTok(Tap):
@@ -67,12 +93,38 @@ class TapTikTok(Tap):
 
     name = "tap-tiktok"
 
+    # Profile mode given with --profile, which overrides the profile config
+    profile_mode: Optional[str] = None
+
     config_jsonschema = th.PropertiesList(
         th.Property(
             "access_token",
             th.StringType,
-            required=True,
-            description="The token to authenticate against the API service",
+            description="The token to authenticate against the API service (unless access_tokens is set)",
+        ),
+        th.Property(
+            "access_tokens",
+            th.ArrayType(
+                th.ObjectType(
+                    th.Property("access_token", th.StringType, required=True),
+                    th.Property("name", th.StringType, description="Name of the token in the logs"),
+                    th.Property(
+                        "advertiser_ids",
+                        th.ArrayType(th.StringType),
+                        description="Advertisers the token may access, all if not set",
+                    ),
+                )
+            ),
+            description=(
+                "Pool of tokens, e.g. of several apps, each request being sent with the least loaded token"
+                " eligible for the advertiser"
+            ),
+        ),
+        th.Property(
+            "token_cool_down_seconds",
+            th.NumberType,
+            default=DEFAULT_COOL_DOWN_SECONDS,
+            description="How long a rate-limited token of the pool is out of rotation, unless the API says",
         ),
         th.Property(
             "advertiser_id",
@@ -85,12 +137,26 @@ class TapTikTok(Tap):
             th.DateTimeType,
             description="The earliest record date to sync",
         ),
+        th.Property(
+            "end_date",
+            th.DateTimeType,
+            description="The latest record date to sync, included (defaults to yesterday)",
+        ),
         th.Property(
             "include_deleted",
             th.BooleanType,
             default=True,
             description="If true then deleted status entities will also be returned",
         ),
+        th.Property(
+            "skip_deleted_entities",
+            th.BooleanType,
+            default=False,
+            description=(
+                "If true (with include_deleted), report windows skip the entities deleted and inactive before"
+                " they start, as indexed from the entity streams and earlier report rows"
+            ),
+        ),
         th.Property(
             "lookback",
             th.IntegerType,
@@ -101,11 +167,519 @@ class TapTikTok(Tap):
                 " earlier than the current date minus number of lookback days)"
             ),
         ),
+        th.Property(
+            "refill",
+            th.ObjectType(
+                th.Property(
+                    "stale_after_hours",
+                    th.NumberType,
+                    description="Days synced longer ago than this are fetched again as well",
+                ),
+            ),
+            description=(
+                "If set, report streams only fetch the days between start_date and end_date that their coverage"
+                " index lacks, instead of the days after their bookmark"
+            ),
+        ),
+        th.Property(
+            "freshness",
+            th.ObjectType(
+                th.Property(
+                    "attribution_window_days",
+                    th.IntegerType,
+                    description=(
+                        "Days during which conversions and results are still attributed to a day (default 7),"
+                        " the other metrics settle within hours"
+                    ),
+                ),
+                th.Property(
+                    "refresh_daily_days",
+                    th.IntegerType,
+                    description="Days after settling during which a day is fetched again daily (default 3)",
+                ),
+                th.Property(
+                    "refresh_weekly_days",
+                    th.IntegerType,
+                    description="Days after settling during which a day is fetched again weekly (default 28)",
+                ),
+                th.Property(
+                    "streams",
+                    th.ObjectType(
+                        additional_properties=th.ObjectType(
+                            th.Property("attribution_window_days", th.IntegerType),
+                            th.Property("refresh_daily_days", th.IntegerType),
+                            th.Property("refresh_weekly_days", th.IntegerType),
+                        )
+                    ),
+                    description="Overrides of the above by report stream name",
+                ),
+            ),
+            description=(
+                "If set, replaces the lookback: report streams fetch again only the days whose selected metrics"
+                " may still change, and the settled days on a decaying schedule"
+            ),
+        ),
+        th.Property(
+            "custom_reports",
+            th.ArrayType(
+                th.ObjectType(
+                    th.Property("name", th.StringType, required=True, description="Name of the stream"),
+                    th.Property(
+                        "data_level",
+                        th.StringType,
+                        required=True,
+                        description="Level of the entities the rows are reported for: AUCTION_AD, AUCTION_ADGROUP"
+                        " or AUCTION_CAMPAIGN",
+                    ),
+                    th.Property(
+                        "dimensions",
+                        th.ArrayType(th.StringType),
+                        required=True,
+                        description="Dimensions to group by, the time dimension of the granularity is added",
+                    ),
+                    th.Property(
+                        "metrics",
+                        th.ArrayType(th.StringType),
+                        required=True,
+                        description="Metrics to request",
+                    ),
+                    th.Property(
+                        "buying_types",
+                        th.ArrayType(th.StringType),
+                        description="Buying types to report on (default AUCTION)",
+                    ),
+                    th.Property(
+                        "report_type",
+                        th.StringType,
+                        allowed_values=["BASIC", "AUDIENCE"],
+                        description="AUDIENCE for the audience dimensions, such as country_code (default BASIC)",
+                    ),
+                    th.Property(
+                        "granularity",
+                        th.StringType,
+                        description="Time dimension of the rows, DAILY or HOURLY (default DAILY)",
+                    ),
+                )
+            ),
+            description="Report streams with exactly the dimensions and metrics given, generated from the config",
+        ),
+        th.Property(
+            "enrich_reports",
+            th.BooleanType,
+            default=False,
+            description=(
+                "If true, report rows get the name of their ad, ad group or campaign and the IDs and names"
+                " of the levels above it"
+            ),
+        ),
+        th.Property(
+            "entity_cache_max_entities",
+            th.IntegerType,
+            description=(
+                "Number of entities the enrichment index keeps in memory before moving to a file on disk"
+                " (default 1000000)"
+            ),
+        ),
+        th.Property(
+            "api_url",
+            th.StringType,
+            default=DEFAULT_API_URL,
+            description=(
+                "Base URL of the TikTok Business API, e.g. to use the sandbox"
+                " (https://sandbox-ads.tiktok.com/open_api/v1.3) or a local stand-in server"
+            ),
+        ),
+        th.Property(
+            "page_concurrency",
+            th.IntegerType,
+            default=DEFAULT_PAGE_CONCURRENCY,
+            description=(
+                "Maximum number of pages of a stream (or of a report window) fetched concurrently once"
+                " the first page reports the total number of pages"
+            ),
+        ),
+        th.Property(
+            "adaptive_concurrency",
+            th.ObjectType(
+                th.Property(
+                    "max_limit",
+                    th.IntegerType,
+                    description="Highest number of requests a stream may have in flight (default 16)",
+                ),
+                th.Property(
+                    "latency_spike_factor",
+                    th.NumberType,
+                    description="Latency, relative to the stream's average, taken as a sign of overload (default 3)",
+                ),
+            ),
+            description=(
+                "If set, each stream adapts its requests in flight, starting from page_concurrency: raised"
+                " while responses are healthy, halved on rate limiting, server errors and latency spikes"
+            ),
+        ),
+        th.Property(
+            "hedging",
+            th.ObjectType(
+                th.Property(
+                    "percentile",
+                    th.NumberType,
+                    description="Percentile of the recent latencies after which a page is sent again (default 0.95)",
+                ),
+                th.Property(
+                    "max_rate",
+                    th.NumberType,
+                    description="Highest share of the page requests that may be duplicated (default 0.05)",
+                ),
+            ),
+            description=(
+                "If set, report pages slower than usual are requested a second time and the first answer is"
+                " used; duplicates count against the quota"
+            ),
+        ),
+        th.Property(
+            "stream_concurrency",
+            th.IntegerType,
+            default=1,
+            description=(
+                "Number of selected streams fetched concurrently, entity streams first, then daily and"
+                " hourly reports (default 1, which fetches one stream after another)"
+            ),
+        ),
+        th.Property(
+            "max_concurrent_requests",
+            th.IntegerType,
+            default=8,
+            description="Maximum number of API requests in flight across all streams",
+        ),
+        th.Property(
+            "max_requests_per_second",
+            th.NumberType,
+            description="If set, maximum number of API requests started per second across all streams",
+        ),
+        th.Property(
+            "quota",
+            th.ObjectType(
+                th.Property(
+                    "daily_budget",
+                    th.IntegerType,
+                    description="Maximum number of requests per UTC day for the advertiser, across runs",
+                ),
+                th.Property("run_budget", th.IntegerType, description="Maximum number of requests of a run"),
+                th.Property(
+                    "usage_file",
+                    th.StringType,
+                    description=(
+                        "JSON file where the requests of each day are recorded by endpoint and stream, and"
+                        " from which the daily budget used by earlier runs is read"
+                    ),
+                ),
+            ),
+            description=(
+                "Request budgets: once one is reached, report streams stop after their current date window"
+                " and the streams not started yet are skipped"
+            ),
+        ),
+        th.Property(
+            "shard_count",
+            th.IntegerType,
+            default=1,
+            description="Number of tap processes the advertisers (and optionally report streams) are split across",
+        ),
+        th.Property(
+            "shard_index",
+            th.IntegerType,
+            default=0,
+            description="Shard synced by this process, from 0 to shard_count - 1",
+        ),
+        th.Property(
+            "shard_report_streams",
+            th.BooleanType,
+            default=False,
+            description="If true, the report streams of an advertiser are split across the shards as well",
+        ),
+        th.Property(
+            "prometheus_textfile",
+            th.StringType,
+            description=(
+                "If set, per-stream performance metrics are written to this path in the Prometheus"
+                " text format at the end of the sync (e.g. for the node exporter textfile collector)"
+            ),
+        ),
+        th.Property(
+            "profile",
+            th.ObjectType(
+                th.Property(
+                    "mode",
+                    th.StringType,
+                    description=(
+                        "'deterministic' (default) runs each stream under cProfile and tracemalloc, 'sampling'"
+                        " samples stacks periodically with an overhead low enough for production"
+                    ),
+                ),
+                th.Property("output_dir", th.StringType, description="Where dumps are written (default profiles)"),
+                th.Property(
+                    "sample_rate",
+                    th.NumberType,
+                    description="Fraction of runs that are profiled (default 1)",
+                ),
+                th.Property(
+                    "interval_ms",
+                    th.NumberType,
+                    description="Stack sampling interval of the sampling mode (default 10)",
+                ),
+            ),
+            description="If set, each stream's sync is profiled and per-stream dumps plus a summary are written",
+        ),
+        th.Property(
+            "intraday_polling",
+            th.ObjectType(
+                th.Property(
+                    "interval_minutes",
+                    th.NumberType,
+                    description="Time between two polls (default 15)",
+                ),
+                th.Property(
+                    "recheck_hours",
+                    th.IntegerType,
+                    description="Number of past hours re-fetched by each poll, in addition to today's (default 3)",
+                ),
+            ),
+            description=(
+                "Settings of the intraday polling mode (--poll), which keeps emitting the new or changed"
+                " hours of today for the selected hourly report streams"
+            ),
+        ),
     ).to_dict()
 
+    @classmethod
+    def get_singer_command(cls) -> click.Command:
+        command = super().get_singer_command()
+        command.params.append(
+            click.Option(
+                ["--poll"],
+                is_flag=True,
+                help="Keep polling today's hours of the selected hourly report streams.",
+            )
+        )
+        command.params.append(
+            click.Option(
+                ["--profile"],
+                type=click.Choice(["deterministic", "sampling"]),
+                is_flag=False,
+                flag_value="deterministic",
+                default=None,
+                help="Profile each stream's sync in this mode (default deterministic), see the profile config.",
+            )
+        )
+        return command
+
+    @classmethod
+    def invoke(  # type: ignore[override]
+        cls,
+        *,
+        poll: bool = False,
+        profile: Optional[str] = None,
+        about: bool = False,
+        about_format: Optional[str] = None,
+        config: Tuple[str, ...] = (),
+        state: Optional[str] = None,
+        catalog: Optional[str] = None,
+    ) -> None:
+        """Run the tap, or with `--poll` the intraday polling of its hourly report streams.
+
+        With `--profile`, every stream's sync of this run is profiled in the given mode.
+        """
+        super(Tap, cls).invoke(about=about, about_format=about_format)
+        cls.print_version(print_fn=cls.logger.info)
+        config_files, parse_env_config = cls.config_from_cli_args(*config)
+        tap = cls(
+            config=config_files,
+            state=state,
+            catalog=catalog,
+            parse_env_config=parse_env_config,
+            validate_config=True,
+        )
+        tap.profile_mode = profile
+        if not poll:
+            tap.run_sync()
+            return
+        from tap_tiktok.intraday import poll_intraday
+
+        try:
+            poll_intraday(tap)
+        finally:
+            tap.finish_sync()
+
+    @cached_property
+    def profiler(self) -> Optional["SyncProfiler"]:
+        """Profiler of this run, if profiling is configured and the run is drawn for it.
+
+        `--profile` (`profile_mode`) profiles the run whatever the `sample_rate`.
+        """
+        profile = self.config.get("profile")
+        if self.profile_mode:
+            profile = {**(profile or {}), "mode": self.profile_mode, "sample_rate": 1.0}
+        if not profile:
+            return None
+        from tap_tiktok.profiling import SyncProfiler
+
+        return SyncProfiler.from_config(profile, self.logger)
+
+    @cached_property
+    def request_budget(self) -> RequestBudget:
+        """Concurrency and rate limits shared by the requests of all streams."""
+        return RequestBudget(
+            self.config.get("max_concurrent_requests") or 8,
+            self.config.get("max_requests_per_second"),
+        )
+
+    @cached_property
+    def quota(self) -> QuotaLedger:
+        """Requests made by this run, and the budgets they count against."""
+        return QuotaLedger.from_config(self.config)
+
+    @cached_property
+    def token_pool(self) -> TokenPool:
+        """The access tokens requests may be sent with."""
+        return TokenPool.from_config(self.config)
+
+    @cached_property
+    def scheduler(self) -> Optional[StreamScheduler]:
+        """Scheduler fetching the selected streams concurrently, unless `stream_concurrency` is 1."""
+        max_streams = self.config.get("stream_concurrency", 1)
+        if max_streams <= 1:
+            return None
+        streams = [
+            stream
+            for stream in self.streams.values()
+            if stream.selected and not stream.parent_stream_type and hasattr(stream, "produce_records")
+        ]
+        return StreamScheduler(streams, max_streams, self.logger)
+
+    @cached_property
+    def entity_cache(self) -> Optional["EntityCache"]:
+        """Index of the advertiser's entities used to enrich the report rows, if `enrich_reports` is set."""
+        if not self.config.get("enrich_reports"):
+            return None
+        from tap_tiktok.entity_cache import DEFAULT_MAX_ENTITIES, EntityCache
+
+        return EntityCache(self._fetch_entities, self.config.get("entity_cache_max_entities") or DEFAULT_MAX_ENTITIES)
+
+    @cached_property
+    def deleted_entities(self) -> Optional["DeletedEntityIndex"]:
+        """Deleted entities and their last active day, if `skip_deleted_entities` is set."""
+        if not (self.config.get("skip_deleted_entities") and self.config.get("include_deleted")):
+            return None
+        from tap_tiktok.deleted_entities import DeletedEntityIndex
+
+        return DeletedEntityIndex(self.config["advertiser_id"], self.state)
+
+    def _fetch_entities(self, level: "EntityLevel") -> Iterable[dict]:
+        """Page through the entities of `level`, requesting only the fields the index keeps, without emitting them."""
+        stream = load_stream_class(STREAM_TYPES[level.stream_name])(tap=self)
+        stream.field_chunks = [level.fields]
+        try:
+            yield from stream.request_records(None)
+        finally:
+            # the stream is not synced, so its sync costs, which shut its page threads down, are never logged
+            executor = stream.__dict__.pop("page_executor", None)
+            if executor is not None:
+                executor.shutdown()
+
+    @cached_property
+    def sharding(self) -> Optional["ShardAssignment"]:
+        """The advertisers and streams this process syncs, when several tap processes share the work."""
+        if (self.config.get("shard_count") or 1) == 1 and not self.config.get("shard_index"):
+            return None
+        from tap_tiktok.sharding import ShardAssignment
+
+        return ShardAssignment.from_config(self.config)
+
+    @cached_property
+    def _write_lock(self) -> threading.Lock:
+        return threading.Lock()
+
+    def write_message(self, message: Message) -> None:
+        with self._write_lock:
+            super().write_message(message)
+
+    @cached_property
+    def circuit_breakers(self) -> CircuitBreakers:
+        """Circuit breakers of the API endpoints, shared by all streams."""
+        return CircuitBreakers()
+
+    def run_sync(self) -> None:
+        """Sync all streams, then write the outputs of the whole sync, even if a stream failed."""
+        try:
+            self.sync_all()
+        finally:
+            self.finish_sync()
+
+    def finish_sync(self) -> None:
+        """End the sync: stop any fetching still running and write the request usage and Prometheus textfile."""
+        if self.scheduler is not None:
+            # a sync that failed while writing records leaves the prefetching of the other streams running
+            self.scheduler.stop()
+        self.quota.flush()
+        textfile = self.config.get("prometheus_textfile")
+        if textfile:
+            from tap_tiktok.instrumentation import write_prometheus_textfile
+
+            write_prometheus_textfile(textfile, [stream.performance for stream in self.streams.values()])
+
+    def load_state(self, state: dict) -> None:
+        """Load the state, keeping only the bookmarks of the streams this shard owns (and syncs)."""
+        super().load_state(state)
+        if self.sharding is not None:
+            bookmarks = self.state.get("bookmarks", {})
+            for name in list(bookmarks):
+                if not self.owns_stream(name):
+                    del bookmarks[name]
+
+    def load_streams(self) -> List[Stream]:
+        """Order the streams by sync priority (entities, daily reports, hourly reports), then by name."""
+        return sorted(super().load_streams(), key=lambda stream: (getattr(stream, "sync_priority", 0), stream.name))
+
+    @cached_property
+    def custom_report_classes(self) -> Dict[str, Type[Stream]]:
+        """Stream classes of the `custom_reports` config, by name, see tap_tiktok.custom_reports."""
+        if not self.config.get("custom_reports"):
+            return {}
+        from tap_tiktok.custom_reports import custom_report_classes
+
+        return custom_report_classes(self.config["custom_reports"], STREAM_TYPES)
+
+    def _stream_class(self, name: str) -> Type[Stream]:
+        custom = self.custom_report_classes.get(name)
+        return custom if custom is not None else load_stream_class(STREAM_TYPES[name])
+
     def discover_streams(self) -> List[Stream]:
-        """Return a list of discovered streams."""
-        return [stream_class(tap=self) for stream_class in STREAM_TYPES]
+        """Return a list of discovered streams.
+
+        When an input catalog is given only the streams selected in it are built,
+        otherwise (discovery) every registered stream and custom report is.
+        """
+        return [self._stream_class(name)(tap=self) for name in self._stream_names_to_build()]
+
+    def _stream_names_to_build(self) -> List[str]:
+        if self.input_catalog is None:
+            # discovery lists every stream whatever the shard, the streams deselect the ones it does not own
+            return [*STREAM_TYPES, *self.custom_report_classes]
+        names = []
+        for name in [*STREAM_TYPES, *self.custom_report_classes]:
+            catalog_entry = self.input_catalog.get_stream(name)
+            if catalog_entry and catalog_entry.metadata.resolve_selection()[()] and self.owns_stream(name):
+                names.append(name)
+        if self.sharding is not None:
+            self.logger.info("Syncing %s: %s", self.sharding, ", ".join(names) or "nothing")
+        return names
+
+    def owns_stream(self, stream_name: str) -> bool:
+        """Whether this shard syncs stream `stream_name` of the advertiser, see tap_tiktok.sharding."""
+        if self.sharding is None:
+            return True
+        is_report = stream_name in NEW_STREAM_TYPES or stream_name in self.custom_report_classes
+        return self.sharding.owns(self.config["advertiser_id"], stream_name, is_report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,31 @@
+"""Single TikTok report pages used by the micro-benchmarks."""
+
+import json
+from datetime import timedelta
+
+import requests
+
+from tap_tiktok.tests.benchmarks.replay import ReplayAdapter
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+
+def build_report_page(stream, num_rows: int = 1000) -> dict:
+    """Return a one-day `/report/integrated/get/` page of `num_rows` rows for `stream`."""
+    account = SyntheticAccount(num_entities=num_rows, num_days=1)
+    day = (account.end_date - timedelta(days=1)).isoformat()
+    return account.report_page(
+        {
+            "data_level": "AUCTION_AD",
+            "dimensions": json.dumps(stream.dimensions),
+            "metrics": json.dumps(stream.metrics_keys),
+            "start_date": day,
+            "end_date": day,
+            "page": "1",
+            "page_size": str(num_rows),
+        }
+    )
+
+
+def make_response(payload: dict, url: str = "https://business-api.tiktok.com/open_api/v1.3/") -> requests.Response:
+    """Wrap a payload in a `requests.Response` as if it came off the wire."""
+    return ReplayAdapter.build_response(requests.Request("GET", url).prepare(), payload)
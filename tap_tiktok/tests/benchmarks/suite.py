@@ -0,0 +1,176 @@
+"""End-to-end sync benchmarks over synthetic or recorded accounts.
+
+Each scenario syncs one stream in a fresh process (so peak RSS is its own) with
+its HTTP traffic served by a `ReplayAdapter`, and reports records/sec, requests
+per synced day, peak RSS and CPU per page. Results are written as JSON into an
+output directory and compared against the previous run found there:
+
+    python -m tap_tiktok.tests.benchmarks.suite --entities 200 --days 14
+
+`--cassette DIR` replays recorded responses instead of synthetic ones, and
+`--record --config CONFIG` records them from the live API first.
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import List, Optional
+
+from tap_tiktok.tests.benchmarks.replay import Cassette, ReplayAdapter
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+DEFAULT_STREAMS = ["ads_hourly_report", "campaigns_daily_report", "ads_country_report", "ads"]
+DEFAULT_OUTPUT_DIR = Path(".benchmarks")
+SAMPLE_CONFIG = {"access_token": "token", "advertiser_id": "7000000000000000000"}
+
+
+class RecordCounter:
+    """Stand-in for stdout that counts RECORD messages instead of keeping them."""
+
+    def __init__(self) -> None:
+        self.records = 0
+
+    def write(self, text: str) -> int:
+        self.records += text.count('{"type":"RECORD"')
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def selected_catalog(stream_name: str, config: dict) -> dict:
+    """Return the discovered catalog with only `stream_name` selected."""
+    from tap_tiktok.tap import TapTikTok
+
+    catalog = TapTikTok(config=config, validate_config=False).catalog_dict
+    catalog["streams"] = [entry for entry in catalog["streams"] if entry["tap_stream_id"] == stream_name]
+    for metadata in catalog["streams"][0]["metadata"]:
+        if metadata["breadcrumb"] == []:
+            metadata["metadata"]["selected"] = True
+    return catalog
+
+
+def run_scenario(
+    stream_name: str,
+    num_entities: int,
+    num_days: int,
+    cassette_dir: Optional[str] = None,
+    record: bool = False,
+    config: Optional[dict] = None,
+) -> dict:
+    """Sync one stream offline and return its measurements."""
+    from tap_tiktok.tap import TapTikTok
+
+    start_date = date.today() - timedelta(days=num_days)
+    config = {**SAMPLE_CONFIG, **(config or {}), "start_date": f"{start_date.isoformat()}T00:00:00Z"}
+    if cassette_dir:
+        adapter = ReplayAdapter(cassette=Cassette(Path(cassette_dir)), record=record)
+    else:
+        account = SyntheticAccount(num_entities=num_entities, num_days=num_days)
+        adapter = ReplayAdapter(handler=account.handle)
+
+    tap = TapTikTok(config=config, catalog=selected_catalog(stream_name, config), validate_config=False)
+    for stream in tap.streams.values():
+        stream.requests_session.mount("https://", adapter)
+
+    counter = RecordCounter()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    with redirect_stdout(counter):
+        tap.sync_all()
+    adapter.mark_page_done()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    is_report = stream_name.endswith("_report")
+    return {
+        "stream": stream_name,
+        "entities": num_entities,
+        "days": num_days,
+        "records": counter.records,
+        "requests": adapter.request_count,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "records_per_second": counter.records / wall if wall else 0.0,
+        "requests_per_synced_day": adapter.request_count / num_days if is_report else None,
+        "cpu_ms_per_page": statistics.median(adapter.page_cpu_seconds) * 1000 if adapter.page_cpu_seconds else None,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_suite(
+    streams: List[str] = DEFAULT_STREAMS,
+    num_entities: int = 100,
+    num_days: int = 7,
+    cassette_dir: Optional[str] = None,
+    record: bool = False,
+    config: Optional[dict] = None,
+) -> List[dict]:
+    """Run every scenario in its own process, one after the other."""
+    results = []
+    for stream_name in streams:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            future = executor.submit(run_scenario, stream_name, num_entities, num_days, cassette_dir, record, config)
+            results.append(future.result())
+    return results
+
+
+def store_results(results: List[dict], output_dir: Path = DEFAULT_OUTPUT_DIR) -> Path:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    created_at = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = output_dir / f"sync-{created_at}.json"
+    path.write_text(json.dumps({"created_at": created_at, "python": sys.version, "results": results}, indent=2))
+    return path
+
+
+def previous_results(output_dir: Path, exclude: Optional[Path] = None) -> Optional[dict]:
+    runs = sorted(path for path in output_dir.glob("sync-*.json") if path != exclude)
+    return json.loads(runs[-1].read_text()) if runs else None
+
+
+def format_comparison(results: List[dict], previous: Optional[dict]) -> str:
+    before = {(r["stream"], r["entities"], r["days"]): r for r in (previous or {}).get("results", [])}
+    lines = [f"{'stream':<26}{'records':>10}{'rec/s':>12}{'req/day':>10}{'cpu ms/pg':>11}{'rss MB':>9}  vs previous"]
+    for result in results:
+        old = before.get((result["stream"], result["entities"], result["days"]))
+        change = f"{result['records_per_second'] / old['records_per_second'] - 1:+.1%} rec/s" if old else "-"
+        per_day = result["requests_per_synced_day"]
+        per_page = result["cpu_ms_per_page"]
+        lines.append(
+            f"{result['stream']:<26}{result['records']:>10}{result['records_per_second']:>12,.0f}"
+            f"{per_day if per_day is None else round(per_day, 2)!s:>10}"
+            f"{per_page if per_page is None else round(per_page, 2)!s:>11}"
+            f"{result['peak_rss_mb']:>9.1f}  {change}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", nargs="+", default=DEFAULT_STREAMS)
+    parser.add_argument("--entities", type=int, default=100, help="Number of ads in the synthetic account")
+    parser.add_argument("--days", type=int, default=7, help="Number of days to sync")
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--cassette", help="Directory of recorded responses to replay")
+    parser.add_argument("--record", action="store_true", help="Record responses from the live API into --cassette")
+    parser.add_argument("--config", type=Path, help="Tap config used when recording")
+    args = parser.parse_args(argv)
+    if args.record and not (args.cassette and args.config):
+        parser.error("--record requires --cassette and --config")
+
+    config = json.loads(args.config.read_text()) if args.config else None
+    results = run_suite(args.streams, args.entities, args.days, args.cassette, args.record, config)
+    path = store_results(results, args.output_dir)
+    print(format_comparison(results, previous_results(args.output_dir, exclude=path)))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
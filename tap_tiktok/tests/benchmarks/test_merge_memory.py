@@ -0,0 +1,85 @@
+"""Memory benchmark of the metric-chunk merge on 1000-row pages.
+
+Compares the peak memory allocated while merging one page of two metric chunks
+with the previous whole-page dict and with `ChunkMerger`, whose buffer is
+bounded by `max_buffered_rows` even when the chunks come back in different
+orders.
+"""
+
+import json
+import tracemalloc
+from datetime import timedelta
+
+import pytest
+
+from tap_tiktok.clients.metric_report import IN_APP_EVENT_METRICS
+from tap_tiktok.merge import ChunkMerger
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+PAGE_ROWS = 1000
+KEYS = ["ad_id", "stat_time_day"]
+IN_APP_EVENT_METRIC_CHUNKS = [
+    IN_APP_EVENT_METRICS[: len(IN_APP_EVENT_METRICS) // 2],
+    IN_APP_EVENT_METRICS[len(IN_APP_EVENT_METRICS) // 2 :],
+]
+
+pytestmark = pytest.mark.benchmark
+
+
+def _chunk_pages():
+    account = SyntheticAccount(num_entities=PAGE_ROWS, num_days=1)
+    day = (account.end_date - timedelta(days=1)).isoformat()
+    pages = []
+    for metrics in IN_APP_EVENT_METRIC_CHUNKS:
+        payload = account.report_page(
+            {
+                "dimensions": json.dumps(KEYS),
+                "metrics": json.dumps(metrics),
+                "start_date": day,
+                "end_date": day,
+                "page_size": str(PAGE_ROWS),
+            }
+        )
+        pages.append([{**row["dimensions"], **row["metrics"]} for row in payload["data"]["list"]])
+    return pages
+
+
+def _previous_merge(pages) -> int:
+    rows = {}
+    for page in pages:
+        for row in page:
+            primary_key = tuple(row[key] for key in KEYS)
+            if rows.get(primary_key) is None:
+                rows[primary_key] = row
+            else:
+                rows[primary_key].update(row)
+    return sum(1 for _ in rows.values())
+
+
+def _streaming_merge(pages, max_buffered_rows=PAGE_ROWS * 10) -> int:
+    merger = ChunkMerger(KEYS, len(pages), max_buffered_rows)
+    count = 0
+    for index, page in enumerate(pages):
+        count += sum(1 for _ in merger.add(index, page))
+    return count + sum(1 for _ in merger.finish())
+
+
+def _peak_kib(merge, pages, **kwargs):
+    tracemalloc.start()
+    try:
+        rows = merge(pages, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return rows, peak / 1024
+
+
+def test_merge_memory():
+    previous_rows, previous_peak = _peak_kib(_previous_merge, _chunk_pages())
+    ordered_rows, ordered_peak = _peak_kib(_streaming_merge, _chunk_pages())
+    first, second = _chunk_pages()
+    second.reverse()
+    spilled_rows, spilled_peak = _peak_kib(_streaming_merge, [first, second], max_buffered_rows=100)
+    assert previous_rows == ordered_rows == spilled_rows == PAGE_ROWS
+    assert ordered_peak <= previous_peak * 1.1, (previous_peak, ordered_peak)
+    assert spilled_peak < previous_peak, (previous_peak, spilled_peak)
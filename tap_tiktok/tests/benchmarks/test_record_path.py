@@ -0,0 +1,62 @@
+"""Micro-benchmark of the report record path on a 1000-row page.
+
+Compares the previous path (jsonpath extraction, a merged dict per row in
+`post_process` and the SDK's recursive conformance copy) with the current one.
+"""
+
+import logging
+import time
+
+import pytest
+from singer_sdk.helpers._catalog import pop_deselected_record_properties
+from singer_sdk.helpers._typing import TypeConformanceLevel, conform_record_data_types
+from singer_sdk.helpers.jsonpath import extract_jsonpath
+
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.benchmarks.pages import build_report_page, make_response
+
+SAMPLE_CONFIG = {"access_token": "token", "advertiser_id": "1", "start_date": "2024-01-01T00:00:00Z"}
+ROUNDS = 5
+
+pytestmark = pytest.mark.benchmark
+
+
+def _previous_path(stream, response) -> int:
+    count = 0
+    for row in extract_jsonpath(stream.records_jsonpath, input=response.json()):
+        record = {**row["dimensions"], **row["metrics"]}
+        pop_deselected_record_properties(record, stream.schema, stream.mask)
+        conform_record_data_types(stream.name, record, stream.schema, TypeConformanceLevel.RECURSIVE, logging)
+        count += 1
+    return count
+
+
+def _current_path(stream, response) -> int:
+    count = 0
+    for row in stream.parse_response(response):
+        record = stream.post_process(row)
+        pop_deselected_record_properties(record, stream.schema, stream.mask)
+        conform_record_data_types(stream.name, record, stream.schema, stream.TYPE_CONFORMANCE_LEVEL, logging)
+        count += 1
+    return count
+
+
+def _rows_per_second(path, stream, payload) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        response = make_response(payload)  # parse_response flattens the decoded page in place
+        start = time.perf_counter()
+        rows = path(stream, response)
+        best = min(best, time.perf_counter() - start)
+    return rows / best
+
+
+def test_record_path_rows_per_second():
+    stream = TapTikTok(config=SAMPLE_CONFIG, validate_config=False).streams["ads_daily_report"]
+    payload = build_report_page(stream, num_rows=1000)
+
+    assert _previous_path(stream, make_response(payload)) == _current_path(stream, make_response(payload)) == 1000
+
+    before = _rows_per_second(_previous_path, stream, payload)
+    after = _rows_per_second(_current_path, stream, payload)
+    assert after > before, f"{before:,.0f} rows/s before, {after:,.0f} rows/s after"
@@ -0,0 +1,54 @@
+"""Import-time and startup benchmark.
+
+The SDK import is outside of our control, so the budget only covers what the tap
+adds on top of it: importing `tap_tiktok.tap` and building the selected streams.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+STARTUP_BUDGET_SECONDS = 0.15
+
+pytestmark = pytest.mark.benchmark
+
+_STARTUP_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+import singer_sdk
+t1 = time.perf_counter()
+from tap_tiktok.tap import TapTikTok
+t2 = time.perf_counter()
+catalog = {"streams": [{
+    "tap_stream_id": "ads_daily_report",
+    "stream": "ads_daily_report",
+    "schema": {},
+    "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}],
+}]}
+tap = TapTikTok(
+    config={"access_token": "token", "advertiser_id": "1", "start_date": "2024-01-01T00:00:00Z"},
+    catalog=catalog,
+    validate_config=False,
+)
+tap.streams
+t3 = time.perf_counter()
+print(json.dumps({"sdk_import": t1 - t0, "tap_import": t2 - t1, "tap_init": t3 - t2}))
+"""
+
+
+def measure_startup() -> dict:
+    """Run a cold interpreter that imports the tap and builds one selected stream."""
+    output = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SCRIPT],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_startup_within_budget():
+    timings = min((measure_startup() for _ in range(3)), key=lambda t: t["tap_import"] + t["tap_init"])
+    assert timings["tap_import"] + timings["tap_init"] < STARTUP_BUDGET_SECONDS, timings
@@ -0,0 +1,29 @@
+"""Smoke run of the offline sync benchmark suite on a small synthetic account."""
+
+from tap_tiktok.tests.benchmarks.suite import (
+    DEFAULT_STREAMS,
+    format_comparison,
+    previous_results,
+    run_suite,
+    store_results,
+)
+
+
+def test_sync_benchmark_suite(tmp_path):
+    results = run_suite(DEFAULT_STREAMS, num_entities=20, num_days=3)
+    by_stream = {result["stream"]: result for result in results}
+
+    assert set(by_stream) == set(DEFAULT_STREAMS)
+    # 5 campaigns over 3 days fit in a single daily report window
+    assert by_stream["campaigns_daily_report"]["records"] == 15
+    assert by_stream["campaigns_daily_report"]["requests"] == 1
+    assert by_stream["ads"]["records"] == 20
+    for result in results:
+        assert result["records"] > 0
+        assert result["records_per_second"] > 0
+        assert result["peak_rss_mb"] > 0
+
+    path = store_results(results, tmp_path)
+    assert previous_results(tmp_path) is not None
+    assert "campaigns_daily_report" in format_comparison(results, previous_results(tmp_path))
+    assert path.exists()
@@ -0,0 +1,85 @@
+"""Fixtures and helpers shared by the tests.
+
+`server` is a stand-in Business API serving the synthetic `account` with the
+given `faults`; test modules override the `account` and `faults` fixtures to
+shape it.
+"""
+
+import json
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from io import StringIO
+from typing import Iterable, List, Optional, Tuple
+
+import pytest
+
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.server import FaultConfig, StandInServer
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+ADVERTISER_ID = "7000000000000000000"
+
+
+@pytest.fixture
+def account() -> SyntheticAccount:
+    return SyntheticAccount(num_entities=30, num_days=3)
+
+
+@pytest.fixture
+def faults() -> FaultConfig:
+    return FaultConfig()
+
+
+@pytest.fixture
+def server(account, faults):
+    server = StandInServer(("127.0.0.1", 0), account, faults)
+    server.start_in_thread()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def tap_config(server: Optional[StandInServer] = None, days: int = 2, **extra) -> dict:
+    """Config syncing the last `days` days of the advertiser, from `server` if given."""
+    config = {
+        "access_token": "token",
+        "advertiser_id": ADVERTISER_ID,
+        "start_date": f"{(date.today() - timedelta(days=days)).isoformat()}T00:00:00Z",
+    }
+    if server is not None:
+        config["api_url"] = server.api_url
+    return {**config, **extra}
+
+
+def select_streams(config: dict, stream_names: Iterable[str]) -> dict:
+    """The discovered catalog with only `stream_names` in it, selected."""
+    catalog = TapTikTok(config=config, validate_config=False).catalog_dict
+    catalog["streams"] = [entry for entry in catalog["streams"] if entry["tap_stream_id"] in stream_names]
+    for entry in catalog["streams"]:
+        for metadata in entry["metadata"]:
+            if metadata["breadcrumb"] == []:
+                metadata["metadata"]["selected"] = True
+    return catalog
+
+
+def sync_messages(
+    config: dict, catalog: Optional[dict] = None, state: Optional[dict] = None
+) -> Tuple[List[dict], TapTikTok]:
+    """The messages a sync of `catalog` writes, and its tap to inspect."""
+    tap = TapTikTok(config=config, catalog=catalog, state=state or {})
+    output = StringIO()
+    with redirect_stdout(output):
+        tap.run_sync()
+    return [json.loads(line) for line in output.getvalue().splitlines()], tap
+
+
+def without_sync_times(state: dict) -> dict:
+    """`state` without the sync times of its coverage indexes, which differ from run to run."""
+    bookmarks = {}
+    for name, bookmark in state["bookmarks"].items():
+        coverage = {
+            advertiser_id: [interval[:2] for interval in intervals]
+            for advertiser_id, intervals in bookmark.get("coverage", {}).items()
+        }
+        bookmarks[name] = {**bookmark, "coverage": coverage} if coverage else bookmark
+    return {**state, "bookmarks": bookmarks}
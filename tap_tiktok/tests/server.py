@@ -0,0 +1,179 @@
+"""Local stand-in for the TikTok Business API.
+
+Serves a `SyntheticAccount` over HTTP for the endpoints the tap uses, with
+configurable latency, rate limiting and server errors, so throughput and
+failure handling can be exercised without spending production quota:
+
+    python -m tap_tiktok.tests.server --port 8765 --entities 5000 --days 30 \\
+        --latency-ms 80 --rate-limit-ratio 0.02 --server-error-ratio 0.01
+
+then point the tap at it with `"api_url": "http://127.0.0.1:8765/open_api/v1.3"`.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+from tap_tiktok.tests.synthetic import SyntheticAccount, split_url
+
+RATE_LIMIT_CODE = 40100
+RATE_LIMIT_MESSAGE = "Too many requests. Please retry in some time."
+
+
+@dataclass
+class FaultConfig:
+    """What the stand-in injects into its answers."""
+
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    slow_page_ratio: float = 0.0
+    slow_page_factor: float = 10.0
+    rate_limit_ratio: float = 0.0
+    qps_limit: Optional[float] = None
+    server_error_ratio: float = 0.0
+    # access tokens whose requests are all rate limited
+    rate_limited_tokens: Tuple[str, ...] = ()
+    seed: int = 0
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server answering TikTok Business API requests from a synthetic account."""
+
+    daemon_threads = True
+
+    def __init__(self, address, account: SyntheticAccount, faults: Optional[FaultConfig] = None) -> None:
+        super().__init__(address, _Handler)
+        self.account = account
+        self.faults = faults or FaultConfig()
+        self.request_count = 0
+        self.token_counts: Counter = Counter()
+        # requests being answered, and the most answered at once
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/open_api/v1.3"
+
+    def draw(self, token: Optional[str] = None) -> tuple:
+        """Return (delay seconds, injected fault or None) for the next request, sent with `token`."""
+        faults = self.faults
+        with self._lock:
+            self.request_count += 1
+            self.token_counts[token] += 1
+            delay = faults.latency_ms + self._random.uniform(0, faults.latency_jitter_ms)
+            if self._random.random() < faults.slow_page_ratio:
+                delay *= faults.slow_page_factor
+            if faults.qps_limit is not None:
+                now = time.monotonic()
+                if now - self._window_start >= 1:
+                    self._window_start, self._window_requests = now, 0
+                self._window_requests += 1
+                if self._window_requests > faults.qps_limit:
+                    return delay / 1000, "rate_limit"
+            if token in faults.rate_limited_tokens:
+                return delay / 1000, "rate_limit"
+            roll = self._random.random()
+            if roll < faults.rate_limit_ratio:
+                return delay / 1000, "rate_limit"
+            if roll < faults.rate_limit_ratio + faults.server_error_ratio:
+                return delay / 1000, "server_error"
+        return delay / 1000, None
+
+    def begin_request(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end_request(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def start_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def do_GET(self) -> None:
+        self.server.begin_request()
+        try:
+            self._answer()
+        finally:
+            self.server.end_request()
+
+    def _answer(self) -> None:
+        delay, fault = self.server.draw(self.headers.get("Access-Token"))
+        if delay:
+            time.sleep(delay)
+        if fault == "server_error":
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"message": "Service Unavailable"})
+            return
+        if fault == "rate_limit":
+            self._send(HTTPStatus.OK, {"code": RATE_LIMIT_CODE, "message": RATE_LIMIT_MESSAGE, "data": {}})
+            return
+        path, params = split_url(self.path)
+        self._send(HTTPStatus.OK, self.server.account.handle(path, params))
+
+    def _send(self, status: HTTPStatus, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--entities", type=int, default=100, help="Number of ads in the synthetic account")
+    parser.add_argument("--days", type=int, default=30, help="Number of days of data before today")
+    parser.add_argument("--advertiser-id", default="7000000000000000000")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--slow-page-ratio", type=float, default=0.0)
+    parser.add_argument("--slow-page-factor", type=float, default=10.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--qps-limit", type=float)
+    parser.add_argument("--server-error-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    account = SyntheticAccount(args.entities, args.days, advertiser_id=args.advertiser_id, seed=args.seed)
+    faults = FaultConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        slow_page_ratio=args.slow_page_ratio,
+        slow_page_factor=args.slow_page_factor,
+        rate_limit_ratio=args.rate_limit_ratio,
+        qps_limit=args.qps_limit,
+        server_error_ratio=args.server_error_ratio,
+        seed=args.seed,
+    )
+    server = StandInServer((args.host, args.port), account, faults)
+    print(f"Serving {args.entities} entities x {args.days} days on {server.api_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Deterministic synthetic TikTok advertiser accounts.
+
+A `SyntheticAccount` answers the Business API endpoints used by the tap with
+generated data for N entities over M days, so benchmarks and load tests can run
+without touching the real API. Pages are computed from their index, so any page
+of an arbitrarily large account is produced in constant memory.
+"""
+
+import json
+import math
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+API_PREFIX = "/open_api/v1.3"
+REPORT_PATH = "/report/integrated/get/"
+CAMPAIGN_PATH = "/campaign/get/"
+AD_GROUP_PATH = "/adgroup/get/"
+AD_PATH = "/ad/get/"
+ADVERTISER_PATH = "/advertiser/info/"
+
+DEFAULT_PAGE_SIZE = 10
+
+BREAKDOWN_VALUES = {
+    "age": ["AGE_13_17", "AGE_18_24", "AGE_25_34", "AGE_35_44", "AGE_45_54", "AGE_55_100"],
+    "gender": ["MALE", "FEMALE", "NONE"],
+    "country_code": ["US", "GB", "DE", "FR", "BR"],
+    "language": ["en", "de", "fr", "pt"],
+    "platform": ["ANDROID", "IPHONE", "IPAD"],
+}
+
+ENTITY_ID_BASE = {
+    "campaign_id": 1600000000000000000,
+    "adgroup_id": 1700000000000000000,
+    "ad_id": 1800000000000000000,
+}
+
+DATA_LEVEL_ID_FIELD = {
+    "AUCTION_CAMPAIGN": "campaign_id",
+    "AUCTION_ADGROUP": "adgroup_id",
+    "AUCTION_AD": "ad_id",
+}
+
+
+def split_url(url: str) -> Tuple[str, Dict[str, str]]:
+    """Return the API path (without the version prefix) and the query params of a URL."""
+    parsed = urlparse(url)
+    path = parsed.path.split(API_PREFIX, 1)[-1]
+    path = "/" + "/".join(part for part in path.split("/") if part) + "/"
+    return path, dict(parse_qsl(parsed.query))
+
+
+class SyntheticAccount:
+    """Generated data for one advertiser with `num_entities` ads over `num_days` days.
+
+    Ad groups hold two ads and campaigns two ad groups. The account has data from
+    `num_days` days before `end_date` (default: today) up to the day before it.
+    The last `deleted_entities` entities of each level are deleted, one per day
+    from the first day on; their report rows are zero after that day.
+    """
+
+    def __init__(
+        self,
+        num_entities: int = 100,
+        num_days: int = 30,
+        advertiser_id: str = "7000000000000000000",
+        end_date: Optional[date] = None,
+        seed: int = 0,
+        deleted_entities: int = 0,
+    ) -> None:
+        self.num_entities = num_entities
+        self.num_days = num_days
+        self.advertiser_id = advertiser_id
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - timedelta(days=num_days)
+        self.seed = seed
+        self.deleted_entities = deleted_entities
+        self.entity_counts = {
+            "ad_id": num_entities,
+            "adgroup_id": math.ceil(num_entities / 2),
+            "campaign_id": math.ceil(num_entities / 4),
+        }
+
+    def handle(self, path: str, params: Dict[str, str]) -> dict:
+        """Return the JSON payload the API would answer for `path` and query `params`."""
+        path = "/" + path.strip("/") + "/"
+        if path == REPORT_PATH:
+            return self.report_page(params)
+        if path == CAMPAIGN_PATH:
+            return self.entity_page("campaign_id", params)
+        if path == AD_GROUP_PATH:
+            return self.entity_page("adgroup_id", params)
+        if path == AD_PATH:
+            return self.entity_page("ad_id", params)
+        if path == ADVERTISER_PATH:
+            return self._ok({"list": [self.advertiser()]})
+        return {"code": 40002, "message": f"Unknown endpoint {path}", "data": {}}
+
+    # Entities
+
+    def entity_id(self, id_field: str, index: int) -> str:
+        return str(ENTITY_ID_BASE[id_field] + index)
+
+    def deleted_on(self, id_field: str, index: int) -> Optional[date]:
+        """Day the entity was deleted, None if it was not."""
+        first_deleted = self.entity_counts[id_field] - self.deleted_entities
+        return self.start_date + timedelta(days=index - first_deleted) if index >= first_deleted else None
+
+    def entity(self, id_field: str, index: int) -> dict:
+        record: Dict[str, Any] = {
+            "advertiser_id": self.advertiser_id,
+            "create_time": "2023-01-01 00:00:00",
+            "modify_time": "2023-06-01 00:00:00",
+            "operation_status": "ENABLE",
+            "secondary_status": "CAMPAIGN_STATUS_ENABLE",
+        }
+        deleted_on = self.deleted_on(id_field, index)
+        if deleted_on is not None:
+            level = id_field[: -len("_id")].upper()
+            record.update(
+                modify_time=f"{deleted_on.isoformat()} 12:00:00",
+                operation_status="DELETE",
+                secondary_status=f"{level}_STATUS_DELETE",
+            )
+        if id_field == "ad_id":
+            adgroup_index = index // 2
+            record.update(
+                ad_id=self.entity_id("ad_id", index),
+                ad_name=f"Ad {index}",
+                adgroup_id=self.entity_id("adgroup_id", adgroup_index),
+                adgroup_name=f"Ad group {adgroup_index}",
+                campaign_id=self.entity_id("campaign_id", adgroup_index // 2),
+                campaign_name=f"Campaign {adgroup_index // 2}",
+                ad_format="SINGLE_VIDEO",
+                ad_text=f"Synthetic ad text {index} " * 4,
+                video_id=f"v10033g50000{index:012d}",
+                landing_page_url=f"https://example.com/landing/{index}",
+                image_ids=[f"ad-site-i18n-sg/{index:016d}"],
+                call_to_action="LEARN_MORE",
+            )
+        elif id_field == "adgroup_id":
+            record.update(
+                adgroup_id=self.entity_id("adgroup_id", index),
+                adgroup_name=f"Ad group {index}",
+                campaign_id=self.entity_id("campaign_id", index // 2),
+                campaign_name=f"Campaign {index // 2}",
+                placement_type="PLACEMENT_TYPE_AUTOMATIC",
+                placements=["PLACEMENT_TIKTOK"],
+                location_ids=["6252001"],
+                budget=100.0,
+                budget_mode="BUDGET_MODE_DAY",
+                bid_type="BID_TYPE_NO_BID",
+                optimization_goal="CLICK",
+            )
+        else:
+            record.update(
+                campaign_id=self.entity_id("campaign_id", index),
+                campaign_name=f"Campaign {index}",
+                objective_type="TRAFFIC",
+                budget=1000.0,
+                budget_mode="BUDGET_MODE_INFINITE",
+                is_new_structure=True,
+            )
+        return record
+
+    def entity_page(self, id_field: str, params: Dict[str, str]) -> dict:
+        page, page_size = self._paging(params)
+        total = self.entity_counts[id_field]
+        first = (page - 1) * page_size
+        rows = [self.entity(id_field, index) for index in range(first, min(first + page_size, total))]
+        fields = params.get("fields")
+        if fields:
+            wanted = set(json.loads(fields))
+            rows = [{key: value for key, value in row.items() if key in wanted} for row in rows]
+        return self._ok({"list": rows, "page_info": self._page_info(page, page_size, total)})
+
+    def advertiser(self) -> dict:
+        return {
+            "advertiser_id": self.advertiser_id,
+            "name": "Synthetic advertiser",
+            "currency": "USD",
+            "timezone": "Etc/GMT",
+            "display_timezone": "Etc/GMT",
+            "status": "STATUS_ENABLE",
+            "create_time": 1672531200,
+        }
+
+    # Reports
+
+    def report_days(self, params: Dict[str, str]) -> List[date]:
+        start = max(date.fromisoformat(params["start_date"]), self.start_date)
+        end = min(date.fromisoformat(params["end_date"]), self.end_date - timedelta(days=1))
+        return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    def report_page(self, params: Dict[str, str]) -> dict:
+        page, page_size = self._paging(params)
+        dimensions: List[str] = json.loads(params["dimensions"])
+        metrics: List[str] = json.loads(params["metrics"])
+        id_field = DATA_LEVEL_ID_FIELD.get(params.get("data_level", ""), "ad_id")
+        hourly = "stat_time_hour" in dimensions
+        times = [
+            f"{day.isoformat()} {hour:02d}:00:00"
+            for day in self.report_days(params)
+            for hour in (range(24) if hourly else [0])
+        ]
+        breakdowns = [dimension for dimension in dimensions if dimension in BREAKDOWN_VALUES]
+        combos = math.prod(len(BREAKDOWN_VALUES[dimension]) for dimension in breakdowns)
+        entity_indexes = self.report_entities(id_field, params)
+        num_ids = len(entity_indexes)
+        total = len(times) * num_ids * combos
+
+        rows = []
+        first = (page - 1) * page_size
+        for index in range(first, min(first + page_size, total)):
+            time_index, rest = divmod(index, num_ids * combos)
+            entity_index, combo_index = divmod(rest, combos)
+            entity_index = entity_indexes[entity_index]
+            row_dimensions = {}
+            for dimension in dimensions:
+                if dimension in ("stat_time_day", "stat_time_hour"):
+                    row_dimensions[dimension] = times[time_index]
+                elif dimension == id_field:
+                    row_dimensions[dimension] = self.entity_id(id_field, entity_index)
+                elif dimension in BREAKDOWN_VALUES:
+                    values = BREAKDOWN_VALUES[dimension]
+                    combo_index, value_index = divmod(combo_index, len(values))
+                    row_dimensions[dimension] = values[value_index]
+            row_metrics = self.metrics(index, times[time_index], metrics)
+            deleted_on = self.deleted_on(id_field, entity_index)
+            if deleted_on is not None and times[time_index][:10] > deleted_on.isoformat():
+                row_metrics = {metric: "0.00" for metric in metrics}
+            rows.append({"dimensions": row_dimensions, "metrics": row_metrics})
+        return self._ok({"list": rows, "page_info": self._page_info(page, page_size, total)})
+
+    def report_entities(self, id_field: str, params: Dict[str, str]) -> List[int]:
+        """Indexes of the entities a report request asks for, by status and ID filters."""
+        indexes = range(self.entity_counts[id_field])
+        for condition in json.loads(params.get("filtering") or "[]"):
+            values = json.loads(condition["filter_value"])
+            if condition["field_name"].endswith("_status") and values == ["STATUS_NOT_DELETE"]:
+                indexes = [index for index in indexes if self.deleted_on(id_field, index) is None]
+            elif condition["field_name"] == f"{id_field}s":
+                indexes = [index for index in indexes if self.entity_id(id_field, index) in values]
+        return list(indexes)
+
+    def metrics(self, index: int, stat_time: str, metrics: List[str]) -> Dict[str, str]:
+        rnd = random.Random(f"{self.seed}-{stat_time}-{index}")
+        return {metric: f"{rnd.random() * 100:.2f}" for metric in metrics}
+
+    # Helpers
+
+    @staticmethod
+    def _paging(params: Dict[str, str]):
+        return int(params.get("page", 1)), int(params.get("page_size", DEFAULT_PAGE_SIZE))
+
+    @staticmethod
+    def _page_info(page: int, page_size: int, total: int) -> dict:
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total_number": total,
+            "total_page": math.ceil(total / page_size),
+        }
+
+    def _ok(self, data: dict) -> dict:
+        return {"code": 0, "message": "OK", "request_id": f"synthetic-{self.seed}", "data": data}
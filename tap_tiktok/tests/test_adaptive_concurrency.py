@@ -0,0 +1,81 @@
+"""Tests for the adaptive (AIMD) limit on the requests in flight of a stream and the ordered page map."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tap_tiktok.concurrency import AIMDLimiter, ordered_map
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.server import FaultConfig
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=5000, num_days=1)
+
+
+@pytest.fixture
+def faults():
+    return FaultConfig(latency_ms=50, qps_limit=3)
+
+
+def test_ordered_map_reuses_the_executor():
+    def slow_square(value):
+        time.sleep(0.01 * (5 - value))
+        return value * value
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        assert list(ordered_map(slow_square, range(5), executor, 3)) == [0, 1, 4, 9, 16]
+        # stopping early cancels the calls not started, and leaves the executor to the next series
+        results = ordered_map(slow_square, range(100), executor, 3)
+        assert next(results) == 0
+        results.close()
+        assert list(ordered_map(slow_square, range(3), executor, 3)) == [0, 1, 4]
+    assert list(ordered_map(slow_square, range(3), None, 3)) == [0, 1, 4]
+
+
+def test_limit_increases_additively_and_decreases_multiplicatively():
+    limiter = AIMDLimiter("ads", initial=2, max_limit=4)
+    for _ in range(3):
+        limiter.record(0.1)
+    assert int(limiter.limit) == 3
+    limiter.record(None, overloaded=True)
+    assert int(limiter.limit) == 1
+    for _ in range(20):
+        limiter.record(0.1)
+    assert limiter.limit == 4
+    # a latency spike counts as overload once the average is known
+    limiter._last_decrease = float("-inf")
+    limiter.record(1.0)
+    assert limiter.limit == 2
+    assert (limiter.lowest, limiter.highest) == (1, 4)
+
+
+def test_requests_wait_for_a_slot():
+    limiter = AIMDLimiter("ads", initial=1)
+    entered = threading.Event()
+
+    def request():
+        with limiter.slot():
+            entered.set()
+
+    with limiter.slot():
+        thread = threading.Thread(target=request)
+        thread.start()
+        assert not entered.wait(0.1)
+    assert entered.wait(1)
+    thread.join()
+
+
+def test_rate_limits_lower_the_limit(server):
+    config = tap_config(server, 1, adaptive_concurrency={"max_limit": 8})
+    messages, tap = sync_messages(config, select_streams(config, ["ads_daily_report"]))
+
+    records = [message["record"] for message in messages if message["type"] == "RECORD"]
+    assert len({record["ad_id"] for record in records}) == 5000
+    limiter = tap.streams["ads_daily_report"].concurrency_limiter
+    # the four pages after the first one went out at once and hit the limit of 3 requests per second
+    assert limiter.lowest < 4
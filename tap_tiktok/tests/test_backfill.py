@@ -0,0 +1,99 @@
+"""Tests for the parallel backfill and the end bound of the report paginators."""
+
+import json
+from datetime import date, timedelta
+from io import StringIO
+
+import pendulum
+import pytest
+
+from tap_tiktok.backfill import backfill, partition
+from tap_tiktok.pagination import HourlyReportPaginator
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config, without_sync_times
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+STREAMS = ["ads", "ads_daily_report", "ads_hourly_report"]
+DAYS = 7
+START = date.today() - timedelta(days=DAYS)
+END = date.today() - timedelta(days=2)
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=4, num_days=10)
+
+
+def _record_keys(messages):
+    # the stand-in's metrics depend on the row's position in its window, so rows are compared by key
+    keys = []
+    for message in messages:
+        if message["type"] == "RECORD":
+            record = message["record"]
+            stat_time = record.get("stat_time_day") or record.get("stat_time_hour")
+            keys.append((message["stream"], record["ad_id"], stat_time))
+    return keys
+
+
+def test_partition_splits_the_range_into_contiguous_slices():
+    slices = partition(date(2024, 1, 1), date(2024, 1, 10), 3)
+    assert slices == [
+        (date(2024, 1, 1), date(2024, 1, 4)),
+        (date(2024, 1, 5), date(2024, 1, 7)),
+        (date(2024, 1, 8), date(2024, 1, 10)),
+    ]
+    assert partition(date(2024, 1, 1), date(2024, 1, 2), 5) == [
+        (date(2024, 1, 1), date(2024, 1, 1)),
+        (date(2024, 1, 2), date(2024, 1, 2)),
+    ]
+
+
+def test_hourly_paginator_fetches_the_last_day():
+    yesterday = pendulum.now().subtract(days=1)
+    paginator = HourlyReportPaginator(yesterday.subtract(days=1))
+    response = type("Response", (), {"json": lambda self: {"data": {"page_info": {"page": 1, "total_page": 1}}}})()
+    assert paginator.has_more(response)
+    paginator.advance(response)
+    assert paginator.current_value["start_date"] == yesterday.to_date_string()
+    assert not paginator.has_more(response)
+
+
+def test_backfill_slices_match_a_single_sync(server):
+    config = tap_config(server, DAYS, end_date=f"{END.isoformat()}T00:00:00Z")
+    catalog = select_streams(config, STREAMS)
+    single, _ = sync_messages(config, catalog)
+
+    output = StringIO()
+    state, failures = backfill(tap_config(server, DAYS), catalog, START, END, slices=3, workers=3, output=output)
+    sliced = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert failures == []
+    # entity streams are not backfilled
+    assert _record_keys(sliced) == [key for key in _record_keys(single) if key[0] != "ads"]
+    assert [message["type"] for message in sliced].count("STATE") == 1
+    assert sliced[-1] == {"type": "STATE", "value": state}
+    single_bookmarks = {name: bookmark for name, bookmark in single[-1]["value"]["bookmarks"].items() if name != "ads"}
+    assert without_sync_times(state) == without_sync_times({"bookmarks": single_bookmarks})
+    assert state["bookmarks"]["ads_hourly_report"]["replication_key_value"].startswith(END.isoformat())
+
+
+def test_backfill_writes_slices_to_the_output_dir(server, tmp_path):
+    catalog = select_streams(tap_config(server, DAYS), ["ads_daily_report"])
+    backfill(tap_config(server, DAYS), catalog, START, END, slices=2, workers=2, output_dir=str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "ads_daily_report.000.jsonl",
+        "ads_daily_report.001.jsonl",
+        "state.json",
+    ]
+
+
+def test_reports_bookmarked_after_the_end_bound_fetch_nothing(server):
+    config = tap_config(server, DAYS, lookback=0, end_date=f"{END.isoformat()}T00:00:00Z")
+    bookmark = (date.today() - timedelta(days=1)).isoformat()
+    bookmark_value = {"replication_key": "stat_time_day", "replication_key_value": f"{bookmark} 00:00:00"}
+    state = {"bookmarks": {"ads_daily_report": bookmark_value}}
+    server.request_count = 0
+    messages, _ = sync_messages(config, select_streams(config, ["ads_daily_report"]), state)
+
+    assert server.request_count == 0
+    assert not [message for message in messages if message["type"] == "RECORD"]
+    assert messages[-1]["value"]["bookmarks"]["ads_daily_report"]["replication_key_value"].startswith(bookmark)
@@ -0,0 +1,101 @@
+"""Tests for the coverage index and the refill mode of the report streams."""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from tap_tiktok.coverage import CoverageIndex
+from tap_tiktok.tests.conftest import ADVERTISER_ID, select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+MONDAY = datetime(2024, 5, 6, 2, tzinfo=timezone.utc)
+TUESDAY = MONDAY + timedelta(days=1)
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=3, num_days=6)
+
+
+def _sync(server, state, **extra):
+    config = tap_config(server, 6, **extra)
+    catalog = select_streams(config, ["ads_daily_report", "ads_hourly_report"])
+    messages, tap = sync_messages(config, catalog, state)
+    return messages, tap.state
+
+
+def test_adjacent_intervals_synced_the_same_day_are_merged():
+    index = CoverageIndex()
+    index.add(date(2024, 1, 1), date(2024, 1, 10), MONDAY)
+    index.add(date(2024, 1, 11), date(2024, 1, 20), MONDAY + timedelta(hours=1))
+    index.add(date(2024, 1, 21), date(2024, 1, 25), TUESDAY)
+    assert index.intervals == [
+        (date(2024, 1, 1), date(2024, 1, 20), MONDAY),
+        (date(2024, 1, 21), date(2024, 1, 25), TUESDAY),
+    ]
+    assert CoverageIndex.from_state(index.to_state()).intervals == index.intervals
+
+
+def test_newer_syncs_supersede_the_overlapped_days():
+    index = CoverageIndex([(date(2024, 1, 1), date(2024, 1, 10), MONDAY)])
+    index.add(date(2024, 1, 4), date(2024, 1, 5), TUESDAY)
+    assert index.intervals == [
+        (date(2024, 1, 1), date(2024, 1, 3), MONDAY),
+        (date(2024, 1, 4), date(2024, 1, 5), TUESDAY),
+        (date(2024, 1, 6), date(2024, 1, 10), MONDAY),
+    ]
+    assert index.synced_at(date(2024, 1, 4)) == TUESDAY
+    assert index.synced_at(date(2024, 1, 11)) is None
+
+
+def test_gaps_are_the_uncovered_or_stale_days():
+    index = CoverageIndex(
+        [(date(2024, 1, 3), date(2024, 1, 4), MONDAY), (date(2024, 1, 6), date(2024, 1, 7), TUESDAY)]
+    )
+    assert index.gaps(date(2024, 1, 1), date(2024, 1, 8)) == [
+        (date(2024, 1, 1), date(2024, 1, 2)),
+        (date(2024, 1, 5), date(2024, 1, 5)),
+        (date(2024, 1, 8), date(2024, 1, 8)),
+    ]
+    stale = index.gaps(date(2024, 1, 1), date(2024, 1, 8), lambda day, synced_at: synced_at < TUESDAY)
+    assert stale == [(date(2024, 1, 1), date(2024, 1, 5)), (date(2024, 1, 8), date(2024, 1, 8))]
+
+
+def test_refill_requests_only_the_days_missing_from_the_coverage(server):
+    _, state = _sync(server, {})
+    yesterday = date.today() - timedelta(days=1)
+    for name in ("ads_daily_report", "ads_hourly_report"):
+        intervals = state["bookmarks"][name]["coverage"][ADVERTISER_ID]
+        assert [interval[:2] for interval in intervals] == [
+            [(date.today() - timedelta(days=6)).isoformat(), yesterday.isoformat()]
+        ]
+
+    # a partial failure left two days uncovered
+    missing = [date.today() - timedelta(days=4), date.today() - timedelta(days=3)]
+    synced_at = datetime.now(timezone.utc)
+    index = CoverageIndex(
+        [
+            (date.today() - timedelta(days=6), missing[0] - timedelta(days=1), synced_at),
+            (missing[1] + timedelta(days=1), yesterday, synced_at),
+        ]
+    )
+    for name in ("ads_daily_report", "ads_hourly_report"):
+        state["bookmarks"][name]["coverage"][ADVERTISER_ID] = index.to_state()
+
+    requests_before = server.request_count
+    messages, state = _sync(server, state, refill={})
+    days = {
+        (message["record"].get("stat_time_day") or message["record"]["stat_time_hour"])[:10]
+        for message in messages
+        if message["type"] == "RECORD"
+    }
+    assert days == {day.isoformat() for day in missing}
+    # one window for the daily report, one per day for the hourly report
+    assert server.request_count - requests_before == 3
+    for name in ("ads_daily_report", "ads_hourly_report"):
+        index = CoverageIndex.from_state(state["bookmarks"][name]["coverage"][ADVERTISER_ID])
+        assert index.gaps(date.today() - timedelta(days=6), yesterday) == []
+
+    requests_before = server.request_count
+    _sync(server, state, refill={})
+    assert server.request_count == requests_before
@@ -0,0 +1,58 @@
+"""Tests for the report streams defined by the `custom_reports` config."""
+
+import pytest
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+CUSTOM_REPORTS = [
+    {
+        "name": "ads_spend_by_country",
+        "data_level": "AUCTION_AD",
+        "report_type": "AUDIENCE",
+        "dimensions": ["ad_id", "country_code"],
+        "metrics": ["spend", "clicks"],
+    },
+    {
+        "name": "campaigns_hourly_spend",
+        "data_level": "AUCTION_CAMPAIGN",
+        "dimensions": ["campaign_id", "stat_time_hour"],
+        "metrics": ["spend"],
+        "granularity": "HOURLY",
+    },
+]
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=4, num_days=2)
+
+
+def test_custom_reports_request_exactly_their_dimensions_and_metrics(server):
+    config = tap_config(server, custom_reports=CUSTOM_REPORTS)
+    messages, tap = sync_messages(config, select_streams(config, ["ads_spend_by_country", "campaigns_hourly_spend"]))
+    assert tap.streams["ads_spend_by_country"].primary_keys == ["ad_id", "country_code", "stat_time_day"]
+    assert tap.streams["campaigns_hourly_spend"].replication_key == "stat_time_hour"
+
+    records = {}
+    for message in messages:
+        if message["type"] == "RECORD":
+            records.setdefault(message["stream"], []).append(message["record"])
+    by_country = records["ads_spend_by_country"]
+    assert {tuple(sorted(record)) for record in by_country} == {
+        ("ad_id", "clicks", "country_code", "spend", "stat_time_day")
+    }
+    # 4 ads in 5 countries over 2 days
+    assert len(by_country) == 40
+    hourly = records["campaigns_hourly_spend"]
+    assert {tuple(sorted(record)) for record in hourly} == {("campaign_id", "spend", "stat_time_hour")}
+    # one request per report and day
+    assert server.request_count == 1 + 2
+
+
+def test_custom_reports_need_a_name_of_their_own(server):
+    custom_reports = [{**CUSTOM_REPORTS[0], "name": "ads_daily_report"}]
+    with pytest.raises(ConfigValidationError):
+        TapTikTok(config=tap_config(server, custom_reports=custom_reports)).streams
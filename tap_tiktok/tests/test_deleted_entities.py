@@ -0,0 +1,87 @@
+"""Tests for skipping the deleted entities in later report windows."""
+
+from datetime import date, timedelta
+
+import pytest
+
+from tap_tiktok.deleted_entities import DeletedEntityIndex
+from tap_tiktok.tests.conftest import ADVERTISER_ID, select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import ENTITY_ID_BASE, SyntheticAccount
+
+NUM_DAYS = 4
+# day field and metrics of the rows in the index tests
+SPEND = ("stat_time_day", ["spend"])
+
+
+@pytest.fixture
+def account():
+    # ads 4 and 5 are deleted on the first and second day
+    return SyntheticAccount(num_entities=6, num_days=NUM_DAYS, deleted_entities=2)
+
+
+def _day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+def _sync(server, stream_names, state=None, **config):
+    config = tap_config(server, NUM_DAYS, include_deleted=True, skip_deleted_entities=True, **config)
+    requests_before = server.request_count
+    messages, tap = sync_messages(config, select_streams(config, stream_names), state)
+    rows = [message["record"] for message in messages if message["type"] == "RECORD" and message["stream"] != "ads"]
+    return rows, tap.state, server.request_count - requests_before
+
+
+def _ad_ids(rows):
+    return {int(row["ad_id"]) - ENTITY_ID_BASE["ad_id"] for row in rows}
+
+
+def test_deleted_entities_are_skipped_after_their_last_activity(server):
+    rows, state, _ = _sync(server, ["ads", "ads_daily_report"])
+    assert len(rows) == 6 * NUM_DAYS
+    deleted = state["bookmarks"]["ads"]["deleted_entities"][ADVERTISER_ID]
+    assert deleted == {str(ENTITY_ID_BASE["ad_id"] + 4): _day(4), str(ENTITY_ID_BASE["ad_id"] + 5): _day(3)}
+
+    # without the ads in the same run, the index may miss deletions and the window takes every ad
+    rows, _, requests = _sync(server, ["ads_daily_report"], state)
+    assert (_ad_ids(rows), requests) == ({0, 1, 2, 3, 4, 5}, 1)
+
+    # once the ads are synced, the window of the last day skips both deleted ads (one request is the ads')
+    rows, state, requests = _sync(server, ["ads", "ads_daily_report"], state)
+    assert (_ad_ids(rows), requests) == ({0, 1, 2, 3}, 2)
+
+    # the lookback window starts the day after the first deletion, the second deleted ad is requested by ID
+    rows, _, requests = _sync(server, ["ads", "ads_daily_report"], state, lookback=2)
+    assert {row["stat_time_day"][:10] for row in rows} == {_day(2), _day(1)}
+    assert (_ad_ids(rows), requests) == ({0, 1, 2, 3, 5}, 3)
+
+
+def test_the_index_is_only_used_once_refreshed_and_joins_the_state_on_merge():
+    state = {"bookmarks": {"ads": {"deleted_entities": {ADVERTISER_ID: {"1": "2024-01-01"}}}}}
+    index = DeletedEntityIndex(ADVERTISER_ID, state)
+    assert index.partition("ad_id", date(2024, 1, 5)) == ([], 1)
+    assert not index.is_refreshed("ad_id")
+    index.observe("ad_id", {"ad_id": "2", "operation_status": "DELETE", "modify_time": "2024-01-03 08:00:00"})
+    index.mark_refreshed("ad_id")
+    assert index.is_refreshed("ad_id")
+
+    # the state only changes on merge
+    assert state["bookmarks"]["ads"]["deleted_entities"][ADVERTISER_ID] == {"1": "2024-01-01"}
+    assert index.merge_into(state)
+    assert state["bookmarks"]["ads"]["deleted_entities"][ADVERTISER_ID] == {"1": "2024-01-01", "2": "2024-01-03"}
+    assert not index.merge_into(state)
+
+    # entity streams synced without the statuses cannot refresh their level
+    index.observe("adgroup_id", {"adgroup_id": "3"})
+    index.mark_refreshed("adgroup_id")
+    assert not index.is_refreshed("adgroup_id")
+
+
+def test_later_activity_moves_the_last_active_day():
+    index = DeletedEntityIndex(ADVERTISER_ID, {})
+    index.observe("ad_id", {"ad_id": "1", "operation_status": "DELETE", "modify_time": "2024-01-01 08:00:00"})
+    index.observe("ad_id", {"ad_id": "2", "operation_status": "ENABLE"})
+    # rows without any non-zero metric are no activity
+    index.record_activity("ad_id", {"ad_id": "1", "stat_time_day": "2024-01-03", "spend": "0.00"}, *SPEND)
+    assert index.partition("ad_id", date(2024, 1, 3)) == ([], 1)
+    index.record_activity("ad_id", {"ad_id": "1", "stat_time_day": "2024-01-05", "spend": "1.50"}, *SPEND)
+    assert index.partition("ad_id", date(2024, 1, 6)) == (["1"], 0)
@@ -0,0 +1,118 @@
+"""Tests for the entity index enriching report rows with names and hierarchy."""
+
+import threading
+
+import pytest
+
+from tap_tiktok.entity_cache import EntityCache
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+ENTITIES = {
+    "campaigns": [{"campaign_id": "1", "campaign_name": "Campaign 1"}],
+    "ad_groups": [
+        {"adgroup_id": "10", "adgroup_name": "Ad group 10", "campaign_id": "1"},
+        {"adgroup_id": "11", "adgroup_name": "Ad group 11", "campaign_id": "1"},
+    ],
+    "ads": [
+        {"ad_id": "100", "ad_name": "Ad 100", "adgroup_id": "10"},
+        {"ad_id": "101", "ad_name": "Ad 101", "adgroup_id": "11"},
+    ],
+}
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=6, num_days=2)
+
+
+@pytest.mark.parametrize("max_entities", [100, 2])
+def test_rows_get_their_names_and_hierarchy(max_entities):
+    fetched = []
+
+    def fetch(level):
+        fetched.append(level.stream_name)
+        return ENTITIES[level.stream_name]
+
+    cache = EntityCache(fetch, max_entities)
+    record = {"ad_id": "101", "stat_time_day": "2024-01-01 00:00:00"}
+    cache.enrich(record, "ad_id")
+    assert record == {
+        "ad_id": "101",
+        "ad_name": "Ad 101",
+        "adgroup_id": "11",
+        "adgroup_name": "Ad group 11",
+        "campaign_id": "1",
+        "campaign_name": "Campaign 1",
+        "stat_time_day": "2024-01-01 00:00:00",
+    }
+    assert cache.spilled == (max_entities < 5)
+
+    # each level is loaded once, unknown entities get no names
+    record = {"adgroup_id": "12"}
+    cache.enrich(record, "adgroup_id")
+    assert record == {"adgroup_id": "12", "adgroup_name": None, "campaign_id": None, "campaign_name": None}
+    assert fetched == ["ads", "ad_groups", "campaigns"]
+
+
+def test_lookups_during_a_spill_find_the_entities_already_added():
+    cache = EntityCache(lambda level: [], max_entities=5000)
+    cache.add("ad_id", [(entity_id, f"Ad {entity_id}", 1) for entity_id in range(1, 5001)])
+    failures, done = [], threading.Event()
+
+    def look_up():
+        while not done.is_set():
+            try:
+                if cache.get("ad_id", 5000) is None:
+                    failures.append("missing")
+            except Exception as error:
+                failures.append(error)
+
+    readers = [threading.Thread(target=look_up) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    cache.add("ad_id", [(5001, "Ad 5001", 1)])
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert cache.spilled
+    assert not failures
+    assert cache.get("ad_id", 5001) == ("Ad 5001", 1)
+
+
+def test_report_streams_enrich_their_rows(server, account):
+    config = tap_config(server, enrich_reports=True)
+    messages, tap = sync_messages(config, select_streams(config, ["ads_daily_report", "campaigns_daily_report"]))
+    assert "campaign_name" in tap.streams["ads_daily_report"].schema["properties"]
+
+    records = [message["record"] for message in messages if message["type"] == "RECORD"]
+    fields = ["ad_id", "ad_name", "adgroup_id", "adgroup_name", "campaign_id", "campaign_name"]
+    ads = {record["ad_id"]: {field: record[field] for field in fields} for record in records if "ad_id" in record}
+    assert ads == {
+        account.entity_id("ad_id", index): {field: account.entity("ad_id", index)[field] for field in fields}
+        for index in range(account.entity_counts["ad_id"])
+    }
+    campaigns = {record["campaign_id"]: record["campaign_name"] for record in records if "ad_id" not in record}
+    assert campaigns == {
+        account.entity_id("campaign_id", index): account.entity("campaign_id", index)["campaign_name"]
+        for index in range(account.entity_counts["campaign_id"])
+    }
+    # one page per entity level, loaded once for both streams, and one per report window
+    assert server.request_count == 3 + 2
+
+
+def test_entity_streams_synced_first_fill_the_index(server, account):
+    config = tap_config(server, enrich_reports=True)
+    catalog = select_streams(config, ["campaigns", "ad_groups", "ads", "ads_daily_report"])
+    sync_messages({**config, "enrich_reports": False}, catalog)
+    unenriched_requests, server.request_count = server.request_count, 0
+    messages, _ = sync_messages(config, catalog)
+
+    records = [m["record"] for m in messages if m["type"] == "RECORD" and m["stream"] == "ads_daily_report"]
+    assert {record["ad_id"]: record["campaign_name"] for record in records} == {
+        account.entity_id("ad_id", index): account.entity("ad_id", index)["campaign_name"]
+        for index in range(account.entity_counts["ad_id"])
+    }
+    # the index fetches nothing
+    assert server.request_count == unenriched_requests
@@ -0,0 +1,93 @@
+"""Tests for error classification, retries and circuit breaking."""
+
+import time
+
+import pytest
+
+from tap_tiktok.clients import TikTokStream
+from tap_tiktok.errors import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ErrorKind,
+    TikTokFatalError,
+    backoff_waits,
+    classify_error,
+)
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.benchmarks.replay import ReplayAdapter
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.server import FaultConfig
+
+
+@pytest.fixture
+def faults():
+    return FaultConfig(rate_limit_ratio=0.3, server_error_ratio=0.3, seed=4)
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(TikTokStream, "backoff_base_seconds", 0.001)
+
+
+def test_classify_error():
+    assert classify_error(40100, "Too many requests") == ErrorKind.RATE_LIMITED
+    assert classify_error(40105, "Access token is incorrect or has been revoked.") == ErrorKind.FATAL
+    assert classify_error(50000, "System error") == ErrorKind.RETRIABLE
+    assert classify_error(59999, "Unknown") == ErrorKind.RETRIABLE
+    assert classify_error(40999, "Something went wrong, please retry later") == ErrorKind.RETRIABLE
+    assert classify_error(40999, "Unknown") == ErrorKind.FATAL
+
+
+def test_backoff_waits_grow_with_jitter_and_honour_hints():
+    waits = backoff_waits(base=1, maximum=10)
+    next(waits)
+    first, second, third = (waits.send(None) for _ in range(3))
+    assert 0.5 <= first <= 1 and 1 <= second <= 2 and 2 <= third <= 4
+
+    waits = backoff_waits(base=1, maximum=10)
+    next(waits)
+    assert waits.send(CircuitOpenError("open", retry_after=7)) == 7
+    assert waits.send(CircuitOpenError("open", retry_after=60)) == 10
+
+
+def test_circuit_breaker_opens_and_lets_one_trial_through():
+    breaker = CircuitBreaker("/report/integrated/get/", failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    time.sleep(0.06)
+    breaker.before_request()  # the trial request
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_failure()
+    assert breaker.is_open and breaker.cool_down == 0.1
+
+    time.sleep(0.11)
+    breaker.before_request()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_request()
+
+
+def test_sync_survives_rate_limits_and_server_errors(server, fast_backoff):
+    config = tap_config(server, 3)
+    records = []
+    for stream_name in ("ads", "ads_daily_report"):
+        messages, _ = sync_messages(config, select_streams(config, [stream_name]))
+        records += [message for message in messages if message["type"] == "RECORD"]
+    assert len([r for r in records if r["stream"] == "ads"]) == 30
+    assert len([r for r in records if r["stream"] == "ads_daily_report"]) == 30 * 3
+    assert server.request_count > 2  # one page per stream, plus the retried failures
+
+
+def test_fatal_errors_are_not_retried(fast_backoff):
+    adapter = ReplayAdapter(lambda path, params: {"code": 40105, "message": "Access token is invalid", "data": {}})
+    tap = TapTikTok(config=tap_config(days=3), validate_config=False)
+    stream = tap.streams["ads"]
+    stream.requests_session.mount("https://", adapter)
+    with pytest.raises(TikTokFatalError):
+        list(stream.request_records(None))
+    assert adapter.request_count == 1
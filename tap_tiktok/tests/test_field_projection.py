@@ -0,0 +1,40 @@
+"""Tests for requesting the selected entity properties through the `fields` parameter."""
+
+import pytest
+
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=30, num_days=1)
+
+
+def test_only_selected_fields_are_requested(server):
+    config = tap_config(server)
+    catalog = select_streams(config, ["campaigns"])
+    for metadata in catalog["streams"][0]["metadata"]:
+        if metadata["breadcrumb"] and metadata["breadcrumb"][1] not in ("campaign_id", "campaign_name", "budget"):
+            metadata["metadata"]["selected"] = False
+    tap = TapTikTok(config=config, catalog=catalog)
+    assert tap.streams["campaigns"].field_chunks == [["campaign_id", "campaign_name", "budget"]]
+
+
+def test_large_field_lists_are_chunked_and_joined(server, account):
+    config = tap_config(server, page_concurrency=3)
+    messages, tap = sync_messages(config, select_streams(config, ["ad_groups"]))
+    stream = tap.streams["ad_groups"]
+    assert len(stream.field_chunks) == 2
+    assert all(chunk[0] == "adgroup_id" for chunk in stream.field_chunks)
+
+    records = [message["record"] for message in messages if message["type"] == "RECORD"]
+    schema_fields = set(stream.schema["properties"])
+    expected = [
+        {key: value for key, value in account.entity("adgroup_id", index).items() if key in schema_fields}
+        for index in range(account.entity_counts["adgroup_id"])
+    ]
+    # each record is joined from both chunks, in page order
+    assert records == expected
+    assert server.request_count == 2
@@ -0,0 +1,75 @@
+"""Tests for the freshness policies deciding which report days are fetched again."""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from tap_tiktok.coverage import CoverageIndex
+from tap_tiktok.freshness import FreshnessPolicy
+from tap_tiktok.tests.conftest import ADVERTISER_ID, select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+DAY = date(2024, 5, 6)
+MIDNIGHT = datetime(2024, 5, 7, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=3, num_days=6)
+
+
+def test_policies_follow_the_lag_of_the_requested_metrics():
+    config = {"attribution_window_days": 7, "streams": {"ads_hourly_report": {"attribution_window_days": 1}}}
+    assert FreshnessPolicy.from_config(config, "ads_daily_report", ["spend", "conversion"]).lag == timedelta(days=7)
+    assert FreshnessPolicy.from_config(config, "ads_hourly_report", ["conversion"]).lag == timedelta(days=1)
+    assert FreshnessPolicy.from_config(config, "ads_daily_report", ["spend", "billed_cost"]).lag == timedelta(hours=11)
+    assert FreshnessPolicy.from_config(config, "ads_daily_report", ["impressions"]).lag == timedelta(hours=3)
+
+
+def test_mutable_days_are_refetched_from_their_first_mutable_hour():
+    policy = FreshnessPolicy(11)
+    # synced two hours after midnight: the hours from 14:00 could still change
+    synced_at = MIDNIGHT + timedelta(hours=2)
+    assert policy.refetch_from(DAY, synced_at, MIDNIGHT + timedelta(hours=3)) == MIDNIGHT - timedelta(hours=10)
+    # synced once settled, and then again daily, then weekly
+    settled_at = MIDNIGHT + timedelta(hours=11)
+    assert policy.refetch_from(DAY, settled_at, settled_at + timedelta(hours=1)) is None
+    assert policy.refetch_from(DAY, settled_at, settled_at + timedelta(days=1)) == MIDNIGHT - timedelta(days=1)
+    synced_at = settled_at + timedelta(days=5)
+    assert policy.refetch_from(DAY, synced_at, synced_at + timedelta(days=1)) is None
+    assert policy.refetch_from(DAY, synced_at, synced_at + timedelta(days=7)) == MIDNIGHT - timedelta(days=1)
+    # and never once final
+    assert policy.refetch_from(DAY, synced_at, settled_at + timedelta(days=30)) is None
+    assert policy.horizon(settled_at + timedelta(days=30)) > DAY
+
+
+def test_only_the_mutable_hours_are_fetched_again(server):
+    config = tap_config(
+        server,
+        6,
+        lookback=6,
+        freshness={"streams": {"ads_hourly_report": {"attribution_window_days": 0}}},
+    )
+    yesterday = date.today() - timedelta(days=1)
+    now = datetime.now(timezone.utc)
+    # yesterday was synced at 20:00, the days before have settled and were synced just now
+    index = CoverageIndex(
+        [
+            (date.today() - timedelta(days=6), yesterday - timedelta(days=1), now),
+            (yesterday, yesterday, datetime.combine(yesterday, datetime.min.time(), timezone.utc).replace(hour=20)),
+        ]
+    )
+    state = {
+        "bookmarks": {
+            "ads_hourly_report": {
+                "replication_key_value": f"{yesterday.isoformat()} 20:00:00",
+                "coverage": {ADVERTISER_ID: index.to_state()},
+            }
+        }
+    }
+    messages, _ = sync_messages(config, select_streams(config, ["ads_hourly_report"]), state)
+
+    hours = sorted({message["record"]["stat_time_hour"] for message in messages if message["type"] == "RECORD"})
+    # 20:00 less the lag of billed_cost and one hour
+    assert hours == [f"{yesterday.isoformat()} {hour:02d}:00:00" for hour in range(8, 24)]
+    assert server.request_count == 1
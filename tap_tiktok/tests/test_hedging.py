@@ -0,0 +1,103 @@
+"""Tests for hedging slow report page requests."""
+
+import threading
+import time
+
+import pytest
+
+from tap_tiktok.hedging import MIN_SAMPLES, HedgeLost, Hedger
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.server import FaultConfig
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+NUM_DAYS = 60
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=2, num_days=NUM_DAYS)
+
+
+@pytest.fixture
+def faults():
+    return FaultConfig(latency_ms=5, slow_page_ratio=0.2, slow_page_factor=100)
+
+
+def test_the_first_answer_wins_and_hedges_are_capped():
+    hedger = Hedger("ads_hourly_report", percentile=0.5, max_rate=0.05)
+    for _ in range(MIN_SAMPLES):
+        assert hedger.call(lambda: "fast", lambda: "duplicate") == "fast"
+    released = threading.Event()
+
+    def slow():
+        released.wait(5)
+        return "slow"
+
+    def duplicate():
+        released.set()
+        return "duplicate"
+
+    # the duplicate answers first; only one request in twenty may be hedged, so the second waits for its own answer
+    assert hedger.call(slow, duplicate) == "duplicate"
+    released.clear()
+    timer = threading.Timer(0.1, released.set)
+    timer.start()
+    assert hedger.call(slow, lambda: "duplicate") == "slow"
+    timer.join()
+    assert (hedger.requests, hedger.hedged, hedger.won, hedger.wasted) == (MIN_SAMPLES + 2, 1, 1, 1)
+
+
+def test_failed_hedges_fall_back_to_the_original_request():
+    hedger = Hedger("ads_hourly_report", max_rate=1.0)
+    for _ in range(MIN_SAMPLES):
+        hedger.call(lambda: "fast", lambda: "duplicate")
+
+    def slow():
+        time.sleep(0.05)
+        return "slow"
+
+    def failing():
+        raise ConnectionResetError()
+
+    assert hedger.call(slow, failing) == "slow"
+    assert (hedger.hedged, hedger.won) == (1, 0)
+
+
+def test_the_losing_request_stops_retrying():
+    hedger = Hedger("ads_hourly_report", max_rate=1.0)
+    for _ in range(MIN_SAMPLES):
+        hedger.call(lambda: "fast", lambda: "duplicate")
+    attempts = []
+
+    def retrying():
+        while not hedger.lost():
+            attempts.append(1)
+            time.sleep(0.01)
+        raise HedgeLost()
+
+    def duplicate():
+        time.sleep(0.05)
+        return "duplicate"
+
+    start = time.monotonic()
+    assert hedger.call(retrying, duplicate) == "duplicate"
+    assert time.monotonic() - start < 1
+    assert (hedger.hedged, hedger.won) == (1, 1)
+    assert not hedger.lost()
+
+
+def test_slow_report_pages_are_hedged(server):
+    config = tap_config(server, NUM_DAYS, hedging={"percentile": 0.75, "max_rate": 0.5})
+    messages, tap = sync_messages(config, select_streams(config, ["ads_hourly_report"]))
+
+    days = {message["record"]["stat_time_hour"][:10] for message in messages if message["type"] == "RECORD"}
+    assert len(days) == NUM_DAYS
+    hedger = tap.streams["ads_hourly_report"].hedger
+    assert hedger.hedged > 0
+    # one request per day, and the duplicates (a slow request that lost may still be on its way)
+    deadline = time.monotonic() + 5
+    while server.request_count < NUM_DAYS + hedger.hedged and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.request_count == NUM_DAYS + hedger.hedged
+    assert tap.quota.run_total == NUM_DAYS + hedger.hedged
+    assert tap.streams["ads_hourly_report"].performance.total.hedged == hedger.hedged
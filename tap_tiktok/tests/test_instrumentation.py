@@ -0,0 +1,89 @@
+"""Tests for the per-stream performance metrics."""
+
+import json
+import logging
+
+import pytest
+
+from tap_tiktok import instrumentation
+from tap_tiktok.clients import TikTokStream
+from tap_tiktok.errors import TikTokRetriableError
+from tap_tiktok.instrumentation import LATENCY_SAMPLES, StreamPerformance, render_prometheus, write_prometheus_textfile
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.server import FaultConfig
+
+
+def _metric_lines(caplog):
+    return [json.loads(r.getMessage().split("METRIC: ", 1)[1]) for r in caplog.records if "METRIC: " in r.getMessage()]
+
+
+def test_window_metrics_are_logged_when_window_changes(caplog):
+    performance = StreamPerformance("ads_daily_report", "123", logger=logging.getLogger("test_metrics"))
+    with caplog.at_level(logging.INFO, logger="test_metrics"):
+        performance.start_window("2024-01-01", "2024-01-31")
+        performance.record_response(0.2, 1000)
+        performance.record_page(10, 0.01, 0.02)
+        performance.record_response(0.3, 10)
+        performance.record_page(0, 0.001, 0.0)
+        assert _metric_lines(caplog) == []
+
+        performance.start_window("2024-02-01", "2024-02-29")
+        window_points = _metric_lines(caplog)
+        performance.finish()
+
+    by_metric = {point["metric"]: point for point in window_points if point["tags"].get("quantile") in (None, "1")}
+    assert by_metric["page_count"]["value"] == 2
+    assert by_metric["empty_page_ratio"]["value"] == 0.5
+    assert by_metric["rows_per_page"]["value"] == 5
+    assert by_metric["http_response_bytes"]["value"] == 1010
+    assert by_metric["http_request_latency"]["value"] == 0.3
+    assert by_metric["page_count"]["tags"]["window_start"] == "2024-01-01"
+    # the empty second window is not logged, the stream totals are
+    totals = [point for point in _metric_lines(caplog)[len(window_points) :] if point["metric"] == "page_count"]
+    assert [point["tags"].get("window_start") for point in totals] == [None]
+
+
+def test_prometheus_textfile(tmp_path):
+    performance = StreamPerformance("ads", "123")
+    performance.record_response(0.2, 100)
+    performance.record_response(3.0, 100)
+    performance.record_retry()
+    performance.record_page(4, 0.0, 0.0)
+
+    text = render_prometheus([performance])
+    assert 'tap_tiktok_request_duration_seconds_bucket{stream="ads",advertiser_id="123",le="0.25"} 1' in text
+    assert 'tap_tiktok_request_duration_seconds_bucket{stream="ads",advertiser_id="123",le="+Inf"} 2' in text
+    assert 'tap_tiktok_retries_total{stream="ads",advertiser_id="123"} 1' in text
+    assert 'tap_tiktok_rows_total{stream="ads",advertiser_id="123"} 4' in text
+
+    path = tmp_path / "metrics" / "tap.prom"
+    write_prometheus_textfile(str(path), [performance])
+    assert path.read_text() == text
+
+
+def test_latency_samples_are_bounded():
+    performance = StreamPerformance("ads", "123")
+    for index in range(LATENCY_SAMPLES + 10):
+        performance.record_response(float(index), 0)
+    assert len(performance.total.latencies) == LATENCY_SAMPLES
+    assert performance.total.latency_count == LATENCY_SAMPLES + 10
+    assert performance.total.latency_max == LATENCY_SAMPLES + 9
+
+
+def test_prometheus_textfile_is_written_once_at_the_end_of_the_sync(server, tmp_path, monkeypatch):
+    writes = []
+    monkeypatch.setattr(instrumentation, "write_prometheus_textfile", lambda path, performances: writes.append(path))
+    config = tap_config(server, prometheus_textfile=str(tmp_path / "tap.prom"))
+    sync_messages(config, select_streams(config, ["ads", "campaigns", "ads_daily_report"]))
+    assert writes == [str(tmp_path / "tap.prom")]
+
+
+def test_prometheus_textfile_is_written_when_a_stream_fails(server, tmp_path, monkeypatch):
+    writes = []
+    monkeypatch.setattr(instrumentation, "write_prometheus_textfile", lambda path, performances: writes.append(path))
+    monkeypatch.setattr(TikTokStream, "max_request_attempts", 1)
+    server.faults = FaultConfig(server_error_ratio=1.0)
+    config = tap_config(server, prometheus_textfile=str(tmp_path / "tap.prom"))
+    with pytest.raises(TikTokRetriableError):
+        sync_messages(config, select_streams(config, ["ads", "ads_daily_report"]))
+    assert writes == [str(tmp_path / "tap.prom")]
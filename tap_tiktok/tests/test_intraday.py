@@ -0,0 +1,75 @@
+"""Tests for the intraday polling of the hourly report streams."""
+
+import json
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from io import StringIO
+
+import pendulum
+import pytest
+
+from tap_tiktok.intraday import HourFingerprints, intraday_window, poll_intraday
+from tap_tiktok.pagination import IntradayReportPaginator
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+
+@pytest.fixture
+def account():
+    # data up to and including today
+    return SyntheticAccount(num_entities=5, num_days=3, end_date=date.today() + timedelta(days=1))
+
+
+def test_intraday_window_covers_today_and_the_recheck_hours():
+    start, end = intraday_window(3, now=pendulum.datetime(2024, 5, 2, 14, 20))
+    assert (start, end) == (pendulum.datetime(2024, 5, 2), pendulum.datetime(2024, 5, 2, 14, 20))
+    start, _ = intraday_window(3, now=pendulum.datetime(2024, 5, 2, 1, 20))
+    assert start == pendulum.datetime(2024, 5, 1, 22)
+
+
+def test_intraday_paginator_requests_one_day_at_a_time():
+    paginator = IntradayReportPaginator(pendulum.datetime(2024, 5, 1, 22), pendulum.datetime(2024, 5, 2, 1))
+    assert paginator.current_value["start_date"] == paginator.current_value["end_date"] == "2024-05-01"
+
+
+def test_hour_fingerprints_report_changed_rows_only():
+    fingerprints = HourFingerprints(["ad_id", "stat_time_hour"], "stat_time_hour")
+    row = {"ad_id": "1", "stat_time_hour": "2024-05-02 10:00:00", "spend": "1.00"}
+    assert fingerprints.changed(row)
+    assert not fingerprints.changed(dict(row))
+    assert fingerprints.changed({**row, "spend": "2.00"})
+    fingerprints.prune("2024-05-02 11:00:00")
+    assert len(fingerprints) == 0
+
+
+def test_polls_emit_new_or_changed_hours_only(server, account):
+    config = tap_config(server, 3, intraday_polling={"interval_minutes": 1, "recheck_hours": 2})
+    tap = TapTikTok(config=config, catalog=select_streams(config, ["ads_hourly_report"]), state={})
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            account.seed += 1  # TikTok updated the metrics
+
+    output = StringIO()
+    with redirect_stdout(output):
+        poll_intraday(tap, max_polls=3, sleep=sleep)
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    polls, records = [], None
+    for message in messages:
+        if message["type"] == "SCHEMA":
+            records = []
+            polls.append(records)
+        elif message["type"] == "RECORD":
+            records.append(message["record"])
+    first_hour = intraday_window(2)[0].format("YYYY-MM-DD HH:00:00")
+    assert sleeps == [60, 60]
+    assert len(polls) == 3
+    assert polls[0] and all(record["stat_time_hour"] >= first_hour for record in polls[0])
+    assert polls[1] == []
+    assert len(polls[2]) == len(polls[0])
+    # polls leave the bookmark alone
+    assert "replication_key_value" not in json.dumps(tap.state)
@@ -0,0 +1,45 @@
+"""Tests for the merge-join of metric chunks."""
+
+from tap_tiktok.merge import ChunkMerger
+
+KEYS = ["ad_id", "stat_time_day"]
+
+
+def _rows(ids, metric):
+    return [{"ad_id": str(ad_id), "stat_time_day": "2024-01-01", metric: str(ad_id)} for ad_id in ids]
+
+
+def test_rows_are_emitted_as_soon_as_complete():
+    merger = ChunkMerger(KEYS, 2)
+    assert list(merger.add(0, _rows([1, 2, 3], "clicks"))) == []
+    merged = merger.add(1, _rows([1, 2, 3], "spend"))
+    assert next(merged) == {"ad_id": "1", "stat_time_day": "2024-01-01", "clicks": "1", "spend": "1"}
+    assert len(list(merged)) == 2
+    assert merger._pending == {}
+    assert list(merger.finish()) == []
+
+
+def test_chunks_in_different_orders_across_pages():
+    merger = ChunkMerger(KEYS, 2)
+    emitted = list(merger.add(0, _rows([1, 2], "clicks")))
+    emitted += merger.add(1, _rows([3, 1], "spend"))
+    emitted += merger.add(0, _rows([3, 4], "clicks"))
+    emitted += merger.add(1, _rows([4, 2], "spend"))
+    assert [row["ad_id"] for row in emitted] == ["1", "3", "4", "2"]
+    assert all({"clicks", "spend"} <= row.keys() for row in emitted)
+    assert list(merger.finish()) == []
+
+
+def test_unmatched_rows_spill_to_disk_and_are_flushed_partially():
+    merger = ChunkMerger(KEYS, 2, max_buffered_rows=10)
+    assert list(merger.add(0, _rows(range(100), "clicks"))) == []
+    assert len(merger._pending) <= 10
+    assert merger.spilled == 100 - len(merger._pending)
+
+    emitted = list(merger.add(1, _rows(reversed(range(1, 100)), "spend")))
+    assert sorted(int(row["ad_id"]) for row in emitted) == list(range(1, 100))
+    assert all("clicks" in row and "spend" in row for row in emitted)
+
+    leftovers = list(merger.finish())
+    assert leftovers == [{"ad_id": "0", "stat_time_day": "2024-01-01", "clicks": "0"}]
+    assert merger._spill is None
@@ -0,0 +1,46 @@
+"""Tests for requesting only the metrics selected in the catalog."""
+
+import pytest
+
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+SELECTED_METRICS = ["spend", "impressions"]
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=5, num_days=2)
+
+
+def _catalog(config, stream_name, metrics):
+    catalog = select_streams(config, [stream_name])
+    for metadata in catalog["streams"][0]["metadata"]:
+        breadcrumb = metadata["breadcrumb"]
+        if breadcrumb and breadcrumb[1] not in metrics and breadcrumb[1] not in ("ad_id", "stat_time_day"):
+            metadata["metadata"]["selected"] = False
+    return catalog
+
+
+def test_all_metrics_are_requested_by_default(server):
+    config = tap_config(server)
+    tap = TapTikTok(config=config, catalog=select_streams(config, ["ads_daily_report"]))
+    stream = tap.streams["ads_daily_report"]
+    assert stream.metrics_keys == list(stream.metrics_properties.to_dict()["properties"])
+
+
+def test_only_selected_metrics_are_requested(server):
+    config = tap_config(server)
+    messages, tap = sync_messages(config, _catalog(config, "ads_daily_report", SELECTED_METRICS))
+    assert tap.streams["ads_daily_report"].metrics_keys == SELECTED_METRICS
+
+    records = [message["record"] for message in messages if message["type"] == "RECORD"]
+    assert len(records) == 10
+    assert all(set(record) == {"ad_id", "stat_time_day", *SELECTED_METRICS} for record in records)
+
+
+def test_one_metric_is_requested_when_none_is_selected(server):
+    config = tap_config(server)
+    tap = TapTikTok(config=config, catalog=_catalog(config, "ads_daily_report", []))
+    assert tap.streams["ads_daily_report"].metrics_keys == ["spend"]
@@ -0,0 +1,26 @@
+"""Tests for the metric-family report streams and their metric chunks."""
+
+import pytest
+
+from tap_tiktok.clients.metric_report import IN_APP_EVENT_METRICS
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=1500, num_days=2)
+
+
+def test_metric_chunks_are_fetched_per_page_and_merged(server):
+    config = tap_config(server)
+    messages, tap = sync_messages(config, select_streams(config, ["ads_in_app_event_metrics_by_day"]))
+    stream = tap.streams["ads_in_app_event_metrics_by_day"]
+    assert [len(chunk) for chunk in stream.metric_chunks] == [87, 87]
+
+    records = [message["record"] for message in messages if message["type"] == "RECORD"]
+    assert len(records) == 3000
+    assert len({(record["ad_id"], record["stat_time_day"]) for record in records}) == 3000
+    assert all(set(IN_APP_EVENT_METRICS) <= record.keys() for record in records)
+    # a single window of 3 pages of 1000 rows, each page requested once per chunk
+    assert server.request_count == 6
@@ -0,0 +1,61 @@
+"""Tests for the built-in profiling hooks."""
+
+import json
+import time
+
+from click.testing import CliRunner
+
+from tap_tiktok.profiling import SAMPLING, SyncProfiler
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, tap_config
+
+
+def _workload():
+    deadline = time.perf_counter() + 0.05
+    rows = []
+    while time.perf_counter() < deadline:
+        rows.append({"value": str(len(rows))})
+    return rows
+
+
+def test_deterministic_profile(tmp_path):
+    profiler = SyncProfiler(output_dir=tmp_path)
+    with profiler.profile("ads"):
+        _workload()
+
+    assert (tmp_path / "ads.prof").stat().st_size > 0
+    assert "peak traced memory" in (tmp_path / "ads.alloc.txt").read_text()
+    summary = (tmp_path / "summary.txt").read_text()
+    assert "== ads (deterministic" in summary
+    assert "_workload" in summary
+
+
+def test_sampling_profile(tmp_path):
+    profiler = SyncProfiler(output_dir=tmp_path, mode=SAMPLING, interval_ms=1)
+    with profiler.profile("ads"):
+        _workload()
+    with profiler.profile("campaigns"):
+        _workload()
+
+    assert "_workload" in (tmp_path / "ads.collapsed").read_text()
+    summary = (tmp_path / "summary.txt").read_text()
+    assert "== ads (sampling" in summary and "== campaigns (sampling" in summary
+
+
+def test_from_config():
+    assert SyncProfiler.from_config(None) is None
+    assert SyncProfiler.from_config({"sample_rate": 0}) is None
+    assert SyncProfiler.from_config({"mode": SAMPLING}).mode == SAMPLING
+
+
+def test_profile_switch(server, tmp_path):
+    config = tap_config(server, profile={"output_dir": str(tmp_path / "profiles"), "sample_rate": 0})
+    (tmp_path / "config.json").write_text(json.dumps(config))
+    (tmp_path / "catalog.json").write_text(json.dumps(select_streams(config, ["campaigns"])))
+    args = ["--config", str(tmp_path / "config.json"), "--catalog", str(tmp_path / "catalog.json")]
+
+    result = CliRunner().invoke(TapTikTok.cli, [*args, "--profile", "sampling"])
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "profiles" / "campaigns.collapsed").exists()
+    assert "== campaigns (sampling" in (tmp_path / "profiles" / "summary.txt").read_text()
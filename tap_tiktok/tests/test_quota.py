@@ -0,0 +1,80 @@
+"""Tests for the request accounting and budgets."""
+
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from tap_tiktok.quota import QuotaLedger
+from tap_tiktok.tests.conftest import ADVERTISER_ID, select_streams, sync_messages, tap_config
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=4, num_days=4)
+
+
+def _sync(server, usage_file, state=None, **quota):
+    config = tap_config(server, 4, quota={"usage_file": str(usage_file), **quota})
+    messages, tap = sync_messages(config, select_streams(config, ["ads", "ads_hourly_report"]), state)
+    return [message for message in messages if message["type"] == "RECORD"], tap.state
+
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def test_budgets_stop_the_run_between_windows(server, tmp_path):
+    usage_file = tmp_path / "usage.json"
+    records, state = _sync(server, usage_file, run_budget=3)
+    # the ads page, then a day of the hourly report per request
+    days = {record["record"]["stat_time_hour"][:10] for record in records if record["stream"] == "ads_hourly_report"}
+    assert days == {(date.today() - timedelta(days=days_ago)).isoformat() for days_ago in (4, 3)}
+    bookmark = state["bookmarks"]["ads_hourly_report"]
+    assert bookmark["replication_key_value"][:10] == (date.today() - timedelta(days=3)).isoformat()
+    assert [interval[:2] for interval in bookmark["coverage"][ADVERTISER_ID]] == [sorted(days)]
+
+    # the daily budget counts the requests of the earlier run
+    records, state = _sync(server, usage_file, state, daily_budget=4)
+    assert {record["stream"] for record in records} == {"ads"}
+    assert server.request_count == 4
+    usage = json.loads(usage_file.read_text())[ADVERTISER_ID][_today()]
+    assert usage == {
+        "total": 4,
+        "endpoints": {"/ad/get/": 2, "/report/integrated/get/": 2},
+        "streams": {"ads": 2, "ads_hourly_report": 2},
+    }
+
+
+def test_processes_sharing_a_usage_file_share_the_daily_budget(tmp_path):
+    usage_file = tmp_path / "usage.json"
+    first = QuotaLedger(ADVERTISER_ID, daily_budget=5, usage_file=str(usage_file))
+    second = QuotaLedger(ADVERTISER_ID, daily_budget=5, usage_file=str(usage_file))
+    for _ in range(2):
+        first.record("/report/integrated/get/", "ads_daily_report")
+        second.record("/campaign/get/", "campaigns")
+    first.flush()
+    second.flush()
+    first.record("/report/integrated/get/", "ads_daily_report")
+    assert first.exhausted is None
+    first.flush()
+    assert second.earlier_today == 2
+    second.flush()
+    assert second.earlier_today == 3
+    assert second.exhausted == "daily budget of 5 requests"
+    assert json.loads(usage_file.read_text())[ADVERTISER_ID][_today()]["total"] == 5
+
+
+@pytest.mark.parametrize("text", ["", '{"total": 1'])
+def test_unreadable_usage_files_count_as_no_earlier_usage(tmp_path, caplog, text):
+    usage_file = tmp_path / "usage.json"
+    usage_file.write_text(text)
+    ledger = QuotaLedger(ADVERTISER_ID, daily_budget=5, usage_file=str(usage_file))
+    assert ledger.earlier_today == 0
+    assert ("cannot be decoded" in caplog.text) == bool(text)
+
+    ledger.record("/campaign/get/", "campaigns")
+    ledger.flush()
+    assert json.loads(usage_file.read_text())[ADVERTISER_ID][_today()]["total"] == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["usage.json", "usage.json.lock"]
@@ -0,0 +1,130 @@
+"""Tests for the concurrent stream scheduler and the shared request budget."""
+
+import json
+import threading
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import pytest
+
+from tap_tiktok.clients import TikTokStream
+from tap_tiktok.scheduler import RequestBudget
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config, without_sync_times
+from tap_tiktok.tests.server import FaultConfig
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+STREAMS = ["ads_hourly_report", "ads_daily_report", "campaigns", "ads"]
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=30, num_days=2)
+
+
+@pytest.fixture
+def faults():
+    return FaultConfig(latency_ms=150)
+
+
+def _sync(config, server=None):
+    """The messages of a sync, and the most requests `server` answered at once during it."""
+    if server is not None:
+        server.max_in_flight = 0
+    messages, _ = sync_messages(config, select_streams(config, STREAMS))
+    return messages, server and server.max_in_flight
+
+
+def test_request_budget_limits_concurrency_and_rate():
+    budget = RequestBudget(max_concurrency=2, max_per_second=50)
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def request():
+        with budget:
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=request) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert time.perf_counter() - start >= 9 / 50
+
+
+def test_streams_are_fetched_concurrently_and_emitted_in_priority_order(server):
+    serial, serial_overlap = _sync(tap_config(server, page_concurrency=1), server)
+    concurrent, concurrent_overlap = _sync(tap_config(server, page_concurrency=1, stream_concurrency=4), server)
+
+    def stream_runs(messages):
+        runs = []
+        for message in messages:
+            if message["type"] in ("SCHEMA", "RECORD") and (not runs or runs[-1] != message["stream"]):
+                runs.append(message["stream"])
+        return runs
+
+    # each stream's messages are contiguous: entities first, then daily and hourly reports
+    expected_runs = ["ads", "campaigns", "ads_daily_report", "ads_hourly_report"]
+    assert stream_runs(concurrent) == stream_runs(serial) == expected_runs
+    records = [(message["stream"], message["record"]) for message in concurrent if message["type"] == "RECORD"]
+    assert records == [(message["stream"], message["record"]) for message in serial if message["type"] == "RECORD"]
+    assert concurrent[-1]["type"] == "STATE"
+    assert without_sync_times(concurrent[-1]["value"]) == without_sync_times(serial[-1]["value"])
+    assert serial_overlap == 1
+    assert concurrent_overlap > 1
+
+
+def test_dry_runs_stop_each_stream_after_its_first_records(server):
+    config = tap_config(server, stream_concurrency=4)
+    tap = TapTikTok(config=config, catalog=select_streams(config, STREAMS))
+    output = StringIO()
+    dry_run = threading.Thread(target=lambda: tap.run_sync_dry_run(dry_run_record_limit=1), daemon=True)
+    with redirect_stdout(output):
+        dry_run.start()
+        dry_run.join(timeout=60)
+
+    assert not dry_run.is_alive()
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert {message["stream"] for message in messages if message["type"] == "RECORD"} == set(STREAMS)
+
+
+def test_failures_of_a_prefetched_stream_fail_its_sync(server, monkeypatch):
+    monkeypatch.setattr(TikTokStream, "max_request_attempts", 1)
+    server.faults = FaultConfig(server_error_ratio=1.0)
+    with pytest.raises(Exception, match="Service Unavailable"):
+        _sync(tap_config(server, stream_concurrency=4))
+
+
+def test_a_sync_failing_while_writing_records_stops_all_fetching(server, monkeypatch):
+    write_record = TikTokStream._write_record_message
+
+    def broken_pipe(stream, record):
+        if stream.name == "campaigns":
+            raise BrokenPipeError()
+        write_record(stream, record)
+
+    monkeypatch.setattr(TikTokStream, "_write_record_message", broken_pipe)
+    errors = []
+
+    def sync():
+        try:
+            _sync(tap_config(server, page_concurrency=1, stream_concurrency=4))
+        except BrokenPipeError as error:
+            errors.append(error)
+
+    syncing = threading.Thread(target=sync, daemon=True)
+    syncing.start()
+    syncing.join(timeout=60)
+    assert not syncing.is_alive() and errors
+
+    deadline = time.monotonic() + 10
+    while any(thread.name.startswith("tap-tiktok-stream") for thread in threading.enumerate()):
+        assert time.monotonic() < deadline, "the fetching of the other streams is still running"
+        time.sleep(0.05)
@@ -0,0 +1,31 @@
+"""Tests for the precomputed stream schema cache."""
+
+import subprocess
+import sys
+
+from tap_tiktok.schema_cache import SCHEMA_CACHE_VERSION, _load_cache, build_schema_cache
+from tap_tiktok.tap import STREAM_TYPES, load_stream_class
+
+
+def test_schema_cache_is_up_to_date():
+    """The shipped cache must match the schemas built from the stream classes.
+
+    Regenerate it with `python -m tap_tiktok.schema_cache` when this fails.
+    """
+    assert build_schema_cache()["streams"] == _load_cache()
+    assert build_schema_cache()["version"] == SCHEMA_CACHE_VERSION
+
+
+def test_stream_registry_names_match_classes():
+    for name, import_path in STREAM_TYPES.items():
+        assert load_stream_class(import_path).name == name
+
+
+def test_loading_a_stream_class_imports_only_its_module():
+    script = (
+        "import sys; from tap_tiktok.tap import STREAM_TYPES, load_stream_class;"
+        " load_stream_class(STREAM_TYPES['ads_daily_report']);"
+        " print(' '.join(name for name in sys.modules if name.endswith('_reports')))"
+    )
+    output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+    assert output.split() == ["tap_tiktok.new_streams.reports.ads.ads_basic_reports"]
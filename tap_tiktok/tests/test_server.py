@@ -0,0 +1,30 @@
+"""Tests for the local TikTok Business API stand-in."""
+
+import requests
+
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config
+from tap_tiktok.tests.server import RATE_LIMIT_CODE, FaultConfig
+
+
+def test_tap_syncs_against_stand_in(server):
+    config = tap_config(server, 3)
+    records = []
+    for stream_name in ("ads", "ads_daily_report"):
+        messages, _ = sync_messages(config, select_streams(config, [stream_name]))
+        records += [message for message in messages if message["type"] == "RECORD"]
+    assert len([r for r in records if r["stream"] == "ads"]) == 30
+    assert len([r for r in records if r["stream"] == "ads_daily_report"]) == 30 * 3
+
+
+def test_stand_in_pagination(server):
+    params = {"page": 3, "page_size": 7}
+    page = requests.get(f"{server.api_url}/ad/get/", params=params).json()["data"]
+    assert page["page_info"] == {"page": 3, "page_size": 7, "total_number": 30, "total_page": 5}
+    assert len(page["list"]) == 7
+
+
+def test_stand_in_injects_faults(server):
+    server.faults = FaultConfig(rate_limit_ratio=1.0)
+    assert requests.get(f"{server.api_url}/ad/get/").json()["code"] == RATE_LIMIT_CODE
+    server.faults = FaultConfig(server_error_ratio=1.0)
+    assert requests.get(f"{server.api_url}/ad/get/").status_code == 503
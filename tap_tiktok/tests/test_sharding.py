@@ -0,0 +1,89 @@
+"""Tests for sharding advertisers and report streams across tap processes."""
+
+import json
+
+import pytest
+
+from tap_tiktok.sharding import ShardAssignment, main, merge_states, read_state, shard_of
+from tap_tiktok.tap import TapTikTok
+from tap_tiktok.tests.conftest import select_streams, sync_messages, tap_config, without_sync_times
+from tap_tiktok.tests.synthetic import SyntheticAccount
+
+STREAMS = ["ads", "campaigns", "ads_daily_report", "ads_hourly_report", "campaigns_daily_report"]
+REPORT_STREAMS = ["ads_daily_report", "ads_hourly_report", "campaigns_daily_report"]
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=10, num_days=2)
+
+
+def _sync(config, path):
+    """Sync the streams, write the messages to `path` and return the streams that had records."""
+    messages, _ = sync_messages(config, select_streams(config, STREAMS))
+    path.write_text("".join(json.dumps(message) + "\n" for message in messages))
+    return {message["stream"] for message in messages if message["type"] == "RECORD"}
+
+
+def test_shard_of_is_stable_and_spreads_keys():
+    assert shard_of("7000000000000000000", 4) == shard_of("7000000000000000000", 4)
+    shards = [shard_of(f"advertiser-{index}", 4) for index in range(400)]
+    assert all(60 < shards.count(shard) < 140 for shard in range(4))
+
+
+def test_each_advertiser_is_owned_by_one_shard():
+    for advertiser_id in ("1", "2", "7000000000000000000"):
+        shards = [ShardAssignment(index, 3) for index in range(3)]
+        owners = [shard for shard in shards if shard.owns(advertiser_id, "ads_daily_report", True)]
+        assert len(owners) == 1
+
+
+def test_invalid_shards_are_rejected():
+    with pytest.raises(ValueError):
+        ShardAssignment(2, 2)
+
+
+def test_report_stream_shards_cover_the_streams_once_and_merge_into_the_unsharded_state(server, tmp_path):
+    _sync(tap_config(server), tmp_path / "unsharded.jsonl")
+    unsharded = read_state(str(tmp_path / "unsharded.jsonl"))
+
+    paths = [tmp_path / f"shard-{index}.jsonl" for index in range(2)]
+    synced = [
+        _sync(tap_config(server, shard_count=2, shard_index=index, shard_report_streams=True), path)
+        for index, path in enumerate(paths)
+    ]
+    assert synced[0] | synced[1] == set(STREAMS)
+    assert not synced[0] & synced[1]
+    owner = shard_of("7000000000000000000", 2)
+    assert {"ads", "campaigns"} <= synced[owner]
+
+    merged_path = tmp_path / "state.json"
+    main([str(path) for path in paths] + ["-o", str(merged_path)])
+    assert without_sync_times(json.loads(merged_path.read_text())) == without_sync_times(merge_states([unsharded]))
+
+
+def test_shards_only_keep_their_own_bookmarks(server):
+    config = tap_config(server, shard_count=2, shard_index=0, shard_report_streams=True)
+    state = {"bookmarks": {name: {"replication_key_value": "2024-01-01T00:00:00+00:00"} for name in REPORT_STREAMS}}
+    tap = TapTikTok(config=config, catalog=select_streams(config, STREAMS), state=state)
+    owned = {name for name in REPORT_STREAMS if tap.owns_stream(name)}
+    assert set(tap.state["bookmarks"]) == owned
+
+
+def test_shards_without_catalog_sync_and_keep_the_bookmarks_of_their_own_streams(server):
+    config = tap_config(server, shard_count=2, shard_index=0, shard_report_streams=True)
+    state = {"bookmarks": {name: {"replication_key_value": "2024-01-01T00:00:00+00:00"} for name in REPORT_STREAMS}}
+    tap = TapTikTok(config=config, state=state)
+
+    # discovery still lists every stream
+    assert {entry["tap_stream_id"] for entry in tap.catalog_dict["streams"]} >= set(STREAMS)
+    selected = {name for name, stream in tap.streams.items() if stream.selected}
+    assert selected == {name for name in tap.streams if tap.owns_stream(name)}
+    assert set(tap.state["bookmarks"]) == selected & set(REPORT_STREAMS)
+
+
+def test_merge_keeps_the_most_advanced_bookmark():
+    old = {"bookmarks": {"ads_daily_report": {"replication_key_value": "2024-01-01"}}}
+    new = {"bookmarks": {"ads_daily_report": {"replication_key_value": "2024-02-01"}, "ads": {}}}
+    assert merge_states([new, old]) == {"bookmarks": {"ads": {}, **new["bookmarks"]}}
+    assert merge_states([old, new])["bookmarks"]["ads_daily_report"]["replication_key_value"] == "2024-02-01"
@@ -0,0 +1,60 @@
+"""Tests for routing requests through a pool of access tokens."""
+
+import pytest
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_tiktok.tests.conftest import ADVERTISER_ID, select_streams, sync_messages, tap_config
+from tap_tiktok.tests.server import FaultConfig
+from tap_tiktok.tests.synthetic import SyntheticAccount
+from tap_tiktok.tokens import TokenPool, TokensCoolingDownError
+
+ACCESS_TOKENS = [
+    {"name": "app-a", "access_token": "token-a", "advertiser_ids": [ADVERTISER_ID]},
+    {"name": "app-b", "access_token": "token-b"},
+    {"name": "app-c", "access_token": "token-c", "advertiser_ids": ["7000000000000000001"]},
+]
+
+
+@pytest.fixture
+def account():
+    return SyntheticAccount(num_entities=4, num_days=4)
+
+
+@pytest.fixture
+def faults():
+    return FaultConfig(rate_limited_tokens=("token-b",))
+
+
+def test_requests_go_to_the_least_loaded_eligible_token():
+    pool = TokenPool.from_config({"advertiser_id": ADVERTISER_ID, "access_tokens": ACCESS_TOKENS})
+    assert [token.name for token in pool.tokens] == ["app-a", "app-b"]
+    with pool.lease() as first, pool.lease() as second:
+        assert (first.name, second.name) == ("app-a", "app-b")
+        with pool.lease() as third:
+            assert third.name == "app-a"
+    with pool.lease() as fourth:
+        assert fourth.name == "app-b"
+
+    assert pool.cool_down(pool.tokens[0], 60)
+    with pool.lease() as token:
+        assert token.name == "app-b"
+    assert not pool.cool_down(pool.tokens[1], 60)
+    with pytest.raises(TokensCoolingDownError):
+        with pool.lease():
+            pass
+
+
+def test_advertisers_need_an_eligible_token():
+    with pytest.raises(ConfigValidationError):
+        TokenPool.from_config({"advertiser_id": ADVERTISER_ID, "access_tokens": ACCESS_TOKENS[2:]})
+
+
+def test_rate_limited_tokens_are_taken_out_of_rotation(server):
+    config = tap_config(server, 4, access_tokens=ACCESS_TOKENS)
+    del config["access_token"]
+    messages, tap = sync_messages(config, select_streams(config, ["ads_hourly_report"]))
+
+    days = {message["record"]["stat_time_hour"][:10] for message in messages if message["type"] == "RECORD"}
+    assert len(days) == 4
+    # one request per day with token-a, and the one rate limited request with token-b
+    assert server.token_counts == {"token-a": 4, "token-b": 1}
@@ -0,0 +1,99 @@
+"""Pool of access tokens, to spread requests over several apps' rate limits.
+
+Advertisers are often authorized under several developer apps or Business
+Centers, each with its own rate limit. With `access_tokens`, every request is
+sent with the least loaded of the tokens that may access the advertiser (the
+one with the fewest requests in flight, then the fewest requests so far):
+
+    "access_tokens": [
+        {"name": "app-a", "access_token": "...", "advertiser_ids": ["7000000000000000000"]},
+        {"name": "app-b", "access_token": "..."}
+    ]
+
+A token without `advertiser_ids` may access every advertiser. `access_token`,
+if set, is part of the pool as well. A token answered with a rate-limit error
+is taken out of rotation for the server's `Retry-After` or `cool_down_seconds`,
+while the retry goes to another token; only when all tokens are cooling down do
+requests wait.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_tiktok.errors import ErrorKind, TikTokRetriableError
+
+DEFAULT_COOL_DOWN_SECONDS = 60.0
+
+
+@dataclass
+class AccessToken:
+    name: str
+    value: str = field(repr=False)
+    in_flight: int = 0
+    requests: int = 0
+    # monotonic time until which the token is out of rotation
+    cooling_until: float = 0.0
+
+
+class TokensCoolingDownError(TikTokRetriableError):
+    """Raised instead of making a request while every token of the pool is rate limited."""
+
+
+class TokenPool:
+    """The access tokens eligible for an advertiser, leased to requests by load."""
+
+    def __init__(self, tokens: List[AccessToken], cool_down_seconds: float = DEFAULT_COOL_DOWN_SECONDS) -> None:
+        self.tokens = tokens
+        self.cool_down_seconds = cool_down_seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "TokenPool":
+        advertiser_id = str(config["advertiser_id"])
+        tokens = []
+        if config.get("access_token"):
+            tokens.append(AccessToken("access_token", str(config["access_token"])))
+        for index, entry in enumerate(config.get("access_tokens") or ()):
+            advertiser_ids = entry.get("advertiser_ids")
+            if advertiser_ids is None or advertiser_id in {str(value) for value in advertiser_ids}:
+                tokens.append(AccessToken(entry.get("name") or f"access_tokens[{index}]", entry["access_token"]))
+        if not tokens:
+            raise ConfigValidationError(f"No access token may access advertiser {advertiser_id}.")
+        return cls(tokens, config.get("token_cool_down_seconds") or DEFAULT_COOL_DOWN_SECONDS)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @contextmanager
+    def lease(self) -> Iterator[AccessToken]:
+        """Hold the least loaded token available for the duration of a request."""
+        with self._lock:
+            now = time.monotonic()
+            available = [token for token in self.tokens if token.cooling_until <= now]
+            if not available:
+                wait = min(token.cooling_until for token in self.tokens) - now
+                raise TokensCoolingDownError(
+                    f"All {len(self.tokens)} access tokens are rate limited.",
+                    kind=ErrorKind.RATE_LIMITED,
+                    retry_after=wait,
+                )
+            token = min(available, key=lambda token: (token.in_flight, token.requests))
+            token.in_flight += 1
+            token.requests += 1
+        try:
+            yield token
+        finally:
+            with self._lock:
+                token.in_flight -= 1
+
+    def cool_down(self, token: AccessToken, seconds: Optional[float] = None) -> bool:
+        """Take `token` out of rotation; return whether another token can take its requests."""
+        with self._lock:
+            now = time.monotonic()
+            token.cooling_until = max(token.cooling_until, now + (seconds or self.cool_down_seconds))
+            return any(other.cooling_until <= now for other in self.tokens)